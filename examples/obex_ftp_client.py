@@ -48,18 +48,26 @@ class FTPClient(object):
         print 'Server response:', response.reason
 
     def ls(self):
-        import StringIO
-        dirlist = StringIO.StringIO()
-        response = self.client.get({'type': 'x-obex/folder-listing'}, dirlist)
+        # the folder listing is parsed as it is received, rather than being
+        # kept in memory and parsed at the end
+        parser = lightblue.obex.ftp.FolderListingParser()
+        response = self.client.get({'type': 'x-obex/folder-listing'}, parser)
         print 'Server response:', response.reason
         if response.code == lightblue.obex.OK:
-            files = self._parsefolderlisting(dirlist.getvalue())
-            if len(files) == 0:
+            try:
+                entries = parser.close()
+            except lightblue.obex.OBEXError, e:
+                print "Error parsing folder-listing XML:", e
+                return
+            if len(entries) == 0:
                 print 'No files found'
             else:
                 print 'Found files:'
-                for f in files:
-                    print '\t', f
+                for entry in entries:
+                    if entry.isfolder:
+                        print '\t%s/\t%s' % (entry.name, entry.size or '')
+                    else:
+                        print '\t%s\t%s' % (entry.name, entry.size or '')
 
     def cd(self, dirname):
         if dirname == os.sep:
@@ -108,37 +116,6 @@ class FTPClient(object):
         if response.code == lightblue.obex.PRECONDITION_FAILED:
             print 'Directory contents must be deleted first'
 
-    def _parsefolderlisting(self, xmldata):
-        """
-        Returns a list of basic details for the files and folders contained in
-        the given XML folder-listing data. (The complete folder-listing XML DTD
-        is documented in the IrOBEX specification.)
-        """
-        if len(xmldata) == 0:
-            print "Error parsing folder-listing XML: no xml data"
-            return []
-        entries = []
-        import xml.dom.minidom
-        import xml.parsers.expat
-        try:
-            dom = xml.dom.minidom.parseString(xmldata)
-        except xml.parsers.expat.ExpatError, e:
-            print "Error parsing folder-listing XML (%s): '%s'" % \
-                (str(e), xmldata)
-            return []
-        parent = dom.getElementsByTagName('parent-folder')
-        if len(parent) != 0:
-            entries.append('..')
-        folders = dom.getElementsByTagName('folder')
-        for f in folders:
-            entries.append('%s/\t%s' % (f.getAttribute('name'),
-                                        f.getAttribute('size')))
-        files = dom.getElementsByTagName('file')
-        for f in files:
-            entries.append('%s\t%s' % (f.getAttribute('name'),
-                                       f.getAttribute('size')))
-        return entries
-
 
 def processcommands(ftpclient):
     while True:
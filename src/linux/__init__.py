@@ -39,6 +39,26 @@ _docstrings = {
     be invoked too frequently (an interval of at least 20 seconds is 
     recommended).
     """,
+"iterdevices":
+    """
+    Performs a device discovery and yields each found device as an
+    (address, name, class-of-device) tuple as soon as it is found, so that
+    devices can be used before the discovery has finished. Raises 
+    BluetoothError if an error occurs.
+    
+    Arguments:
+        - getnames=True: True if device names should be retrieved during 
+          discovery. If a device's name is not known when the device is found,
+          its name in the tuple is None, and the device is yielded again with
+          its name once the name has been retrieved.
+        - length=10: the number of seconds to spend discovering devices 
+          (this argument has no effect on Python for Series 60)
+    
+    The discovery is stopped if the generator is closed or garbage collected
+    before it is finished, e.g. if you break out of a loop over the devices.
+    As for finddevices(), do not invoke a new discovery before a previous 
+    discovery has finished.
+    """,
 "findservices":
     """
     Performs a service discovery and returns the found services as a list of 
@@ -73,6 +93,33 @@ _docstrings = {
     
     Raise BluetoothError if the name cannot be retrieved.
     """,
+"configurecache":
+    """
+    Configures the cache of device discovery and service search results.
+    Arguments that are None are left unchanged.
+    
+    Arguments:
+        - path=None: a file in which to save the cache, so that results can be
+          reused by later processes. The cache is loaded from the file if it
+          exists. (The LIGHTBLUE_CACHE environment variable can also be set to
+          a file path.)
+        - ttls=None: a dictionary of the number of seconds for which each 
+          kind of result is kept. 0 means that kind is not cached, and None 
+          means it is never expired. The kinds are:
+            - "name": device names, for finddevicename() (default 1 day)
+            - "devices": finddevices() results (default 0)
+            - "services": findservices() results (default 0)
+            - "selector": the devices last shown by selectdevice() 
+              (default None)
+        - maxentries=None: the maximum number of cached results (default 512)
+    
+    Device and service discovery results are not cached by default. For 
+    example, to reuse service search results for 10 minutes, including across
+    processes:
+        >>> import lightblue
+        >>> lightblue.configurecache("/tmp/lightblue-cache", 
+        ...         ttls={"services": 600})
+    """,
 "gethostaddr":
     """
     Returns the address of the local bluetooth device. 
@@ -159,6 +206,7 @@ _docstrings = {
 # import implementation modules
 from _lightblue import *
 from _lightbluecommon import *
+from _discoverycache import configure as configurecache
 import obex     # plus submodule
 
 # set docstrings
@@ -170,3 +218,4 @@ for attr in _lightblue.__all__:
     except KeyError:
         pass
 del attr, localattrs
+configurecache.__doc__ = _docstrings["configurecache"]
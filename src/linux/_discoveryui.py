@@ -20,6 +20,8 @@ try:
 except ImportError, e:
     raise ImportError("Error loading GUIs for selectdevice() and selectservice(), Tkinter not found: " + str(e))
 
+import _discoverycache
+
 # Provides services for controlling a listbox, tracking selections, etc.
 class ListboxController(object):
 
@@ -207,9 +209,6 @@ class ItemSelectionController(object):
 
 class DeviceSelectionController(ItemSelectionController):
 
-    # keep cache across instances (and across different sessions)
-    _cache = []
-
     def __init__(self, listbox, cb_chosen):
         super(DeviceSelectionController, self).__init__(listbox, cb_chosen)
         self._discoverer = None
@@ -218,7 +217,9 @@ class DeviceSelectionController(ItemSelectionController):
 
     def close(self):
         self._stopdiscovery()
-        DeviceSelectionController._cache = self.__items[:]
+        # keep cache across instances (and across different sessions)
+        _discoverycache.cache.set("selector", None, self.__items[:])
+        _discoverycache.recorddevices(self.__items)
         super(DeviceSelectionController, self).close()
 
     def refreshdevices(self):
@@ -249,7 +250,7 @@ class DeviceSelectionController(ItemSelectionController):
         self._controller.listbox.update()
 
     def _loadcache(self):
-        for item in DeviceSelectionController._cache:
+        for item in _discoverycache.cache.get("selector", None, []):
             self._additem(item)
 
     def _stopdiscovery(self):
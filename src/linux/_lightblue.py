@@ -16,6 +16,12 @@
 # along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
 
 import socket as _socket
+import select
+import struct
+import threading
+import warnings
+import atexit
+import fcntl
 
 try:
     import bluetooth    # pybluez module
@@ -29,17 +35,26 @@ except ImportError, e:
 
 import _lightbluecommon
 import _lightblueutil
+import _discoverycache
+import _servicesearch
 
 
 # public attributes
-__all__ = ("finddevices", "findservices", "finddevicename",
+__all__ = ("finddevices", "iterdevices", "findservices", "finddevicename",
            "gethostaddr", "gethostclass",
            "socket",
            "advertise", "stopadvertise",
            "selectdevice", "selectservice")
 
-# device name cache
-_devicenames = {}
+# not defined in the socket module if python was built without bluetooth
+# support
+_AF_BLUETOOTH = getattr(_socket, "AF_BLUETOOTH", 31)
+
+# memoryview is only available in Python 2.6 and later
+try:
+    _memoryview = memoryview
+except NameError:
+    _memoryview = None
 
 # map lightblue protocol values to pybluez ones
 _PROTOCOLS = { _lightbluecommon.RFCOMM: bluetooth.RFCOMM,
@@ -47,7 +62,66 @@ _PROTOCOLS = { _lightbluecommon.RFCOMM: bluetooth.RFCOMM,
 
 
 def finddevices(getnames=True, length=10):
-    return _SyncDeviceInquiry().run(getnames, length)
+    devices = _discoverycache.cache.get("devices", getnames)
+    if devices is None:
+        devices = _SyncDeviceInquiry().run(getnames, length)
+        _discoverycache.cache.set("devices", getnames, devices[:])
+        _discoverycache.recorddevices(devices)
+    return devices[:]
+
+def iterdevices(getnames=True, length=10):
+    found = []
+    completed = []
+    inquiry = _MyDiscoverer(
+        lambda address, deviceclass, name: found.append(
+            _getdevicetuple(address, deviceclass, name)),
+        lambda: completed.append(True))
+    try:
+        # look up names after the inquiry instead of letting PyBluez do it,
+        # so that devices can be yielded as soon as they are found
+        inquiry.find_devices(lookup_names=False, duration=length)
+    except bluetooth.BluetoothError, e:
+        raise _lightbluecommon.BluetoothError(e)
+
+    devices = []
+    try:
+        while True:
+            done = bool(completed)
+            while found:
+                address, name, deviceclass = found.pop(0)
+                if address in [d[0] for d in devices]:
+                    continue
+                if getnames and name is None:
+                    # use the name from an earlier discovery, if it's cached
+                    name = _discoverycache.cache.get("name", address)
+                device = (address, name, deviceclass)
+                _discoverycache.recorddevices([device])
+                devices.append(device)
+                yield device
+            if done:
+                break
+            try:
+                if select.select([inquiry], [], [], 1)[0]:
+                    inquiry.process_event()
+            except (bluetooth.BluetoothError, select.error), e:
+                raise _lightbluecommon.BluetoothError(e)
+    finally:
+        if not completed:
+            inquiry.cancel_inquiry()
+
+    if getnames:
+        # look up the missing names in parallel, using the service search
+        # scheduler. If the generator is closed early, the lookups that are
+        # still running are abandoned rather than waited for.
+        unnamed = [d[0] for d in devices if d[1] is None]
+        lookup = lambda address: finddevicename(address, usecache=False)
+        for address, name, error in _servicesearch.searchservices(unnamed,
+                _servicesearch.ThreadedBackend(lookup)):
+            if error is None:
+                i = [d[0] for d in devices].index(address)
+                devices[i] = (address, name, devices[i][2])
+                yield devices[i]    # finddevicename() has cached the name
+    _discoverycache.cache.set("devices", getnames, devices[:])
 
 def findservices(addr=None, name=None, servicetype=None):
     # This always passes a uuid, to force PyBluez to use BlueZ 'search' instead
@@ -65,17 +139,52 @@ def findservices(addr=None, name=None, servicetype=None):
     else:
         raise ValueError("servicetype must be RFCOMM, OBEX or None, was %s" % \
             servicetype)
-    try:
-        services = bluetooth.find_service(name=name, uuid=uuid, address=addr)
-    except bluetooth.BluetoothError, e:
-        raise _lightbluecommon.BluetoothError(str(e))
 
-    if servicetype == _lightbluecommon.RFCOMM:
-        # OBEX services will be included with RFCOMM services (since OBEX is
-        # built on top of RFCOMM), so filter out the OBEX services
-        return [_getservicetuple(s) for s in services if not _isobexservice(s)]
+    if addr is None:
+        # names aren't needed, and would add a name request for each device
+        addresses = [d[0] for d in finddevices(getnames=False)]
     else:
-        return [_getservicetuple(s) for s in services]
+        addresses = [addr]
+
+    def query(address):
+        try:
+            found = bluetooth.find_service(uuid=uuid, address=address)
+        except bluetooth.BluetoothError, e:
+            raise _lightbluecommon.BluetoothError(str(e))
+        if servicetype == _lightbluecommon.RFCOMM:
+            # OBEX services will be included with RFCOMM services (since OBEX
+            # is built on top of RFCOMM), so filter out the OBEX services
+            return [_getservicetuple(s) for s in found
+                        if not _isobexservice(s)]
+        return [_getservicetuple(s) for s in found]
+
+    services = []
+    search = []
+    for address in addresses:
+        cached = _discoverycache.cache.get("services", (address, servicetype))
+        if cached is None:
+            search.append(address)
+        else:
+            services.extend(cached)
+
+    if addr is not None and search:
+        # just one device, so query it directly and let errors through
+        found = query(addr)
+        _discoverycache.cache.set("services", (addr, servicetype), found)
+        services.extend(found)
+    else:
+        # query the devices in parallel
+        for address, found, error in _servicesearch.searchservices(search,
+                _servicesearch.ThreadedBackend(query)):
+            if error is not None:
+                warnings.warn("findservices() couldn't get services for %s: %s"
+                        % (address, str(error)))
+                continue
+            _discoverycache.cache.set("services", (address, servicetype),
+                    found)
+            services.extend(found)
+
+    return [s for s in services if name is None or s[2] == name]
 
 
 def finddevicename(address, usecache=True):
@@ -86,7 +195,7 @@ def finddevicename(address, usecache=True):
         return _gethostname()
 
     if usecache:
-        name = _devicenames.get(address)
+        name = _discoverycache.cache.get("name", address)
         if name is not None:
             return name
 
@@ -94,69 +203,192 @@ def finddevicename(address, usecache=True):
     if name is None:
         raise _lightbluecommon.BluetoothError(
             "Could not find device name for %s" % address)
-    _devicenames[address] = name
+    _discoverycache.cache.set("name", address, name)
     return name
 
 
 ### local device ###
 
 def gethostaddr():
-    sock = _gethcisock()
-    try:
-        try:
-            addr = _lightblueutil.hci_read_bd_addr(sock.fileno(), 1000)
-        except IOError, e:
-            raise _lightbluecommon.BluetoothError(str(e))
-    finally:
-        sock.close()
-
-    return addr
+    return _localdevice.getaddr()
 
 
 def gethostclass():
-    sock = _gethcisock()
-    try:
-        try:
-            cod = _lightblueutil.hci_read_class_of_dev(sock.fileno(), 1000)
-        except IOError, e:
-            raise _lightbluecommon.BluetoothError(str(e))
-    finally:
-        sock.close()
-
-    return _lightbluecommon._joinclass(cod)
+    return _lightbluecommon._joinclass(_localdevice.getclass())
 
 
 def _gethostname():
-    sock = _gethcisock()
-    try:
+    return _localdevice.getname()
+
+
+# HCI commands whose Command Complete events mean that the cached local name
+# or class of device may have changed
+_OCF_WRITE_LOCAL_NAME = 0x0013
+_OCF_WRITE_CLASS_OF_DEV = 0x0024
+_WRITE_OPCODES = {
+    (_OCF_WRITE_LOCAL_NAME | (0x03 << 10)): "name",     # host controller OGF
+    (_OCF_WRITE_CLASS_OF_DEV | (0x03 << 10)): "class"
+}
+
+# packet type, event code, length, number of packets, opcode
+_CMD_COMPLETE_PREFIX = struct.Struct("<BBBBH")
+
+
+class _LocalDevice(object):
+    """
+    The local bluetooth adapter. This keeps one HCI socket open for all
+    requests, and caches the adapter's address, which never changes. The name
+    and class of device can be changed by other processes, so they are only
+    cached while the socket can watch for HCI events that could change them.
+
+    The socket is opened when it is first needed, and is closed on exit or
+    when close() is called.
+    """
+
+    def __init__(self, devid=-1):
+        self.__devid = devid
+        self.__sock = None
+        self.__lock = threading.Lock()
+        self.__addr = None
+        self.__mutable = {}     # cached name and class, cleared on HCI events
+        self.__watching = False
+
+    def getaddr(self):
+        self.__lock.acquire()
+        try:
+            if self.__addr is None:
+                self.__addr = self.__read(_lightblueutil.hci_read_bd_addr)
+            return self.__addr
+        finally:
+            self.__lock.release()
+
+    def getname(self):
+        return self.__getmutable("name", _lightblueutil.hci_read_local_name)
+
+    def getclass(self):
+        return self.__getmutable("class", _lightblueutil.hci_read_class_of_dev)
+
+    def refresh(self):
+        """
+        Discards the cached name and class of device.
+        """
+        self.__lock.acquire()
         try:
-            name = _lightblueutil.hci_read_local_name(sock.fileno(), 1000)
+            self.__mutable.clear()
+        finally:
+            self.__lock.release()
+
+    def close(self):
+        self.__lock.acquire()
+        try:
+            self.__close()
+        finally:
+            self.__lock.release()
+
+    def __getmutable(self, key, readfunc):
+        self.__lock.acquire()
+        try:
+            self.__checkevents()
+            value = self.__mutable.get(key)
+            if value is None:
+                value = self.__read(readfunc)
+                if self.__watching:
+                    self.__mutable[key] = value
+            return value
+        finally:
+            self.__lock.release()
+
+    def __read(self, readfunc):
+        if self.__sock is None:
+            self.__open()
+        try:
+            return readfunc(self.__sock.fileno(), 1000)
         except IOError, e:
+            # the adapter may have been reset or removed
+            self.__close()
             raise _lightbluecommon.BluetoothError(str(e))
-    finally:
-        sock.close()
-    return name
+
+    def __open(self):
+        self.__sock = _gethcisock(self.__devid)
+        # don't leak the socket into child processes
+        fd = self.__sock.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFD,
+                fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        # receive Command Complete events, so that cached values can be
+        # discarded when another process changes the name or class
+        try:
+            flt = _bluetooth.hci_filter_new()
+            _bluetooth.hci_filter_set_ptype(flt, _bluetooth.HCI_EVENT_PKT)
+            _bluetooth.hci_filter_set_event(flt, _bluetooth.EVT_CMD_COMPLETE)
+            self.__sock.setsockopt(_bluetooth.SOL_HCI, _bluetooth.HCI_FILTER,
+                    flt)
+            self.__watching = True
+        except (AttributeError, _bluetooth.error):
+            self.__watching = False
+
+    def __checkevents(self):
+        if self.__sock is None or not self.__watching:
+            return
+        try:
+            while select.select([self.__sock], [], [], 0)[0]:
+                packet = self.__sock.recv(258)
+                if not packet:
+                    break
+                # ignore events for other commands, including the reads
+                # made by this object
+                if len(packet) < _CMD_COMPLETE_PREFIX.size:
+                    continue
+                opcode = _CMD_COMPLETE_PREFIX.unpack_from(packet)[4]
+                key = _WRITE_OPCODES.get(opcode)
+                if key is not None:
+                    self.__mutable.pop(key, None)
+        except (select.error, _bluetooth.error):
+            self.__close()
+
+    def __close(self):
+        if self.__sock is not None:
+            try:
+                self.__sock.close()
+            except _bluetooth.error:
+                pass
+        self.__sock = None
+        self.__addr = None
+        self.__mutable.clear()
+        self.__watching = False
+
+_localdevice = _LocalDevice()
+atexit.register(_localdevice.close)
 
 
 ### socket ###
 
 class _SocketWrapper(object):
+    # _sock is the PyBluez BluetoothSocket, and _rawsock is its internal
+    # _bluetooth socket. Frequently used methods call _rawsock directly, which
+    # also allows timeouts to be raised as socket.timeout instead of the
+    # generic BluetoothError.
+    #
+    # PyBluez sockets don't support the new buffer interface, so _fdsock is a
+    # standard library socket on a duplicate of the socket's file descriptor,
+    # created when it is first needed for recv_into() or for sending
+    # memoryview objects.
+    __slots__ = ("_sock", "_rawsock", "_fdsock", "_advertised", "_listening")
 
     def __init__(self, sock):
-        self.__dict__["_sock"] = sock
-        self.__dict__["_advertised"] = False
-        self.__dict__["_listening"] = False
+        self._sock = sock
+        self._rawsock = sock._sock
+        self._fdsock = None
+        self._advertised = False
+        self._listening = False
 
     # must implement accept() to return _SocketWrapper objects
     def accept(self):
         try:
-            # access _sock._sock (i.e. pybluez socket's internal sock)
-            # this is so we can raise timeout errors with a different exception
-            conn, addr = self._sock._sock.accept()
+            conn, addr = self._rawsock.accept()
         except _bluetooth.timeout, te:
-            raise _socket.timeout(str(te))
+            raise _socket.timeout(*te.args)
         except _bluetooth.error, e:
-            raise _socket.error(str(e))
+            raise _socket.error(*e.args)
 
         # return new _SocketWrapper that wraps a new BluetoothSocket
         newsock = bluetooth.BluetoothSocket(_sock=conn)
@@ -167,6 +399,7 @@ class _SocketWrapper(object):
         if not self._listening:
             self._sock.listen(backlog)
             self._listening = True
+    listen.__doc__ = _lightbluecommon._socketdocs["listen"]
 
     # must implement dup() to return _SocketWrapper objects
     def dup(self):
@@ -180,33 +413,111 @@ class _SocketWrapper(object):
         return sockname     # not connected, should be ("00:00:00:00:00:00", 0)
     getsockname.__doc__ = _lightbluecommon._socketdocs["getsockname"]
 
-    # redefine methods that can raise timeout errors, to access _sock._sock
-    # in order to raise timeout errors with a different exception
-    # (otherwise they are raised as generic BluetoothException)
-    _methoddef = """def %s(self, *args, **kwargs):
+    def connect(self, address):
         try:
-            return self._sock._sock.%s(*args, **kwargs)
+            return self._rawsock.connect(address)
         except _bluetooth.timeout, te:
-            raise _socket.timeout(str(te))
+            raise _socket.timeout(*te.args)
         except _bluetooth.error, e:
-            raise _socket.error(str(e))
-        %s.__doc__ = _lightbluecommon._socketdocs['%s']\n"""
-    for _m in ("connect", "send", "recv"):
-        exec _methoddef % (_m, _m, _m, _m)
-    del _m, _methoddef
-
-    # wrap all other socket methods, to set LightBlue-specific docstrings
-    _othermethods = [_m for _m in _lightbluecommon._socketdocs.keys() \
-        if _m not in locals()]    # methods other than those already defined
-    _methoddef = """def %s(self, *args, **kwargs):
+            raise _socket.error(*e.args)
+    connect.__doc__ = _lightbluecommon._socketdocs["connect"]
+
+    def send(self, data, flags=0):
+        if type(data) is _memoryview:
+            return self._getfdsock().send(data, flags)
+        try:
+            return self._rawsock.send(data, flags)
+        except _bluetooth.timeout, te:
+            raise _socket.timeout(*te.args)
+        except _bluetooth.error, e:
+            raise _socket.error(*e.args)
+    send.__doc__ = _lightbluecommon._socketdocs["send"]
+
+    def sendall(self, data, flags=0):
+        if type(data) is _memoryview:
+            return self._getfdsock().sendall(data, flags)
+        try:
+            return self._rawsock.sendall(data, flags)
+        except _bluetooth.timeout, te:
+            raise _socket.timeout(*te.args)
+        except _bluetooth.error, e:
+            raise _socket.error(*e.args)
+    sendall.__doc__ = _lightbluecommon._socketdocs["sendall"]
+
+    def recv(self, bufsize, flags=0):
+        try:
+            return self._rawsock.recv(bufsize, flags)
+        except _bluetooth.timeout, te:
+            raise _socket.timeout(*te.args)
+        except _bluetooth.error, e:
+            raise _socket.error(*e.args)
+    recv.__doc__ = _lightbluecommon._socketdocs["recv"]
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        return self._getfdsock().recv_into(buffer, nbytes, flags)
+    recv_into.__doc__ = _lightbluecommon._socketdocs["recv_into"]
+
+    def recvfrom_into(self, buffer, nbytes=0, flags=0):
+        return self._getfdsock().recvfrom_into(buffer, nbytes, flags)
+    recvfrom_into.__doc__ = _lightbluecommon._socketdocs["recvfrom_into"]
+
+    def settimeout(self, timeout):
+        self._sock.settimeout(timeout)
+        if self._fdsock is not None:
+            self._fdsock.settimeout(timeout)
+    settimeout.__doc__ = _lightbluecommon._socketdocs["settimeout"]
+
+    def setblocking(self, flag):
+        if flag:
+            self.settimeout(None)
+        else:
+            self.settimeout(0.0)
+    setblocking.__doc__ = _lightbluecommon._socketdocs["setblocking"]
+
+    def close(self):
+        if self._fdsock is not None:
+            self._fdsock.close()
+            self._fdsock = None
+        self._sock.close()
+    close.__doc__ = _lightbluecommon._socketdocs["close"]
+
+    def _getfdsock(self):
+        if self._fdsock is None:
+            proto = getattr(self._sock, "_proto", bluetooth.RFCOMM)
+            if proto == bluetooth.RFCOMM:
+                socktype = _socket.SOCK_STREAM
+            else:
+                socktype = _socket.SOCK_SEQPACKET
+            try:
+                fdsock = _socket.fromfd(self._rawsock.fileno(),
+                        _AF_BLUETOOTH, socktype, proto)
+            except _bluetooth.error, e:
+                raise _socket.error(*e.args)
+            # the timeout is implemented in python, so it must be copied
+            fdsock.settimeout(self._rawsock.gettimeout())
+            self._fdsock = fdsock
+        return self._fdsock
+
+    def fileno(self):
+        return self._rawsock.fileno()
+    fileno.__doc__ = _lightbluecommon._socketdocs["fileno"]
+
+
+def _wrapsocketmethod(name):
+    def method(self, *args):
         try:
-            return self._sock.%s(*args, **kwargs)
+            return getattr(self._sock, name)(*args)
         except _bluetooth.error, e:
-            raise _socket.error(str(e))
-        %s.__doc__ = _lightbluecommon._socketdocs['%s']\n"""
-    for _m in _othermethods:
-        exec _methoddef % (_m, _m, _m, _m)
-    del _m, _methoddef
+            raise _socket.error(*e.args)
+    method.__name__ = name
+    method.__doc__ = _lightbluecommon._socketdocs[name]
+    return method
+
+# wrap all other socket methods, to set LightBlue-specific docstrings
+for _name in _lightbluecommon._socketdocs.keys():
+    if _name not in _SocketWrapper.__dict__:
+        setattr(_SocketWrapper, _name, _wrapsocketmethod(_name))
+del _name
 
 
 def socket(proto=_lightbluecommon.RFCOMM):
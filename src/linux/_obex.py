@@ -17,12 +17,20 @@
 
 import types
 import datetime
+import select
+import asyncore
+import time
+import logging
 
 import _lightbluecommon
 import _obexcommon
+import _obexcodec
+import _obexpool
 import _lightblueobex    # python extension
 
 from _obexcommon import OBEXError
+from _obexpool import OBEXSessionPool, sendfiles
+from _obexcodec import OBEXHeaders
 
 _HEADER_MASK = 0xc0
 _HEADER_UNICODE = 0x00
@@ -30,25 +38,49 @@ _HEADER_BYTE_SEQ = 0x40
 _HEADER_1BYTE = 0x80
 _HEADER_4BYTE = 0xc0
 
+# Single Response Mode headers and values (OBEX 1.5)
+_SRM = 0x97
+_SRMP = 0x98
+_SRM_ENABLE = 0x01
+_SRMP_WAIT = 0x01
+
+
+_log = logging.getLogger("lightblue.obex")
 
 # public attributes
-__all__ = ("sendfile", "recvfile", "OBEXClient")
+__all__ = ("sendfile", "sendfiles", "recvfile", "OBEXClient",
+        "AsyncOBEXClient", "OBEXPushService", "OBEXSessionPool", "OBEXHeaders")
 
 
 
 class OBEXClient(object):
     __doc__ = _obexcommon._obexclientclassdoc
 
-    def __init__(self, address, channel):
+    def __init__(self, address, channel, srm=False, mtu=None, bufsize=None):
         if not isinstance(address, types.StringTypes):
             raise TypeError("address must be string, was %s" % type(address))
         if not type(channel) == int:
             raise TypeError("channel must be int, was %s" % type(channel))
+        if mtu is None:
+            mtu = _obexcodec.MAX_PACKET_LENGTH
+        if not isinstance(mtu, int):
+            raise TypeError("mtu must be int, was %s" % type(mtu))
+        if mtu < _obexcodec.MIN_PACKET_LENGTH or \
+                mtu > _obexcodec.MAX_PACKET_LENGTH:
+            raise ValueError("mtu must be between %d and %d" %
+                (_obexcodec.MIN_PACKET_LENGTH, _obexcodec.MAX_PACKET_LENGTH))
+        if bufsize is not None and \
+                (not isinstance(bufsize, int) or bufsize <= 0):
+            raise ValueError("bufsize must be a positive int or None")
 
         self.__sock = None
         self.__client = None
         self.__serveraddr = (address, channel)
         self.__connectionid = None
+        self.__srm = bool(srm)
+        self.__mtu = mtu
+        self.__bufsize = bufsize
+        self.__linkparams = (None, None)
 
     def connect(self, headers={}):
         if self.__client is None:
@@ -56,13 +88,14 @@ class OBEXClient(object):
 
         try:
             resp = self.__client.request(_lightblueobex.CONNECT,
-                    self.__convertheaders(headers), None)
+                    _convertheaders(headers, self.__connectionid), None)
         except IOError, e:
             raise OBEXError(str(e))
 
+        self.__linkparams = self.__getlinkparams()
         result = self.__createresponse(resp)
         if result.code == _obexcommon.OK:
-            self.__connectionid = result.headers.get("connection-id", None)
+            self.__connectionid = result.getheader("connection-id")
         else:
             self.__closetransport()
         return result
@@ -73,7 +106,7 @@ class OBEXClient(object):
         try:
             try:
                 resp = self.__client.request(_lightblueobex.DISCONNECT,
-                        self.__convertheaders(headers), None)
+                        _convertheaders(headers, self.__connectionid), None)
             except IOError, e:
                 raise OBEXError(str(e))
         finally:
@@ -82,14 +115,17 @@ class OBEXClient(object):
         return self.__createresponse(resp)
 
 
-    def put(self, headers, fileobj):
-        if not hasattr(fileobj, "read"):
-            raise TypeError("file-like object must have read() method")
+    def put(self, headers, fileobj, length=None):
+        # iterators and buffers are read directly by the C extension
+        fileobj, length = _obexcommon._bodysource(fileobj, length)
+        if length is not None:
+            headers = _obexcodec.addlength(headers, length)
         self.__checkconnected()
 
         try:
             resp = self.__client.request(_lightblueobex.PUT,
-                    self.__convertheaders(headers), None, fileobj)
+                    _convertheaders(headers, self.__connectionid),
+                    None, fileobj)
         except IOError, e:
             raise OBEXError(str(e))
         return self.__createresponse(resp)
@@ -99,7 +135,7 @@ class OBEXClient(object):
         self.__checkconnected()
         try:
             resp = self.__client.request(_lightblueobex.PUT,
-                    self.__convertheaders(headers), None)
+                    _convertheaders(headers, self.__connectionid), None)
         except IOError, e:
             raise OBEXError(str(e))
         return self.__createresponse(resp)
@@ -111,12 +147,54 @@ class OBEXClient(object):
         self.__checkconnected()
         try:
             resp = self.__client.request(_lightblueobex.GET,
-                    self.__convertheaders(headers), None, fileobj)
+                    _convertheaders(headers, self.__connectionid),
+                    None, fileobj)
         except IOError, e:
             raise OBEXError(str(e))
         return self.__createresponse(resp)
 
 
+    def iterget(self, headers, chunksize=None):
+        # check the arguments now, rather than when iteration starts
+        self.__checkconnected()
+        headers = _convertheaders(headers, self.__connectionid)
+        return self.__iterget(headers, chunksize)
+
+    def __iterget(self, headers, chunksize):
+        # the packets are sent by _OBEXRequest rather than by OpenOBEX (which
+        # is idle between requests), so each response can be yielded as it is
+        # received, with or without SRM
+        pieces = _PieceList()
+        req = _OBEXRequest(_obexcodec.GET, headers, None, pieces,
+                self.__linkparams[0] or _obexcodec.MIN_PACKET_LENGTH,
+                srm=self.__srm)
+        try:
+            try:
+                for code in _iterrequest(self.__sock, req,
+                        self.__client.timeout):
+                    for data in _obexcommon._iterchunks(pieces, chunksize):
+                        yield data
+                    del pieces[:]
+            except IOError, e:
+                raise OBEXError(str(e))
+        finally:
+            if not req.done:
+                # the rest of the response can't be skipped
+                self.__closetransport()
+        if req.code != _obexcommon.OK:
+            raise OBEXError("server refused the Get request (%s)" %
+                    _obexcommon._OBEX_RESPONSES.get(req.code,
+                            "Unknown response code"))
+
+
+    def get_into(self, headers, buf):
+        pieces = self.iterget(headers)
+        try:
+            return _obexcommon._readinto(pieces, buf)
+        finally:
+            pieces.close()  # closes the transport if the data didn't fit
+
+
     def setpath(self, headers, cdtoparent=False, createdirs=False):
         self.__checkconnected()
         flags = 0
@@ -128,7 +206,8 @@ class OBEXClient(object):
         setpathdata = array.array('B', (flags, 0))  # zero for constants byte
         try:
             resp = self.__client.request(_lightblueobex.SETPATH,
-                    self.__convertheaders(headers), buffer(setpathdata))
+                    _convertheaders(headers, self.__connectionid),
+                    buffer(setpathdata))
         except IOError, e:
             raise OBEXError(str(e))
         return self.__createresponse(resp)
@@ -143,10 +222,19 @@ class OBEXClient(object):
                                      self.__serveraddr[1]))
             except bluetooth.BluetoothError, e:
                 raise OBEXError(str(e))
+            if self.__srm:
+                # OpenOBEX doesn't support SRM, so send the packets directly
+                self.__client = _SRMClient(self.__sock, rxmtu=self.__mtu,
+                        txmtu=self.__mtu)
+                return
             try:
-                self.__client = _lightblueobex.OBEXClient(self.__sock.fileno())
+                self.__client = _lightblueobex.OBEXClient(
+                        self.__sock.fileno(), rxmtu=self.__mtu,
+                        txmtu=self.__mtu)
             except IOError, e:
                 raise OBEXError(str(e))
+            # 0 means each chunk of Put data fills a whole packet
+            self.__client.sendbufsize = self.__bufsize or 0
 
     def __closetransport(self):
         try:
@@ -156,58 +244,35 @@ class OBEXClient(object):
         self.__connectionid = None
         self.__client = None
 
+    def _isalive(self):
+        # used by OBEXSessionPool to check an idle session before reusing it
+        if self.__client is None:
+            return False
+        try:
+            readable = select.select([self.__sock.fileno()], [], [], 0)[0]
+        except Exception:
+            return False
+        # nothing should be received between requests, so this means the
+        # server has closed the connection
+        return not readable
+
     def __checkconnected(self):
         if self.__client is None:
             raise OBEXError("must connect() before sending other requests")
 
-    def __createresponse(self, resp):
-        headers = resp[1]
-        for hid, value in headers.items():
-            if hid == 0x44:
-                headers[hid] = _obexcommon._datetimefromstring(value[:])
-            elif hid == 0xC4:
-                headers[hid] = datetime.datetime.fromtimestamp(value)
-            elif type(value) == buffer:
-                headers[hid] = value[:]
-        return _obexcommon.OBEXResponse(resp[0], headers)
-
-    def __convertheaders(self, headers):
-        result = {}
-        for header, value in headers.items():
-            if isinstance(header, types.StringTypes):
-                hid = \
-                    _obexcommon._HEADER_STRINGS_TO_IDS.get(header.lower())
-            else:
-                hid = header
-            if hid is None:
-                raise ValueError("unknown header '%s'" % header)
-            if isinstance(value, datetime.datetime):
-                value = value.strftime("%Y%m%dT%H%M%S")
-            self.__checkheadervalue(header, hid, value)
-            result[hid] = value
-        if self.__connectionid is not None:
-            result[_lightblueobex.CONNECTION_ID] = self.__connectionid
-        return result
+    def __getlinkparams(self):
+        # the packet length is negotiated in the Connect request and response
+        mtu = self.__client.txmtu
+        if 0 < self.__client.peermtu < mtu:
+            mtu = self.__client.peermtu
+        bufsize = self.__bufsize
+        if bufsize is None:
+            # as for lightblueobex_streambufsize() in the C extension
+            bufsize = mtu - 6
+        return (mtu, bufsize)
 
-    def __checkheadervalue(self, header, hid, value):
-        mask = hid & _HEADER_MASK
-        if mask == _HEADER_UNICODE:
-            if not isinstance(value, types.StringTypes):
-                raise TypeError("value for '%s' must be string, was %s" %
-                    (str(header), type(value)))
-        elif mask == _HEADER_BYTE_SEQ:
-            try:
-                buffer(value)
-            except:
-                raise TypeError("value for '%s' must be string, array or other buffer type, was %s" % (str(header), type(value)))
-        elif mask == _HEADER_1BYTE:
-            if not isinstance(value, int):
-                raise TypeError("value for '%s' must be int, was %s" %
-                    (str(header), type(value)))
-        elif mask == _HEADER_4BYTE:
-            if not isinstance(value, int) and not isinstance(value, long):
-                raise TypeError("value for '%s' must be int, was %s" %
-                    (str(header), type(value)))
+    def __createresponse(self, resp):
+        return _createresponse(resp, *self.__linkparams)
 
     # set method docstrings
     definedmethods = locals()   # i.e. defined methods in OBEXClient
@@ -218,6 +283,519 @@ class OBEXClient(object):
             pass
 
 
+def _createresponse(resp, mtu=None, bufsize=None):
+    # the header values are decoded when they are accessed
+    return _obexcommon.OBEXResponse(resp[0], resp[1], mtu, bufsize,
+            _decoderawheader)
+
+def _convertrawheaders(headers):
+    for hid, value in headers.items():
+        headers[hid] = _decoderawheader(hid, value)
+    return headers
+
+def _decoderawheader(hid, value):
+    if hid == 0x44:
+        return _obexcommon._datetimefromstring(value[:])
+    elif hid == 0xC4:
+        return datetime.datetime.fromtimestamp(value)
+    elif type(value) == buffer:
+        return value[:]
+    return value
+
+def _convertheaders(headers, connectionid=None):
+    if isinstance(headers, OBEXHeaders):
+        # already encoded, so just add the connection id in front
+        if connectionid is None:
+            return headers.data
+        return _obexcodec.packheader(_obexcodec.CONNECTION_ID,
+                connectionid) + headers.data
+    result = {}
+    for header, value in headers.items():
+        if isinstance(header, types.StringTypes):
+            hid = \
+                _obexcommon._HEADER_STRINGS_TO_IDS.get(header.lower())
+        else:
+            hid = header
+        if hid is None:
+            raise ValueError("unknown header '%s'" % header)
+        if isinstance(value, datetime.datetime):
+            value = value.strftime("%Y%m%dT%H%M%S")
+        _checkheadervalue(header, hid, value)
+        result[hid] = value
+    if connectionid is not None:
+        result[_lightblueobex.CONNECTION_ID] = connectionid
+    return result
+
+def _checkheadervalue(header, hid, value):
+    mask = hid & _HEADER_MASK
+    if mask == _HEADER_UNICODE:
+        if not isinstance(value, types.StringTypes):
+            raise TypeError("value for '%s' must be string, was %s" %
+                (str(header), type(value)))
+    elif mask == _HEADER_BYTE_SEQ:
+        try:
+            buffer(value)
+        except:
+            raise TypeError("value for '%s' must be string, array or other buffer type, was %s" % (str(header), type(value)))
+    elif mask == _HEADER_1BYTE:
+        if not isinstance(value, int):
+            raise TypeError("value for '%s' must be int, was %s" %
+                (str(header), type(value)))
+    elif mask == _HEADER_4BYTE:
+        if not isinstance(value, int) and not isinstance(value, long):
+            raise TypeError("value for '%s' must be int, was %s" %
+                (str(header), type(value)))
+
+
+class _OBEXRequest(object):
+    """
+    Keeps track of the packets to be sent and received for a single client
+    request, without doing any I/O itself. Call getpacket() to get the next
+    packet to be sent, and handleresponse() for each received response packet,
+    until 'done' is True.
+
+    If 'srm' is True, Put and Get requests will ask the server to use Single
+    Response Mode; getpacket() will then keep returning Put packets without
+    waiting for responses, and no further Get packets are sent after the
+    first response.
+    """
+
+    def __init__(self, opcode, headers, nonheaderdata=None, fileobj=None,
+            maxpacketlength=_obexcodec.MIN_PACKET_LENGTH, srm=False):
+        self.opcode = opcode
+        self.done = False
+        self.code = None
+        self.headers = {}
+        self.nonheaderdata = None
+
+        if opcode == _obexcodec.PUT and fileobj is not None and \
+                not hasattr(fileobj, "read"):
+            fileobj = _obexcommon._ChunkReader(fileobj)
+        self.__fileobj = fileobj
+        self.__maxlen = maxpacketlength
+        self.__nonheaderdata = ""
+        if nonheaderdata is not None:
+            self.__nonheaderdata = buffer(nonheaderdata)[:]
+        if isinstance(headers, str):
+            self.__headerdata = headers     # already encoded
+        else:
+            self.__headerdata = _obexcodec.packheaders(headers)
+        self.__srm = srm and (opcode == _obexcodec.GET or
+                (opcode == _obexcodec.PUT and fileobj is not None))
+        if self.__srm:
+            self.__headerdata += _obexcodec.packheader(_SRM, _SRM_ENABLE)
+        self.__srmactive = False
+        self.__cansend = True
+        self.__finalsent = False
+
+    def getpacket(self):
+        """
+        Returns the next packet to be sent, or None if a response must be
+        received first.
+        """
+        if self.done or not self.__cansend:
+            return None
+        headerdata = self.__headerdata
+        self.__headerdata = ""
+
+        if self.opcode == _obexcodec.PUT:
+            return self.__getputpacket(headerdata)
+
+        self.__cansend = False
+        self.__finalsent = True
+        packet = _obexcodec.packpacket(self.opcode | _obexcodec.FINAL,
+                headerdata, self.__nonheaderdata)
+        if len(packet) > self.__maxlen:
+            raise OBEXError("request headers are too large for the server")
+        return packet
+
+    def __getputpacket(self, headerdata):
+        # leave space for the packet prefix and the body header prefix
+        space = self.__maxlen - 6 - len(headerdata)
+        if space < 1:
+            raise OBEXError("request headers are too large for the server")
+        data = ""
+        if self.__fileobj is not None:
+            data = self.__fileobj.read(space)
+        if data:
+            self.__cansend = self.__srmactive
+            return _obexcodec.packpacket(_obexcodec.PUT,
+                    headerdata + _obexcodec.packheader(_obexcodec.BODY, data))
+
+        # no more data, so send the final packet
+        if self.__fileobj is not None:
+            headerdata += _obexcodec.packheader(_obexcodec.END_OF_BODY, "")
+        self.__cansend = False
+        self.__finalsent = True
+        return _obexcodec.packpacket(_obexcodec.PUT | _obexcodec.FINAL,
+                headerdata)
+
+    def handleresponse(self, packet):
+        """
+        Processes the given response packet.
+        """
+        code, final, nonheaderdata, headers = \
+            _obexcodec.unpackresponse(packet, self.opcode)
+        if self.opcode == _obexcodec.CONNECT:
+            self.nonheaderdata = nonheaderdata[:]
+        for hid, value in headers.iteritems():
+            if hid == _obexcodec.BODY or hid == _obexcodec.END_OF_BODY:
+                if self.__fileobj is not None and len(value) > 0:
+                    self.__fileobj.write(value)
+            elif hid != _SRM and hid != _SRMP:
+                self.headers[hid] = value
+
+        if code != _obexcommon.CONTINUE:
+            self.code = code
+            self.done = True
+            return
+
+        if self.__srm and headers.get(_SRM) == _SRM_ENABLE:
+            self.__srmactive = True
+        wait = (headers.get(_SRMP) == _SRMP_WAIT)
+        if self.opcode == _obexcodec.PUT:
+            self.__cansend = not self.__finalsent and not wait
+        elif self.opcode == _obexcodec.GET:
+            # with SRM, the server keeps sending responses without requests
+            self.__cansend = not self.__srmactive or wait
+        else:
+            raise OBEXError("unexpected Continue response")
+
+
+class _PieceList(list):
+    """
+    Collects the data written to it, as a file object for _OBEXRequest.
+    """
+    write = list.append
+
+
+class _SRMClient(object):
+    """
+    Sends client requests over a connected socket using _OBEXRequest, so that
+    Single Response Mode can be used for Put and Get requests. This has the
+    same request() interface as _lightblueobex.OBEXClient.
+    """
+
+    def __init__(self, sock, rxmtu=_obexcodec.MAX_PACKET_LENGTH,
+            txmtu=_obexcodec.MAX_PACKET_LENGTH, timeout=10):
+        self.__sock = sock
+        self.rxmtu = rxmtu
+        self.txmtu = txmtu
+        self.peermtu = 0
+        self.timeout = timeout
+
+    def request(self, opcode, headers, nonheaderdata, fileobj=None):
+        if opcode == _obexcodec.CONNECT and nonheaderdata is None:
+            nonheaderdata = _obexcodec.packconnectdata(self.rxmtu)
+        maxlen = _obexcodec.MIN_PACKET_LENGTH
+        if self.peermtu > 0:
+            maxlen = max(maxlen, min(self.peermtu, self.txmtu))
+        req = _OBEXRequest(opcode, headers, nonheaderdata, fileobj, maxlen,
+                srm=True)
+        for code in _iterrequest(self.__sock, req, self.timeout):
+            pass
+
+        if opcode == _obexcodec.CONNECT and req.code == _obexcommon.OK:
+            self.peermtu = _obexcodec.unpackconnectdata(req.nonheaderdata)[2]
+        return (req.code, req.headers)
+
+
+def _iterrequest(sock, req, timeout):
+    """
+    Sends the given _OBEXRequest over a connected socket, and yields after each
+    response packet is handled, until the request is done.
+
+    Raises IOError if an error occurs.
+    """
+    import bluetooth
+    fd = sock.fileno()
+    try:
+        while not req.done:
+            packet = req.getpacket()
+            if packet is None:
+                if not select.select([fd], [], [], timeout)[0]:
+                    raise IOError("timed out waiting for server response")
+                req.handleresponse(_obexcodec.recvpacket(sock))
+                yield req.code
+            else:
+                sock.sendall(packet)
+                # check for any early responses, e.g. if the server
+                # rejects a Put request or asks the client to wait
+                if select.select([fd], [], [], 0)[0]:
+                    req.handleresponse(_obexcodec.recvpacket(sock))
+                    yield req.code
+    except bluetooth.BluetoothError, e:
+        raise IOError(str(e))
+
+
+class AsyncOBEXClient(object):
+    """
+    An OBEX client that sends requests without blocking, so that a single
+    thread can run many OBEX sessions at once. (This is only available on
+    Linux.)
+
+    This works like OBEXClient, except that each request method returns
+    immediately, and the given callback is called with
+    (response, error) arguments once the request has completed: 'response' is
+    an OBEXResponse and 'error' is None if the request succeeded, otherwise
+    'response' is None and 'error' is an OBEXError. Requests are sent in the
+    order in which they were made.
+
+    The sessions are driven by the asyncore module, so you must call
+    asyncore.loop() to send and receive the requests. For example:
+
+        >>> import asyncore
+        >>> import lightblue
+        >>> def putdone(response, error):
+        ...     print response, error
+        ...
+        >>> for address, channel in devices:
+        ...     client = lightblue.obex.AsyncOBEXClient(address, channel)
+        ...     client.connect()
+        ...     client.put({"name": "photo.jpg"}, file("photo.jpg", "rb"),
+        ...         putdone)
+        ...     client.disconnect()
+        ...
+        >>> asyncore.loop()
+
+    File data for Put requests is read from the given file objects, and data
+    for Get requests is written to them, as the packets are sent and received.
+    """
+
+    def __init__(self, address, channel, srm=False, map=None):
+        """
+        Creates an asynchronous OBEX client.
+
+        Arguments:
+            - address: the address of the remote device
+            - channel: the RFCOMM channel of the remote OBEX service
+            - srm=False: if True, Put and Get requests will use Single
+              Response Mode if the server supports it
+            - map=None: the asyncore channel map to use, if not the default
+              global map
+        """
+        if not isinstance(address, types.StringTypes):
+            raise TypeError("address must be string, was %s" % type(address))
+        if not type(channel) == int:
+            raise TypeError("channel must be int, was %s" % type(channel))
+
+        self.__serveraddr = (address, channel)
+        self.__srm = bool(srm)
+        self.__map = map
+        self.__channel = None
+        self.__connectionid = None
+        self.__maxlen = _obexcodec.MIN_PACKET_LENGTH
+
+    def connect(self, headers={}, callback=None):
+        """
+        Establishes the Bluetooth connection to the remote OBEX server and
+        sends a Connect request. If the server refuses the Connect request,
+        the Bluetooth connection will be closed.
+        """
+        if self.__channel is not None:
+            raise OBEXError("session is already connected")
+        import bluetooth
+        sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        sock.setblocking(False)
+        self.__channel = _AsyncOBEXChannel(self, sock, self.__map)
+        try:
+            self.__channel.connect(self.__serveraddr)
+        except (bluetooth.BluetoothError, IOError), e:
+            self.__channel.close()
+            self.__channel = None
+            raise OBEXError(str(e))
+        self.__connectionid = None
+        self.__queue(_obexcodec.CONNECT, headers,
+                _obexcodec.packconnectdata(), None, callback)
+
+    def disconnect(self, headers={}, callback=None):
+        """
+        Sends a Disconnect request and then closes the Bluetooth connection.
+        """
+        self.__queue(_obexcodec.DISCONNECT, headers, None, None, callback)
+
+    def put(self, headers, fileobj, callback=None, length=None):
+        """
+        Sends a Put request, with the file data from the given file object,
+        buffer or iterable, as for OBEXClient.put().
+        """
+        fileobj, length = _obexcommon._bodysource(fileobj, length)
+        if length is not None:
+            headers = _obexcodec.addlength(headers, length)
+        self.__queue(_obexcodec.PUT, headers, None, fileobj, callback)
+
+    def delete(self, headers, callback=None):
+        """
+        Sends a Put-Delete request.
+        """
+        self.__queue(_obexcodec.PUT, headers, None, None, callback)
+
+    def get(self, headers, fileobj, callback=None):
+        """
+        Sends a Get request, and writes the received data to the given file
+        object.
+        """
+        if not hasattr(fileobj, "write"):
+            raise TypeError("file-like must have write() method")
+        self.__queue(_obexcodec.GET, headers, None, fileobj, callback)
+
+    def setpath(self, headers, cdtoparent=False, createdirs=False,
+            callback=None):
+        """
+        Sends a SetPath request. See OBEXClient.setpath() for details of the
+        arguments.
+        """
+        flags = 0
+        if cdtoparent:
+            flags |= 1
+        if not createdirs:
+            flags |= 2
+        self.__queue(_obexcodec.SETPATH, headers, chr(flags) + "\x00", None,
+                callback)
+
+    def close(self):
+        """
+        Closes the Bluetooth connection without sending a Disconnect request.
+        Any unfinished requests will fail with an OBEXError.
+        """
+        self.__closechannel(OBEXError("session was closed"))
+
+    def __closechannel(self, error):
+        channel = self.__channel
+        self.__channel = None
+        self.__connectionid = None
+        if channel is not None:
+            channel.fail(error)
+
+    def __queue(self, opcode, headers, nonheaderdata, fileobj, callback):
+        if self.__channel is None:
+            raise OBEXError("must connect() before sending other requests")
+        self.__channel.queue((opcode, headers, nonheaderdata, fileobj,
+                callback))
+
+    # called by _AsyncOBEXChannel
+
+    def _makerequest(self, item):
+        opcode, headers, nonheaderdata, fileobj = item[:4]
+        return _OBEXRequest(opcode,
+                _convertheaders(headers, self.__connectionid),
+                nonheaderdata, fileobj, self.__maxlen, self.__srm)
+
+    def _requestdone(self, item, request):
+        opcode, callback = item[0], item[4]
+        if opcode == _obexcodec.CONNECT:
+            if request.code == _obexcommon.OK:
+                self.__connectionid = request.headers.get(
+                        _lightblueobex.CONNECTION_ID)
+                maxlen = _obexcodec.unpackconnectdata(
+                        request.nonheaderdata)[2]
+                self.__maxlen = max(_obexcodec.MIN_PACKET_LENGTH, maxlen)
+            else:
+                self.__closechannel(OBEXError("server refused connection"))
+        elif opcode == _obexcodec.DISCONNECT:
+            self.__closechannel(OBEXError("session was disconnected"))
+        response = _createresponse((request.code, request.headers))
+        if callback is not None:
+            callback(response, None)
+
+    def _channelclosed(self, channel, items, error):
+        if self.__channel is channel:
+            self.__channel = None
+            self.__connectionid = None
+        for item in items:
+            if item[4] is not None:
+                item[4](None, error)
+
+
+class _AsyncOBEXChannel(asyncore.dispatcher):
+    """
+    Sends and receives the packets for an AsyncOBEXClient.
+    """
+
+    def __init__(self, client, sock, map=None):
+        asyncore.dispatcher.__init__(self, map=map)
+        self.set_socket(sock, map)
+        self.__client = client
+        self.__items = []
+        self.__request = None
+        self.__outbuf = ""
+        self.__inbuf = ""
+
+    def queue(self, item):
+        self.__items.append(item)
+        if self.__request is None:
+            self.__nextrequest()
+
+    def fail(self, error):
+        self.close()
+        items = self.__items
+        self.__items = []
+        self.__request = None
+        self.__client._channelclosed(self, items, error)
+
+    def __nextrequest(self):
+        self.__request = None
+        while self.__items and self.__request is None:
+            try:
+                self.__request = self.__client._makerequest(self.__items[0])
+            except (TypeError, ValueError), e:
+                # bad request headers, so just fail this one request
+                item = self.__items.pop(0)
+                if item[4] is not None:
+                    item[4](None, OBEXError(str(e)))
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        if not self.connected:
+            return True     # to find out when connected
+        if not self.__outbuf and self.__request is not None:
+            packet = self.__request.getpacket()
+            if packet is not None:
+                self.__outbuf = packet
+        return len(self.__outbuf) > 0
+
+    def handle_connect(self):
+        pass
+
+    def handle_write(self):
+        sent = self.send(self.__outbuf)
+        self.__outbuf = self.__outbuf[sent:]
+
+    def handle_read(self):
+        data = self.recv(_obexcodec.MAX_PACKET_LENGTH)
+        if not data:
+            return
+        self.__inbuf += data
+        while self.connected and len(self.__inbuf) >= 3:
+            length = _obexcodec.packetlength(self.__inbuf)
+            if len(self.__inbuf) < length:
+                break
+            packet = self.__inbuf[:length]
+            self.__inbuf = self.__inbuf[length:]
+            if self.__request is None:
+                raise OBEXError("received unexpected response")
+            self.__request.handleresponse(packet)
+            if self.__request.done:
+                item = self.__items.pop(0)
+                request = self.__request
+                self.__request = None
+                self.__client._requestdone(item, request)
+                if self.connected:
+                    self.__nextrequest()
+
+    def handle_close(self):
+        self.fail(OBEXError("connection was closed"))
+
+    def handle_error(self):
+        import sys
+        error = sys.exc_info()[1]
+        if not isinstance(error, OBEXError):
+            error = OBEXError(str(error))
+        self.fail(error)
+
+
 # ---------------------------------------------------------------------
 
 def sendfile(address, channel, source):
@@ -230,32 +808,17 @@ def sendfile(address, channel, source):
             not hasattr(source, "read"):
         raise TypeError("source must be string or file-like object with read() method")
 
-    if isinstance(source, types.StringTypes):
-        headers = {"name": source}
-        fileobj = file(source, "rb")
-        closefileobj = True
-    else:
-        if hasattr(source, "name"):
-            headers = {"name": source.name}
-        fileobj = source
-        closefileobj = False
-
     client = OBEXClient(address, channel)
     client.connect()
 
     try:
-        resp = client.put(headers, fileobj)
+        _obexpool.putfile(client, source)
     finally:
-        if closefileobj:
-            fileobj.close()
         try:
             client.disconnect()
         except:
             pass    # always ignore disconnection errors
 
-    if resp.code != _obexcommon.OK:
-        raise OBEXError("server denied the Put request")
-
 
 # ---------------------------------------------------------------------
 
@@ -343,6 +906,205 @@ class OBEXObjectPushServer(object):
         self.__error = (exc, msg)
 
 
+# ---------------------------------------------------------------------
+
+class OBEXPushService(object):
+    """
+    A long-running OBEX Object Push service that can receive files from many
+    clients at the same time. (This is only available on Linux.)
+
+    Unlike recvfile(), which receives a single file from a single client, this
+    keeps accepting client connections on the given server socket, and runs
+    all the client sessions in a single select() loop. The given callback is
+    called as callback(address, headers, fileobj) for each received file,
+    where 'address' is the client's address, 'headers' is a dictionary of the
+    Put request headers with string keys (e.g. "name", "type", "length") and
+    'fileobj' is a temporary file that contains the received data. The
+    temporary file is deleted after the callback returns.
+
+    If the callback raises an exception, the exception is logged to the
+    "lightblue.obex" logger and that client's session is closed, while the
+    other sessions carry on.
+
+    For example:
+        >>> from lightblue import *
+        >>> def gotfile(address, headers, fileobj):
+        ...     print "Got %s from %s" % (headers.get("name"), address)
+        ...
+        >>> s = socket()
+        >>> s.bind(("", 0))
+        >>> advertise("My OBEX Service", s, OBEX)
+        >>> service = obex.OBEXPushService(s, gotfile)
+        >>> service.run()
+    """
+
+    def __init__(self, sock, callback, maxsessions=7, timeout=60):
+        """
+        Creates the service.
+
+        Arguments:
+            - sock: the server socket on which the files are to be received.
+              As for recvfile(), an OBEX service should have been advertised
+              on this socket.
+            - callback: the function to be called for each received file
+            - maxsessions=7: the maximum number of client sessions to run at
+              once. Other clients will have to wait until a session finishes.
+            - timeout=60: the number of seconds after which an idle client
+              session is closed
+        """
+        if sock is None:
+            raise TypeError("Given socket is None")
+        if not callable(callback):
+            raise TypeError("callback must be callable")
+        if maxsessions < 1:
+            raise ValueError("maxsessions must be at least 1")
+        self.__sock = sock
+        self.__callback = callback
+        self.__maxsessions = maxsessions
+        self.__timeout = timeout
+        self.__sessions = {}    # fileno -> _OBEXPushSession
+        self.__running = False
+
+    def run(self):
+        """
+        Accepts client connections and receives files until stop() is called.
+        """
+        self.__running = True
+        sockfd = self.__sock.fileno()
+        try:
+            while self.__running:
+                fds = self.__sessions.keys()
+                if len(fds) < self.__maxsessions:
+                    fds.append(sockfd)
+                readable = select.select(fds, [], [], 1)[0]
+                for fd in readable:
+                    if fd == sockfd:
+                        self.__accept()
+                    else:
+                        self.__process(self.__sessions[fd])
+                self.__closeidlesessions()
+        finally:
+            self.__running = False
+
+    def stop(self):
+        """
+        Stops the service once the current call to the callback (if any) has
+        returned. This can be called from the callback or another thread.
+        """
+        self.__running = False
+
+    def close(self):
+        """
+        Closes all the client sessions. This does not close the server socket.
+        """
+        for session in self.__sessions.values():
+            session.close()
+        self.__sessions.clear()
+
+    def __accept(self):
+        conn, addr = self.__sock.accept()
+        try:
+            session = _OBEXPushSession(conn, addr)
+        except IOError:
+            conn.close()
+            return
+        self.__sessions[conn.fileno()] = session
+
+    def __process(self, session):
+        if session.server.process(1) < 0:
+            session.done = True
+        session.lastactivity = time.time()
+        try:
+            while session.received:
+                headers, fileobj = session.received.pop(0)
+                try:
+                    self.__callback(session.address, headers, fileobj)
+                except Exception:
+                    _log.exception("error in callback for file from %s" %
+                            session.address)
+                    session.done = True
+                    fileobj.close()
+                    break
+                fileobj.close()
+        finally:
+            if session.done:
+                self.__closesession(session)
+
+    def __closeidlesessions(self):
+        expired = time.time() - self.__timeout
+        for session in self.__sessions.values():
+            if session.lastactivity < expired:
+                self.__closesession(session)
+
+    def __closesession(self, session):
+        self.__sessions.pop(session.fileno, None)
+        session.close()
+
+
+class _OBEXPushSession(object):
+    """
+    Runs the OBEX server for a single client connection to an
+    OBEXPushService. Received files are added to 'received' as
+    (headers, fileobj) tuples.
+    """
+
+    def __init__(self, conn, address):
+        self.conn = conn
+        self.address = address[0]
+        self.fileno = conn.fileno()
+        self.received = []
+        self.done = False
+        self.lastactivity = time.time()
+        self.server = _lightblueobex.OBEXServer(self.fileno, self.error,
+                self.newrequest, self.requestdone)
+        self.__headers = None
+        self.__fileobj = None
+
+    def newrequest(self, opcode, reqheaders, nonheaderdata, hasbody):
+        if opcode == _lightblueobex.PUT:
+            import tempfile
+            self.__headers = reqheaders
+            self.__fileobj = tempfile.TemporaryFile()
+            return (_lightblueobex.SUCCESS, {}, self.__fileobj)
+        elif opcode in (_lightblueobex.CONNECT, _lightblueobex.DISCONNECT):
+            return (_lightblueobex.SUCCESS, {}, None)
+        else:
+            return (_lightblueobex.NOT_IMPLEMENTED, {}, None)
+
+    def requestdone(self, opcode):
+        if opcode == _lightblueobex.DISCONNECT:
+            self.done = True
+        elif opcode == _lightblueobex.PUT and self.__fileobj is not None:
+            self.__fileobj.seek(0)
+            headers = {}
+            for hid, value in _convertrawheaders(self.__headers).items():
+                name = _obexcommon._HEADER_IDS_TO_STRINGS.get(hid,
+                        "0x%02x" % hid)
+                headers[name] = value
+            self.received.append((headers, self.__fileobj))
+            self.__headers = None
+            self.__fileobj = None
+
+    def error(self, exc, msg):
+        # discard any partially received file
+        if self.__fileobj is not None:
+            self.__fileobj.close()
+            self.__fileobj = None
+        self.done = True
+
+    def close(self):
+        for headers, fileobj in self.received:
+            fileobj.close()
+        self.received = []
+        if self.__fileobj is not None:
+            self.__fileobj.close()
+            self.__fileobj = None
+        try:
+            self.conn.close()
+        except:
+            pass
+
+
 # ---------------------------------------------------------------------
 
 def recvfile(sock, dest):
@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
 
+import types
+
 import _lightbluecommon
 
 __all__ = ('OBEXResponse', 'OBEXError',
@@ -39,7 +41,7 @@ class OBEXError(_lightbluecommon.BluetoothError):
     pass
 
 
-class OBEXResponse:
+class OBEXResponse(object):
     """
     Contains the OBEX response received from an OBEX server.
 
@@ -75,17 +77,34 @@ class OBEXResponse:
     lightblue.obex.OK, lightblue.obex.FORBIDDEN, etc.).
     """
 
-    def __init__(self, code, rawheaders):
+    __slots__ = ("__code", "__rawheaders", "__decoded", "__decoder",
+            "__headers", "__mtu", "__bufsize")
+
+    # The header values are given as received, and each one is only decoded
+    # (e.g. time strings into datetime objects) by calling decoder(hid, value)
+    # when it is first accessed, since most callers only look at the code.
+    def __init__(self, code, rawheaders, mtu=None, bufsize=None,
+            decoder=None):
         self.__code = code
-        self.__reason = _OBEX_RESPONSES.get(code, "Unknown response code")
         self.__rawheaders = rawheaders
+        self.__decoder = decoder
+        if decoder is None:
+            self.__decoded = rawheaders
+        else:
+            self.__decoded = {}
         self.__headers = None
+        self.__mtu = mtu
+        self.__bufsize = bufsize
     code = property(lambda self: self.__code,
             doc='The response code, without the final bit set.')
-    reason = property(lambda self: self.__reason,
+    reason = property(
+            lambda self: _OBEX_RESPONSES.get(self.__code,
+                    "Unknown response code"),
             doc='A string description of the response code.')
-    rawheaders = property(lambda self: self.__rawheaders,
-            doc='The response headers, as a dictionary with header ID (unsigned byte) keys.')
+    mtu = property(lambda self: self.__mtu,
+            doc='The maximum packet length used for sending requests in this session, or None if not known.')
+    bufsize = property(lambda self: self.__bufsize,
+            doc='The number of bytes read from the file object for each chunk of Put data in this session, or None if not known.')
 
     def getheader(self, header, default=None):
         '''
@@ -96,13 +115,37 @@ class OBEXResponse:
         Returns the specified default value if the header is not present.
         '''
         if isinstance(header, types.StringTypes):
-            return self.headers.get(header.lower(), default)
-        return self.__rawheaders.get(header, default)
+            hid = _HEADER_STRINGS_TO_IDS.get(header.lower())
+            if hid is None:
+                return self.headers.get(header.lower(), default)
+        else:
+            hid = header
+        if hid not in self.__rawheaders:
+            return default
+        return self.__decode(hid)
+
+    def __decode(self, hid):
+        try:
+            return self.__decoded[hid]
+        except KeyError:
+            value = self.__decoder(hid, self.__rawheaders[hid])
+            self.__decoded[hid] = value
+            return value
+
+    def __getrawheaders(self):
+        if self.__decoder is not None:
+            for hid in self.__rawheaders:
+                self.__decode(hid)
+            self.__rawheaders = self.__decoded
+            self.__decoder = None
+        return self.__rawheaders
+    rawheaders = property(__getrawheaders,
+            doc='The response headers, as a dictionary with header ID (unsigned byte) keys.')
 
     def __getheaders(self):
         if self.__headers is None:
             self.__headers = {}
-            for headerid, value in self.__rawheaders.items():
+            for headerid, value in self.__getrawheaders().items():
                 if headerid in _HEADER_IDS_TO_STRINGS:
                     self.__headers[_HEADER_IDS_TO_STRINGS[headerid]] = value
                 else:
@@ -113,7 +156,150 @@ class OBEXResponse:
 
     def __repr__(self):
         return "<OBEXResponse reason='%s' code=0x%02x (0x%02x) headers=%s>" % \
-            (self.__reason, self.__code, (self.__code | 0x80), str(self.headers))
+            (self.reason, self.__code, (self.__code | 0x80), str(self.headers))
+
+
+def _iterchunks(pieces, chunksize):
+    # splits the pieces of data into buffers of at most <chunksize> bytes
+    for data in pieces:
+        if chunksize is None or len(data) <= chunksize:
+            yield data
+        else:
+            for offset in range(0, len(data), chunksize):
+                yield buffer(data, offset, chunksize)
+
+
+def _bodysource(source, length=None):
+    # Returns the given Put data as a file-like object or an iterator, and the
+    # length of the data if it is known. Buffer objects are returned in a
+    # one-item iterator, so that they are sent without being copied, and
+    # regular files are memory-mapped so that they aren't read in chunks.
+    if hasattr(source, "read"):
+        mapped = _mapfile(source)
+        if mapped is None:
+            return (source, length)
+        chunks, size = mapped
+        if length is None and size <= 0xffffffffL:
+            length = size   # too large for a Length header otherwise
+        return (chunks, length)
+    if isinstance(source, unicode):
+        # it has no single byte encoding, so it must be encoded by the caller
+        raise TypeError("file data must be byte string, not unicode (encode the text first)")
+    try:
+        size = len(buffer(source))
+    except TypeError:
+        pass
+    else:
+        if length is None:
+            length = size
+        return (iter((source, )), length)
+    try:
+        return (iter(source), length)
+    except TypeError:
+        raise TypeError("file data must be file-like object, buffer or iterable, was %s" % type(source))
+
+
+# size of the pieces in which memory-mapped files are given to the OBEX engines
+_MAP_CHUNK_SIZE = 1 << 24
+
+def _mapfile(fileobj):
+    # Returns an iterator of buffers that hold the data in the given built-in
+    # file object from its current position, and the number of bytes. Returns
+    # None if the file isn't a non-empty regular file that can be mapped.
+    if not isinstance(fileobj, types.FileType):
+        return None
+    try:
+        import mmap
+    except ImportError:
+        return None     # no mmap on pys60
+    import os
+    import stat
+    try:
+        fd = fileobj.fileno()
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        filesize = st.st_size
+        start = fileobj.tell()
+        if filesize - start <= 0:
+            return None
+        mapping = mmap.mmap(fd, filesize, access=mmap.ACCESS_READ)
+    except (EnvironmentError, ValueError):
+        return None
+    return (_iterfilemap(fileobj, mapping, start, filesize), filesize - start)
+
+def _iterfilemap(fileobj, mapping, start, end):
+    # The file position is moved past each chunk when the next one is asked
+    # for, since the chunk has been sent by then, and the mapping is closed
+    # once the iterator is exhausted or closed. Buffers into a closed mapping
+    # must not be used, so the OBEX engines mustn't hold on to a chunk after
+    # asking for the next one.
+    try:
+        for offset in xrange(start, end, _MAP_CHUNK_SIZE):
+            yield buffer(mapping, offset, _MAP_CHUNK_SIZE)
+            fileobj.seek(min(offset + _MAP_CHUNK_SIZE, end))
+    finally:
+        mapping.close()
+
+
+class _ChunkReader(object):
+    """
+    Provides a read() method for an iterator of strings or buffers, for Put
+    requests that read the data from a file-like object.
+    """
+
+    def __init__(self, chunks):
+        self.__chunks = chunks
+        self.__data = ""
+        self.__offset = 0
+
+    def read(self, size=-1):
+        pieces = []
+        while size != 0:
+            available = len(self.__data) - self.__offset
+            if available <= 0:
+                if pieces:
+                    # stop at the end of this chunk (or copy it, to read
+                    # everything), since asking for the next one may
+                    # invalidate it (see _iterfilemap())
+                    if size > 0:
+                        break
+                    pieces = ["".join([data[:] for data in pieces])]
+                self.__data = ""
+                self.__offset = 0
+                try:
+                    self.__data = self.__chunks.next()
+                except StopIteration:
+                    break
+                continue
+            if size < 0 or size > available:
+                count = available
+            else:
+                count = size
+            pieces.append(buffer(self.__data, self.__offset, count))
+            self.__offset += count
+            if size > 0:
+                size -= count
+        if len(pieces) == 1:
+            return pieces[0]
+        return "".join([data[:] for data in pieces])
+
+
+def _readinto(pieces, buf):
+    # writes the pieces of data into buf, and returns the number of bytes
+    try:
+        view = memoryview(buf)
+    except NameError:
+        view = buf      # no memoryview before python 2.7
+    count = 0
+    for data in pieces:
+        end = count + len(data)
+        if end > len(buf):
+            raise OBEXError("received data is larger than the buffer (%d bytes)"
+                    % len(buf))
+        view[count:end] = data
+        count = end
+    return count
 
 
 try:
@@ -164,7 +350,9 @@ _HEADER_STRINGS_TO_IDS = {
     "wan-uuid": 0x50,
     "object-class": 0x51,
     "session-parameters": 0x52,
-    "session-sequence-number": 0x93
+    "session-sequence-number": 0x93,
+    "single-response-mode": 0x97,
+    "single-response-mode-parameters": 0x98
 }
 
 _HEADER_IDS_TO_STRINGS = {}
@@ -273,6 +461,8 @@ _obexclientclassdoc = \
         - "object-class" -> a string or buffer
         - "session-parameters" -> a string or buffer
         - "session-sequence-number" -> an int less than 256
+        - "single-response-mode" -> an int less than 256
+        - "single-response-mode-parameters" -> an int less than 256
         
     (The string header keys are not case-sensitive.)
 
@@ -296,6 +486,13 @@ _obexclientclassdoc = \
     automatically included by OBEXClient in the request headers if a
     connection-id was received in a previous Connect response.
 
+    If the same headers are sent in many requests, create an OBEXHeaders
+    object from them and pass it instead of the dictionary, so that the
+    headers are only checked and encoded once:
+        >>> headers = lightblue.obex.OBEXHeaders({"type": "x-bt/img-img"})
+        >>> client.get(headers, fileobject)
+        >>>
+
     See the included src/examples/obex_ftp_client.py for an example of using
     OBEXClient to implement a File Transfer client for browsing the files on a
     remote device.
@@ -309,6 +506,21 @@ _obexclientdocs = {
     Arguments:
         - address: the address of the remote device
         - channel: the RFCOMM channel of the remote OBEX service
+        - srm=False: if True, the client will ask the server to use OBEX 1.5
+          Single Response Mode for Put and Get requests, so that file data is
+          streamed without waiting for a response to every packet. Requests
+          fall back to the usual request/response exchange if the server does
+          not support it. (This is only available on Linux.)
+        - mtu=None: the maximum packet length to send and receive. If None,
+          the largest possible packet length is used, and the actual length
+          is negotiated with the server when connecting. (This is only
+          available on Linux.)
+        - bufsize=None: the number of bytes to read from the file object for
+          each chunk of Put data. If None, this is chosen so that each chunk
+          fills a whole packet. (This is only available on Linux.)
+
+    The packet length and chunk size that are used for a session are
+    available through the 'mtu' and 'bufsize' attributes of each OBEXResponse.
     """,
 "connect":
     """
@@ -353,8 +565,21 @@ _obexclientdocs = {
 
     Arguments:
         - headers: the headers to send for the request
-        - fileobj: a file-like object containing the file data to be sent for
-          the request
+        - fileobj: the file data to be sent for the request. This can be a
+          file-like object, a string or other buffer object (e.g. a bytearray
+          or mmap), or an iterable that yields strings or buffers (e.g. a
+          generator that produces the data as it is sent). Unicode strings
+          raise TypeError, since text must be encoded before it is sent.
+        - length=None: the length of the data, to be sent in a Length header
+          if the headers don't already include one. For a buffer object, this
+          defaults to the buffer's length.
+
+    A built-in file object for any regular file is memory-mapped and sent
+    from its current position without being read in chunks. A Length header
+    for the number of bytes from the current position to the end of the file
+    is added automatically if the headers don't include one (unless the file
+    is too large for it), and the file position is moved forward as the data
+    is sent.
 
     For example, to send a file named 'photo.jpg', using the request headers 
     to notify the server of the file's name, MIME type and length:
@@ -366,6 +591,15 @@ _obexclientdocs = {
                 "length": 28566}, file("photo.jpg", "rb"))
         <OBEXResponse reason='OK' code=0x20 (0xa0) headers={}>
         >>>
+
+    Or to send data as it is generated, without storing all of it first:
+        >>> def vcards():
+        ...     for contact in contacts:
+        ...         yield contact.tovcard()
+        ...
+        >>> client.put({"name": "contacts.vcf"}, vcards())
+        <OBEXResponse reason='OK' code=0x20 (0xa0) headers={}>
+        >>>
     """,
 "delete":
     """
@@ -421,6 +655,48 @@ _obexclientdocs = {
         'test file'
         >>>
     """,
+"iterget":
+    """
+    Sends a Get request, and returns an iterator that yields the received
+    file data in pieces as it arrives, so that it can be processed (e.g.
+    hashed or decompressed) without being stored first.
+
+    Raises lightblue.obex.OBEXError if connect() has not been called, if an
+    error occurs during the request, or (once the data has been read) if the
+    server refuses the request.
+
+    Arguments:
+        - headers: the headers to send for the request, as for get()
+        - chunksize=None: if given, the maximum size of each yielded piece.
+          Otherwise, pieces are yielded as they are received.
+
+    The pieces are strings or buffer objects. If you stop iterating before
+    the end of the data, the connection is closed, since the request cannot
+    be completed.
+
+    An example:
+        >>> import hashlib
+        >>> digest = hashlib.md5()
+        >>> for data in client.iterget({"name": "photo.jpg"}):
+        ...     digest.update(data)
+        ...
+        >>>
+    """,
+"get_into":
+    """
+    Sends a Get request, writes the received file data into the given
+    writable buffer (e.g. a bytearray), and returns the number of bytes
+    received. This is useful for objects whose size is known beforehand,
+    e.g. from the Length header in a folder listing or an earlier response.
+
+    Raises lightblue.obex.OBEXError if connect() has not been called, if an
+    error occurs during the request, if the server refuses the request, or if
+    the data doesn't fit into the buffer.
+
+    Arguments:
+        - headers: the headers to send for the request, as for get()
+        - buf: the buffer to write the data into
+    """,
 "setpath":
     """
     Sends a SetPath request in order to set the "current path" on the remote
@@ -0,0 +1,343 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Keeps OBEX client sessions connected so that they can be reused for many
+# requests, instead of connecting and disconnecting for each file.
+#
+# The sessions are the platform's _obex.OBEXClient objects, which must also
+# provide an _isalive() method that returns whether the session's transport
+# connection is still open.
+
+import datetime
+import os
+import time
+import threading
+import types
+
+import _lightbluecommon
+import _obexcommon
+from _obexcommon import OBEXError
+
+
+# default number of seconds after which an unused session is disconnected
+IDLE_TIMEOUT = 30
+
+# default maximum number of sessions to each (address, channel)
+MAX_PER_DEVICE = 1
+
+
+class OBEXSessionPool(object):
+    """
+    A pool of connected OBEX client sessions, keyed by (address, channel).
+
+    A session is taken from the pool with acquire() and returned with
+    release(), and an unused session is disconnected once it has been idle for
+    <idletimeout> seconds. A session is checked before it is reused, and is
+    replaced with a new connection if the remote device has closed it.
+
+    For example, to send several files to a device over one connection:
+        >>> import lightblue
+        >>> pool = lightblue.obex.OBEXSessionPool()
+        >>> pool.sendfiles("00:0D:93:19:C8:68", 10, ["a.jpg", "b.jpg"])
+        >>> pool.close()
+
+    Or, to send other requests:
+        >>> client = pool.acquire("00:0D:93:19:C8:68", 10)
+        >>> try:
+        ...     client.put({"name": "c.txt"}, file("c.txt", "rb"))
+        ... finally:
+        ...     pool.release(client)
+        ...
+        <OBEXResponse reason='OK' code=0x20 (0xa0) headers={}>
+    """
+
+    def __init__(self, idletimeout=IDLE_TIMEOUT, maxperdevice=MAX_PER_DEVICE,
+            connectheaders={}, clientoptions={}):
+        """
+        Creates the pool.
+
+        Arguments:
+            - idletimeout=30: the number of seconds after which an unused
+              session is disconnected, or None to keep unused sessions
+              connected until close() is called
+            - maxperdevice=1: the maximum number of sessions to each
+              (address, channel) at once. acquire() waits for a session to be
+              released if this many sessions are in use.
+            - connectheaders={}: the headers to send in the Connect request
+              for each new session (e.g. a "target" header)
+            - clientoptions={}: the keyword arguments to pass to the
+              OBEXClient constructor for each new session (e.g.
+              {"srm": True, "bufsize": 65536} on Linux)
+        """
+        if maxperdevice < 1:
+            raise ValueError("maxperdevice must be at least 1")
+        self.__idletimeout = idletimeout
+        self.__maxperdevice = maxperdevice
+        self.__connectheaders = connectheaders
+        self.__clientoptions = clientoptions
+        self.__idle = {}    # (address, channel) -> [(lastused, client), ...]
+        self.__inuse = {}   # client -> (address, channel)
+        self.__counts = {}  # (address, channel) -> number of sessions
+        self.__cond = threading.Condition()
+
+    def acquire(self, address, channel, timeout=None):
+        """
+        Returns a connected OBEXClient for the given address and channel,
+        reusing an idle session if there is one. The client must be returned
+        to the pool with release() when it is no longer needed.
+
+        Raises OBEXError if the session could not be connected, or if
+        <timeout> seconds pass (when timeout is not None) without a session
+        becoming available.
+        """
+        if not _lightbluecommon._isbtaddr(address):
+            raise TypeError("address '%s' is not a valid bluetooth address"
+                % address)
+        if not isinstance(channel, int):
+            raise TypeError("channel must be int, was %s" % type(channel))
+        key = (address, channel)
+        if timeout is not None:
+            endtime = time.time() + timeout
+
+        # idle sessions are checked and disconnected without holding the
+        # lock, since these may block on the transport
+        while True:
+            client = None
+            dropped = []
+            self.__cond.acquire()
+            try:
+                dropped.extend(self.__expireidle())
+                while True:
+                    if self.__idle.get(key):
+                        client = self.__idle[key].pop()[1]
+                        self.__inuse[client] = key
+                        break
+                    if self.__counts.get(key, 0) < self.__maxperdevice:
+                        # reserve a place for the new session while connecting
+                        self.__counts[key] = self.__counts.get(key, 0) + 1
+                        break
+                    if timeout is None:
+                        self.__cond.wait()
+                    else:
+                        remaining = endtime - time.time()
+                        if remaining <= 0:
+                            raise OBEXError("timed out waiting for a session")
+                        self.__cond.wait(remaining)
+            finally:
+                self.__cond.release()
+                _disconnect(dropped)
+            if client is None:
+                break
+            if client._isalive():
+                return client
+            self.__cond.acquire()
+            try:
+                del self.__inuse[client]
+                self.__remove(key)
+            finally:
+                self.__cond.release()
+            _disconnect([client])
+
+        try:
+            client = self._createclient(address, channel)
+            resp = client.connect(self.__connectheaders)
+            if resp.code != _obexcommon.OK:
+                raise OBEXError("server denied the Connect request")
+        except:
+            self.__cond.acquire()
+            try:
+                self.__counts[key] -= 1
+                self.__cond.notify()
+            finally:
+                self.__cond.release()
+            raise
+
+        self.__cond.acquire()
+        try:
+            self.__inuse[client] = key
+        finally:
+            self.__cond.release()
+        return client
+
+    def release(self, client, reuse=True):
+        """
+        Returns a client that was given by acquire() to the pool.
+
+        If reuse is False, or the session's connection has been closed, the
+        session is disconnected instead of being kept for reuse. This should
+        be done if a request failed partway through.
+        """
+        # check the connection before taking the lock, since it may block
+        reuse = reuse and client in self.__inuse and client._isalive()
+        dropped = []
+        self.__cond.acquire()
+        try:
+            key = self.__inuse.pop(client, None)
+            if key is None:
+                raise ValueError("client was not acquired from this pool")
+            if reuse:
+                self.__idle.setdefault(key, []).append((time.time(), client))
+            else:
+                self.__remove(key)
+                dropped.append(client)
+            dropped.extend(self.__expireidle())
+            self.__cond.notify()
+        finally:
+            self.__cond.release()
+            _disconnect(dropped)
+
+    def sendfiles(self, address, channel, sources):
+        """
+        Sends files to a remote device using one session from the pool.
+
+        Raises OBEXError if a file cannot be sent. Files before that one will
+        have been sent. The session is kept for reuse if the server refused a
+        file, and is disconnected if the request failed partway through.
+
+        Arguments:
+            - address: the address of the remote device
+            - channel: the RFCOMM channel of the remote OBEX service
+            - sources: a sequence of filenames or file-like objects, as for
+              sendfile()
+        """
+        client = self.acquire(address, channel)
+        reuse = False
+        try:
+            for source in sources:
+                resp = _putfile(client, source)
+                if resp.code != _obexcommon.OK:
+                    # the request completed, so the session can be reused
+                    reuse = True
+                    raise OBEXError("server denied the Put request")
+            reuse = True
+        finally:
+            self.release(client, reuse)
+
+    def closeidle(self):
+        """
+        Disconnects the sessions that have been idle for longer than the idle
+        timeout. This is also done whenever a session is acquired or released.
+        """
+        self.__cond.acquire()
+        try:
+            dropped = self.__expireidle()
+        finally:
+            self.__cond.release()
+        _disconnect(dropped)
+
+    def close(self):
+        """
+        Disconnects all the idle sessions. Sessions that are in use are
+        disconnected when they are released.
+        """
+        dropped = []
+        self.__cond.acquire()
+        try:
+            for key, sessions in self.__idle.items():
+                for lastused, client in sessions:
+                    self.__remove(key)
+                    dropped.append(client)
+            self.__idle.clear()
+        finally:
+            self.__cond.release()
+        _disconnect(dropped)
+
+    def _createclient(self, address, channel):
+        import _obex
+        return _obex.OBEXClient(address, channel, **self.__clientoptions)
+
+    # Removes the idle sessions that have expired, and returns them so that
+    # they can be disconnected after the lock is released.
+    def __expireidle(self):
+        if self.__idletimeout is None:
+            return []
+        expired = time.time() - self.__idletimeout
+        dropped = []
+        for key, sessions in self.__idle.items():
+            while sessions and sessions[0][0] < expired:
+                self.__remove(key)
+                dropped.append(sessions.pop(0)[1])
+            if not sessions:
+                del self.__idle[key]
+        return dropped
+
+    # Frees the place of a session that is being dropped. Must be called with
+    # the lock held.
+    def __remove(self, key):
+        self.__counts[key] -= 1
+        if self.__counts[key] == 0:
+            del self.__counts[key]
+        self.__cond.notify()
+
+
+def _disconnect(clients):
+    for client in clients:
+        try:
+            client.disconnect()
+        except:
+            pass    # always ignore disconnection errors
+
+
+def putfile(client, source):
+    """
+    Sends the given filename or file-like object in a Put request through the
+    given connected client, and raises OBEXError if the request is refused.
+
+    Local files are memory-mapped by client.put(), and the Time header is set
+    to the file's modification time.
+    """
+    resp = _putfile(client, source)
+    if resp.code != _obexcommon.OK:
+        raise OBEXError("server denied the Put request")
+
+
+# sends the Put request for putfile() and returns the response
+def _putfile(client, source):
+    if not isinstance(source, types.StringTypes) and \
+            not hasattr(source, "read"):
+        raise TypeError("source must be string or file-like object with read() method")
+
+    if isinstance(source, types.StringTypes):
+        headers = {"name": source}
+        fileobj = file(source, "rb")
+        closefileobj = True
+    else:
+        headers = {}
+        if hasattr(source, "name"):
+            headers = {"name": source.name}
+        fileobj = source
+        closefileobj = False
+    if isinstance(fileobj, types.FileType):
+        try:
+            mtime = os.fstat(fileobj.fileno()).st_mtime
+            headers["time"] = datetime.datetime.fromtimestamp(mtime)
+        except (EnvironmentError, ValueError):
+            pass    # not a local file
+
+    try:
+        return client.put(headers, fileobj)
+    finally:
+        if closefileobj:
+            fileobj.close()
+
+
+def sendfiles(address, channel, sources):
+    pool = OBEXSessionPool()
+    try:
+        pool.sendfiles(address, channel, sources)
+    finally:
+        pool.close()
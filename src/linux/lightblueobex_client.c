@@ -27,7 +27,10 @@ typedef struct {
     obex_t *obex;
     int busy;
     int timeout;
-    int sendbufsize;
+    int sendbufsize;    /* 0 to fit each chunk into a single packet */
+    int rxmtu;
+    int txmtu;
+    int peermtu;        /* from the Connect response, or 0 if unknown */
 
     int resp;
     PyObject *resp_headers;
@@ -50,6 +53,13 @@ obexclient_requestcleanup(OBEXClient *self)
     self->tempbuf = NULL;
 }
 
+static int
+obexclient_streambufsize(OBEXClient *self)
+{
+    return lightblueobex_streambufsize(self->sendbufsize, self->txmtu,
+            self->peermtu);
+}
+
 static void
 obexclient_seterror(OBEXClient *self, PyObject *exc, char *message)
 {
@@ -80,9 +90,11 @@ obexclient_feedstream(OBEXClient *self, obex_object_t *obj)
     self->fileobj shouldn't be NULL since startrequest() doesn't set
     OBEX_FL_STREAM_START (and so this shouldn't be called) if fileobj is null
     */
+    PyObject *buf;
+    buf = lightblueobex_filetostream(self->obex, obj, self->fileobj,
+            obexclient_streambufsize(self), self->tempbuf);
     Py_XDECREF(self->tempbuf);
-    self->tempbuf = lightblueobex_filetostream(self->obex, obj, self->fileobj,
-            self->sendbufsize);
+    self->tempbuf = buf;
     if (self->tempbuf == NULL) {
         obexclient_seterror(self, PyExc_IOError, "error reading file object");
     }
@@ -106,6 +118,8 @@ obexclient_requestdone(OBEXClient *self, obex_object_t *obj, int obex_cmd, int o
     DEBUG("\tCommand: %d Response: 0x%02x\n", obex_cmd, obex_rsp);
 
     self->resp = obex_rsp;
+    if (obex_cmd == OBEX_CMD_CONNECT)
+        self->peermtu = lightblueobex_connectmtu(obj);
     Py_XDECREF(self->resp_headers);
     self->resp_headers = lightblueobex_readheaders(self->obex, obj);
     if (self->resp_headers == NULL)
@@ -154,11 +168,13 @@ obexclient_startrequest(OBEXClient *self, int cmd, PyObject *headers, PyObject *
 {
     const uint8_t *nonhdrdata_raw;
     Py_ssize_t nonhdrdata_len;
+    int result;
 
     DEBUG("%s()\n", __func__);
 
-    if (!PyDict_Check(headers)) {
-        PyErr_Format(PyExc_TypeError, "headers must be dict, was %s",
+    if (!PyDict_Check(headers) && !PyString_Check(headers)) {
+        PyErr_Format(PyExc_TypeError,
+                "headers must be dict or encoded string, was %s",
                 headers->ob_type->tp_name);
         return -1;
     }
@@ -181,7 +197,14 @@ obexclient_startrequest(OBEXClient *self, int cmd, PyObject *headers, PyObject *
         return -1;
     }
 
-    if (lightblueobex_addheaders(self->obex, headers, obj) < 0) {
+    if (PyString_Check(headers)) {
+        result = lightblueobex_addrawheaders(self->obex,
+                (const uint8_t *)PyString_AS_STRING(headers),
+                PyString_GET_SIZE(headers), obj);
+    } else {
+        result = lightblueobex_addheaders(self->obex, headers, obj);
+    }
+    if (result < 0) {
         OBEX_ObjectDelete(self->obex, obj);
         PyErr_SetString(PyExc_IOError, "error setting request headers");
         return -1;
@@ -251,7 +274,7 @@ OBEXClient_request(OBEXClient *self, PyObject *args)
 
     DEBUG("%s()\n", __func__);
 
-    if (!PyArg_ParseTuple(args, "iO!O|O", &cmd, &PyDict_Type, &headers,
+    if (!PyArg_ParseTuple(args, "iOO|O", &cmd, &headers,
             &nonhdrdata, &fileobj)) {
         return NULL;
     }
@@ -259,7 +282,9 @@ OBEXClient_request(OBEXClient *self, PyObject *args)
     if (fileobj != NULL) {
         char *method;
         method = ( cmd == OBEX_CMD_PUT ? "read" : "write" );
-        if (!PyObject_HasAttrString(fileobj, method)) {
+        /* Put data can also be given as an iterator of buffers */
+        if (!PyObject_HasAttrString(fileobj, method) &&
+                !(cmd == OBEX_CMD_PUT && PyIter_Check(fileobj))) {
             PyErr_Format(PyExc_AttributeError,
                             "file-like object must have %s() method", method);
             return NULL;
@@ -308,6 +333,10 @@ PyDoc_STRVAR(OBEXClient_request__doc__,
 "request(opcode, headers, nonheaderdata [, fileobj]) -> response\n\n\
 Sends an OBEX request and returns the server response code. \
 Provide a file-like object if performing a Put or Get request. \
+For a Put request, an iterator that yields strings or buffers can be given \
+instead of a file-like object. \
+The headers are given as a dict of header IDs and values, or as a string \
+of headers already encoded in the OBEX format. \
 The nonheaderdata is really only useful for specifying the flags for SetPath \
 requests. For other requests, set this value to None.");
 
@@ -322,6 +351,9 @@ OBEXClient_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
         self->busy = 0;
         self->timeout = 10;     /* seconds */
         self->sendbufsize = 4096;
+        self->rxmtu = OBEX_MAXIMUM_MTU;
+        self->txmtu = OBEX_MAXIMUM_MTU;
+        self->peermtu = 0;
 
         self->resp = 0;
         self->resp_headers = NULL;
@@ -347,10 +379,20 @@ OBEXClient_init(OBEXClient *self, PyObject *args, PyObject *kwds)
     int writefd = -1;
     int mtu = 1024;
     unsigned int flags = 0;
-    static char *kwlist[] = { "fd", "writefd", "mtu", "flags", NULL };
+    int rxmtu = OBEX_MAXIMUM_MTU;
+    int txmtu = OBEX_MAXIMUM_MTU;
+    static char *kwlist[] = { "fd", "writefd", "mtu", "flags", "rxmtu",
+            "txmtu", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "i|iiIii", kwlist,
+            &fd, &writefd, &mtu, &flags, &rxmtu, &txmtu)) {
+        return -1;
+    }
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "i|iiI", kwlist,
-            &fd, &writefd, &mtu, &flags)) {
+    if (rxmtu < OBEX_MINIMUM_MTU || rxmtu > OBEX_MAXIMUM_MTU ||
+            txmtu < OBEX_MINIMUM_MTU || txmtu > OBEX_MAXIMUM_MTU) {
+        PyErr_Format(PyExc_ValueError, "MTU must be between %d and %d",
+                OBEX_MINIMUM_MTU, OBEX_MAXIMUM_MTU);
         return -1;
     }
 
@@ -370,7 +412,12 @@ OBEXClient_init(OBEXClient *self, PyObject *args, PyObject *kwds)
     }
 
     OBEX_SetUserData(self->obex, self);
-    OBEX_SetTransportMTU(self->obex, OBEX_MAXIMUM_MTU, OBEX_MAXIMUM_MTU);
+    if (OBEX_SetTransportMTU(self->obex, rxmtu, txmtu) < 0) {
+        PyErr_SetString(PyExc_IOError, "error setting transport MTU");
+        return -1;
+    }
+    self->rxmtu = rxmtu;
+    self->txmtu = txmtu;
     return 0;
 }
 
@@ -393,7 +440,13 @@ static PyMemberDef OBEXClient_members[] = {
     {"timeout", T_INT, offsetof(OBEXClient, timeout), 0,
      "timeout for each request"},
     {"sendbufsize", T_INT, offsetof(OBEXClient, sendbufsize), 0,
-     "size of each data chunk to read from the file object for a Put request"},
+     "size of each data chunk to read from the file object for a Put request, or 0 to fit each chunk into a single packet"},
+    {"rxmtu", T_INT, offsetof(OBEXClient, rxmtu), READONLY,
+     "maximum packet length that can be received"},
+    {"txmtu", T_INT, offsetof(OBEXClient, txmtu), READONLY,
+     "maximum packet length that will be sent"},
+    {"peermtu", T_INT, offsetof(OBEXClient, peermtu), READONLY,
+     "maximum packet length from the server's Connect response, or 0 if not connected"},
     {NULL}  /* Sentinel */
 };
 
@@ -347,7 +347,110 @@ int lightblueobex_addheaders(obex_t *obex, PyObject *headers, obex_object_t *obj
 }
 
 
-PyObject *lightblueobex_filetostream(obex_t *obex, obex_object_t *obj, PyObject *fileobj, int bufsize)
+/*
+ * Adds the headers in the given data, which holds headers that have already
+ * been encoded in the OBEX wire format (e.g. by an OBEXHeaders object), so
+ * that no Python objects need to be converted for each header.
+ */
+int lightblueobex_addrawheaders(obex_t *obex, const uint8_t *data, Py_ssize_t len, obex_object_t *obj)
+{
+    uint8_t hi;
+    obex_headerdata_t hv;
+    Py_ssize_t offset = 0;
+    Py_ssize_t hlen;
+    int r;
+
+    DEBUG("%s()\n", __func__);
+
+    while (offset < len) {
+        hi = data[offset];
+        DEBUG("\tadding raw header: 0x%02x\n", hi);
+
+        switch (hi & OBEX_HI_MASK) {
+        case OBEX_UNICODE:
+        case OBEX_BYTE_STREAM:
+            if (offset + 3 > len) {
+                DEBUG("\theader 0x%02x is truncated\n", hi);
+                return -1;
+            }
+            hlen = (data[offset+1] << 8) | data[offset+2];
+            if (hlen < 3 || offset + hlen > len) {
+                DEBUG("\tbad length %d for header 0x%02x\n", (int)hlen, hi);
+                return -1;
+            }
+            hv.bs = data + offset + 3;
+            r = OBEX_ObjectAddHeader(obex, obj, hi, hv, hlen - 3,
+                    OBEX_FL_FIT_ONE_PACKET);
+            break;
+        case OBEX_BYTE:
+            hlen = 2;
+            if (offset + hlen > len) {
+                DEBUG("\theader 0x%02x is truncated\n", hi);
+                return -1;
+            }
+            hv.bq1 = data[offset+1];
+            r = OBEX_ObjectAddHeader(obex, obj, hi, hv, 1,
+                    OBEX_FL_FIT_ONE_PACKET);
+            break;
+        default:    /* OBEX_INT */
+            hlen = 5;
+            if (offset + hlen > len) {
+                DEBUG("\theader 0x%02x is truncated\n", hi);
+                return -1;
+            }
+            hv.bq4 = ((uint32_t)data[offset+1] << 24) |
+                    ((uint32_t)data[offset+2] << 16) |
+                    ((uint32_t)data[offset+3] << 8) | data[offset+4];
+            r = OBEX_ObjectAddHeader(obex, obj, hi, hv, 4,
+                    OBEX_FL_FIT_ONE_PACKET);
+            break;
+        }
+        if (r < 0) {
+            DEBUG("\terror adding header 0x%02x\n", hi);
+            return -1;
+        }
+        offset += hlen;
+    }
+
+    return 1;
+}
+
+
+/*
+ * Returns the next non-empty chunk from the given iterator and sets data and
+ * datalen to its contents, since an empty chunk would end the stream. At the
+ * end of the iterator, returns an empty string and sets datalen to 0.
+ * Returns NULL on error.
+ */
+static PyObject *lightblueobex_nextchunk(PyObject *iterator, const void **data, Py_ssize_t *datalen)
+{
+    PyObject *chunk;
+
+    while ((chunk = PyIter_Next(iterator)) != NULL) {
+        if (PyObject_AsReadBuffer(chunk, data, datalen) < 0) {
+            DEBUG("\titerator returned non-buffer object\n");
+            Py_DECREF(chunk);
+            return NULL;
+        }
+        if (*datalen > 0)
+            return chunk;
+        Py_DECREF(chunk);
+    }
+    if (PyErr_Occurred())
+        return NULL;
+
+    *data = NULL;
+    *datalen = 0;
+    return PyString_FromStringAndSize(NULL, 0);
+}
+
+
+/*
+ * Returns the buffer that holds the next chunk of data from fileobj, reusing
+ * prevbuf where possible, or NULL on error. The caller must keep a reference
+ * to the returned object until OpenOBEX asks for the next chunk.
+ */
+PyObject *lightblueobex_filetostream(obex_t *obex, obex_object_t *obj, PyObject *fileobj, int bufsize, PyObject *prevbuf)
 {
     const void *data;
     Py_ssize_t datalen;        /* or unsigned int? */
@@ -364,25 +467,68 @@ PyObject *lightblueobex_filetostream(obex_t *obex, obex_object_t *obj, PyObject
         return NULL;
     }
 
-    buf = PyObject_CallMethod(fileobj, "read", "i", bufsize);
-    if (buf == NULL) {
-        if (PyErr_Occurred()) {
-            PyErr_Print();
-            PyErr_Clear();  /* let caller set exception */
+#if PY_VERSION_HEX >= 0x02060000
+    /* Fast paths: fill a reusable bytearray directly from built-in file
+       objects, or through readinto() for other objects that support it, to
+       avoid creating a new string for every chunk. The previous chunk is
+       always sent before OpenOBEX asks for more, so it can be overwritten. */
+    if (PyFile_Check(fileobj) ||
+            PyObject_HasAttrString(fileobj, "readinto")) {
+        buf = lightblueobex_readintobuffer(fileobj, bufsize, prevbuf);
+        if (buf == NULL) {
+            if (PyErr_Occurred()) {
+                PyErr_Print();
+                PyErr_Clear();  /* let caller set exception */
+            }
+            DEBUG("\terror reading file object into buffer\n");
+            hv.bs = NULL;
+            OBEX_ObjectAddHeader(obex, obj, OBEX_HDR_BODY, hv, 0,
+                    OBEX_FL_STREAM_DATAEND);
+            return NULL;
         }
-        DEBUG("\terror calling file object read()\n");
+        hv.bs = (uint8_t*)PyByteArray_AS_STRING(buf);
+        datalen = PyByteArray_GET_SIZE(buf);
+        if (OBEX_ObjectAddHeader(obex, obj, OBEX_HDR_BODY, hv, datalen,
+               (datalen == 0 ? OBEX_FL_STREAM_DATAEND : OBEX_FL_STREAM_DATA)) < 0) {
+            DEBUG("\terror adding body data\n");
+            Py_DECREF(buf);
+            buf = NULL;
+        }
+        return buf;
     }
+#endif
 
-    if (buf != NULL && !PyObject_CheckReadBuffer(buf)) {
-        DEBUG("\tfile object read() returned non-buffer object\n");
-        Py_DECREF(buf);
-        buf = NULL;
-    }
+    if (!PyObject_HasAttrString(fileobj, "read") && PyIter_Check(fileobj)) {
+        /* each chunk from the iterator is sent as it is, without copying */
+        buf = lightblueobex_nextchunk(fileobj, &data, &datalen);
+        if (buf == NULL) {
+            if (PyErr_Occurred()) {
+                PyErr_Print();
+                PyErr_Clear();  /* let caller set exception */
+            }
+            DEBUG("\terror getting next chunk from iterator\n");
+        }
+    } else {
+        buf = PyObject_CallMethod(fileobj, "read", "i", bufsize);
+        if (buf == NULL) {
+            if (PyErr_Occurred()) {
+                PyErr_Print();
+                PyErr_Clear();  /* let caller set exception */
+            }
+            DEBUG("\terror calling file object read()\n");
+        }
 
-    if (buf != NULL && PyObject_AsReadBuffer(buf, &data, &datalen) < 0) {
-        DEBUG("\terror reading file object contents\n");
-        Py_DECREF(buf);
-        buf = NULL;
+        if (buf != NULL && !PyObject_CheckReadBuffer(buf)) {
+            DEBUG("\tfile object read() returned non-buffer object\n");
+            Py_DECREF(buf);
+            buf = NULL;
+        }
+
+        if (buf != NULL && PyObject_AsReadBuffer(buf, &data, &datalen) < 0) {
+            DEBUG("\terror reading file object contents\n");
+            Py_DECREF(buf);
+            buf = NULL;
+        }
     }
 
     if (buf == NULL) {
@@ -403,6 +549,74 @@ PyObject *lightblueobex_filetostream(obex_t *obex, obex_object_t *obj, PyObject
     return buf;
 }
 
+#if PY_VERSION_HEX >= 0x02060000
+/*
+ * Reads up to bufsize bytes from fileobj into a bytearray (prevbuf, if it is
+ * a bytearray, otherwise a new one), and resizes the bytearray to the number
+ * of bytes read. Returns a new reference to the bytearray, or NULL on error.
+ */
+PyObject *lightblueobex_readintobuffer(PyObject *fileobj, int bufsize, PyObject *prevbuf)
+{
+    PyObject *buf;
+    Py_ssize_t nread;
+
+    if (prevbuf != NULL && PyByteArray_Check(prevbuf)) {
+        buf = prevbuf;
+        Py_INCREF(buf);
+        if (PyByteArray_GET_SIZE(buf) != bufsize &&
+                PyByteArray_Resize(buf, bufsize) < 0) {
+            Py_DECREF(buf);
+            return NULL;
+        }
+    } else {
+        buf = PyByteArray_FromStringAndSize(NULL, bufsize);
+        if (buf == NULL)
+            return NULL;
+    }
+
+    if (PyFile_Check(fileobj)) {
+        FILE *fp = PyFile_AsFile(fileobj);
+        if (fp == NULL) {
+            PyErr_SetString(PyExc_ValueError, "I/O operation on closed file");
+            Py_DECREF(buf);
+            return NULL;
+        }
+        PyFile_IncUseCount((PyFileObject *)fileobj);
+        Py_BEGIN_ALLOW_THREADS
+        nread = fread(PyByteArray_AS_STRING(buf), 1, bufsize, fp);
+        Py_END_ALLOW_THREADS
+        PyFile_DecUseCount((PyFileObject *)fileobj);
+        if (nread < bufsize && ferror(fp)) {
+            clearerr(fp);
+            PyErr_SetFromErrno(PyExc_IOError);
+            Py_DECREF(buf);
+            return NULL;
+        }
+    } else {
+        PyObject *result = PyObject_CallMethod(fileobj, "readinto", "O", buf);
+        if (result == NULL) {
+            Py_DECREF(buf);
+            return NULL;
+        }
+        /* readinto() may return None for non-blocking files */
+        nread = (result == Py_None ? 0 : PyInt_AsSsize_t(result));
+        Py_DECREF(result);
+        if (nread < 0 || nread > bufsize) {
+            if (!PyErr_Occurred())
+                PyErr_SetString(PyExc_IOError, "bad readinto() result");
+            Py_DECREF(buf);
+            return NULL;
+        }
+    }
+
+    if (nread != bufsize && PyByteArray_Resize(buf, nread) < 0) {
+        Py_DECREF(buf);
+        return NULL;
+    }
+    return buf;
+}
+#endif
+
 
 int lightblueobex_streamtofile(obex_t *obex, obex_object_t *obj, PyObject *fileobj)
 {
@@ -425,6 +639,32 @@ int lightblueobex_streamtofile(obex_t *obex, obex_object_t *obj, PyObject *fileo
 
     DEBUG("\treading %d bytes\n", buflen);
 
+    /* write straight from the OpenOBEX buffer for built-in file objects,
+       without calling into Python */
+    if (PyFile_Check(fileobj)) {
+        FILE *fp = PyFile_AsFile(fileobj);
+        size_t nwritten;
+        if (fp == NULL) {
+            DEBUG("\tfile object is closed\n");
+            return -1;
+        }
+#if PY_VERSION_HEX >= 0x02060000
+        PyFile_IncUseCount((PyFileObject *)fileobj);
+#endif
+        Py_BEGIN_ALLOW_THREADS
+        nwritten = fwrite(buf, 1, buflen, fp);
+        Py_END_ALLOW_THREADS
+#if PY_VERSION_HEX >= 0x02060000
+        PyFile_DecUseCount((PyFileObject *)fileobj);
+#endif
+        if (nwritten != (size_t)buflen) {
+            DEBUG("\terror writing to file\n");
+            clearerr(fp);
+            return -1;
+        }
+        return buflen;
+    }
+
     PyObject *pybuf = PyBuffer_FromMemory((void*)buf, buflen);
     if (pybuf == NULL) {
         DEBUG("\terror reading received body\n");
@@ -447,6 +687,43 @@ int lightblueobex_streamtofile(obex_t *obex, obex_object_t *obj, PyObject *fileo
     return buflen;
 }
 
+/*
+ * Returns the maximum packet length from the non-header data of a Connect
+ * request or response, or 0 if it is not available.
+ */
+int lightblueobex_connectmtu(obex_object_t *obj)
+{
+    uint8_t *nonhdrdata;
+    int nonhdrdata_len;
+
+    /* version (1 byte), flags (1 byte), max packet length (2 bytes) */
+    nonhdrdata_len = OBEX_ObjectGetNonHdrData(obj, &nonhdrdata);
+    if (nonhdrdata_len < 4 || nonhdrdata == NULL)
+        return 0;
+    return (nonhdrdata[2] << 8) | nonhdrdata[3];
+}
+
+/*
+ * Returns the number of bytes to read from a file object for each chunk of
+ * body data. If sendbufsize is 0, the size is chosen so that each chunk
+ * fills a whole packet, according to the transmit MTU and the peer's maximum
+ * packet length (which is 0 if not known yet).
+ */
+int lightblueobex_streambufsize(int sendbufsize, int txmtu, int peermtu)
+{
+    int mtu;
+
+    if (sendbufsize > 0)
+        return sendbufsize;
+    mtu = txmtu;
+    if (peermtu > 0 && peermtu < mtu)
+        mtu = peermtu;
+    if (mtu < OBEX_MINIMUM_MTU)
+        mtu = OBEX_MINIMUM_MTU;
+    /* leave space for the packet prefix and the body header prefix */
+    return mtu - 6;
+}
+
 
 static PyMethodDef module_methods[] = {
     {NULL}  /* Sentinel */
@@ -46,8 +46,18 @@ PyObject *lightblueobex_readheaders(obex_t *obex, obex_object_t *obj);
 
 int lightblueobex_addheaders(obex_t *obex, PyObject *headers, obex_object_t *obj);
 
-PyObject *lightblueobex_filetostream(obex_t *obex, obex_object_t *obj, PyObject *fileobj, int bufsize);
+int lightblueobex_addrawheaders(obex_t *obex, const uint8_t *data, Py_ssize_t len, obex_object_t *obj);
+
+PyObject *lightblueobex_filetostream(obex_t *obex, obex_object_t *obj, PyObject *fileobj, int bufsize, PyObject *prevbuf);
+
+#if PY_VERSION_HEX >= 0x02060000
+PyObject *lightblueobex_readintobuffer(PyObject *fileobj, int bufsize, PyObject *prevbuf);
+#endif
 
 int lightblueobex_streamtofile(obex_t *obex, obex_object_t *obj, PyObject *fileobj);
 
+int lightblueobex_connectmtu(obex_object_t *obj);
+
+int lightblueobex_streambufsize(int sendbufsize, int txmtu, int peermtu);
+
 #endif
@@ -27,7 +27,9 @@
 typedef struct {
     PyObject_HEAD
     obex_t *obex;
-    int sendbufsize;
+    int sendbufsize;    /* 0 to fit each chunk into a single packet */
+    int txmtu;
+    int peermtu;        /* from the Connect request, or 0 if unknown */
 
     PyObject *cb_error;
     PyObject *cb_newrequest;
@@ -146,6 +148,9 @@ obexserver_notifynewrequest(OBEXServer *self, obex_object_t *obj, int obex_cmd,
         return NULL;
     }
 
+    if (obex_cmd == OBEX_CMD_CONNECT)
+        self->peermtu = lightblueobex_connectmtu(obj);
+
     nonhdrdata_obj = PyBuffer_FromMemory(nonhdrdata,
             (Py_ssize_t)nonhdrdata_len);
     if (nonhdrdata_obj == NULL) {
@@ -320,9 +325,13 @@ obexserver_streamempty(OBEXServer *self, obex_object_t *obj)
 {
     DEBUG("%s()\n", __func__);
 
+    PyObject *buf;
+    buf = lightblueobex_filetostream(self->obex, obj, self->fileobj,
+            lightblueobex_streambufsize(self->sendbufsize, self->txmtu,
+                self->peermtu),
+            self->tempbuf);
     Py_XDECREF(self->tempbuf);
-    self->tempbuf = lightblueobex_filetostream(self->obex, obj, self->fileobj,
-            self->sendbufsize);
+    self->tempbuf = buf;
     if (self->tempbuf == NULL) {
         obexserver_errorstr(self, PyExc_IOError, "error reading file object");
         OBEX_ObjectSetRsp(obj, OBEX_RSP_INTERNAL_SERVER_ERROR,
@@ -448,6 +457,8 @@ OBEXServer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
     if (self != NULL) {
         self->obex = NULL;
         self->sendbufsize = 1024;
+        self->txmtu = OBEX_MAXIMUM_MTU;
+        self->peermtu = 0;
         self->cb_error = NULL;
         self->cb_newrequest = NULL;
         self->cb_requestdone = NULL;
@@ -461,16 +472,28 @@ OBEXServer_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
 
 
 static int
-OBEXServer_init(OBEXServer *self, PyObject *args)
+OBEXServer_init(OBEXServer *self, PyObject *args, PyObject *kwds)
 {
     int fd;
     PyObject *cb_error;
     PyObject *cb_newrequest;
     PyObject *cb_requestdone;
-    int mtu = 1024;     /* todo make this a keyword arg */
+    int mtu = 1024;
+    int rxmtu = OBEX_MAXIMUM_MTU;
+    int txmtu = OBEX_MAXIMUM_MTU;
+    static char *kwlist[] = { "fd", "cb_error", "cb_newrequest",
+            "cb_requestdone", "mtu", "rxmtu", "txmtu", NULL };
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "iOOO|iii", kwlist, &fd,
+            &cb_error, &cb_newrequest, &cb_requestdone, &mtu, &rxmtu,
+            &txmtu)) {
+        return -1;
+    }
 
-    if (!PyArg_ParseTuple(args, "iOOO", &fd, &cb_error, &cb_newrequest,
-            &cb_requestdone)) {
+    if (rxmtu < OBEX_MINIMUM_MTU || rxmtu > OBEX_MAXIMUM_MTU ||
+            txmtu < OBEX_MINIMUM_MTU || txmtu > OBEX_MAXIMUM_MTU) {
+        PyErr_Format(PyExc_ValueError, "MTU must be between %d and %d",
+                OBEX_MINIMUM_MTU, OBEX_MAXIMUM_MTU);
         return -1;
     }
 
@@ -509,7 +532,11 @@ OBEXServer_init(OBEXServer *self, PyObject *args)
     }
 
     OBEX_SetUserData(self->obex, self);
-    OBEX_SetTransportMTU(self->obex, OBEX_MAXIMUM_MTU, OBEX_MAXIMUM_MTU);
+    if (OBEX_SetTransportMTU(self->obex, rxmtu, txmtu) < 0) {
+        PyErr_SetString(PyExc_IOError, "error setting transport MTU");
+        return -1;
+    }
+    self->txmtu = txmtu;
     return 0;
 }
 
@@ -524,6 +551,10 @@ OBEXServer_dealloc(OBEXServer *self)
 }
 
 static PyMemberDef OBEXServer_members[] = {
+    {"sendbufsize", T_INT, offsetof(OBEXServer, sendbufsize), 0,
+     "size of each data chunk to read from the file object for a Get response, or 0 to fit each chunk into a single packet"},
+    {"peermtu", T_INT, offsetof(OBEXServer, peermtu), READONLY,
+     "maximum packet length from the client's Connect request, or 0 if not known"},
     {NULL}  /* Sentinel */
 };
 
@@ -30,6 +30,7 @@ import threading
 import os
 import errno
 import types
+import struct
 
 import objc
 import Foundation
@@ -37,6 +38,7 @@ import Foundation
 import _IOBluetooth
 import _lightbluecommon
 import _macutil
+import _socketio
 from _LightAquaBlue import BBServiceAdvertiser, BBBluetoothChannelDelegate
 
 import sets     # python 2.3
@@ -99,6 +101,12 @@ def _checkaddrpair(address, checkbtaddr=True):
             type(address[1]))              
 
 
+# memoryview is only available in Python 2.6 and later
+try:
+    _memoryview = memoryview
+except NameError:
+    _memoryview = None
+
 # from std lib socket module
 class _closedsocket(object):
     __slots__ = []
@@ -107,58 +115,6 @@ class _closedsocket(object):
     send = recv = sendto = recvfrom = __getattr__ = _dummy
 
 
-# Thanks to Simon Wittber for string queue recipe 
-# http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/426060 
-# (this is a modified version)
-class _StringQueue(object):
-    def __init__(self):
-        self.l_buffer = []
-        self.s_buffer = ""
-        self.lock = threading.RLock()
-        self.bufempty = True
-
-    def empty(self):
-        return self.bufempty
-
-    def write(self, data):
-        # no type check, and assumes data is not empty!
-        #append data to list, no need to "".join just yet.
-        self.lock.acquire()
-        try:
-            self.l_buffer.append(data)
-            self.bufempty = False
-        finally:
-            self.lock.release()
-
-    def _build_str(self):
-        #build a new string out of list
-        new_string = "".join([str(x.tobytes()) for x in self.l_buffer])
-        #join string buffer and new string
-        self.s_buffer = "".join((self.s_buffer, new_string))
-        #clear list
-        self.l_buffer = []
-
-    def __len__(self):
-        #calculate length without needing to _build_str
-        return sum([len(i) for i in self.l_buffer]) + len(self.s_buffer)
-
-    def read(self, count):
-        self.lock.acquire()
-        try:
-            #if string doesn't have enough chars to satisfy caller
-            if count > len(self.s_buffer): 
-                self._build_str()           
-            #get data requested by caller
-            result = self.s_buffer[:count]
-            #remove requested data from string buffer
-            self.s_buffer = self.s_buffer[len(result):]
-            self.bufempty = (len(self.s_buffer) == 0)   
-        finally:
-            self.lock.release()         
-        return result
-
-
-
 #class _SocketWrapper(_socket._socketobject):
 class _SocketWrapper(object):
     """
@@ -251,9 +207,11 @@ class _BluetoothSocket(object):
         self.__eventlistener = None
         self.__closed = False
         self.__maxqueuedconns = 0
-        self.__incomingdata = _StringQueue()
+        self.__incomingdata = _socketio.ReceiveQueue(
+                pause=self.__pausechannel, resume=self.__resumechannel)
         self.__queuedchannels = []
         self.__queuedchannels_lock = threading.RLock()
+        self.__readysignal = None
         
         # whether send or recv has been shut down 
         # set initial value to be other than SHUT_WR/SHUT_RD/SHUT_RDWR
@@ -273,6 +231,7 @@ class _BluetoothSocket(object):
         self.__queuedchannels_lock.acquire()
         try:
             newchannel = self.__queuedchannels.pop(0)
+            self.__updateready()
         finally:    
             self.__queuedchannels_lock.release()      
         
@@ -317,6 +276,9 @@ class _BluetoothSocket(object):
     def close(self):
         wasconnected = self.__isconnected() or self.__isbound()
         self.__stopevents()
+        if self.__readysignal is not None:
+            self.__readysignal.close()
+            self.__readysignal = None
         
         if self.__conn is not None:
             if self.__isbound():
@@ -447,27 +409,10 @@ class _BluetoothSocket(object):
         if bufsize == 0: 
             return ""
             
-        # need this to ensure the _isclosed() check is up-to-date
-        _macutil.looponce()
-        
-        if self._isclosed():
-            if len(self.__incomingdata) == 0:
-                raise _socket.error(errno.ECONNRESET,         
-                                    os.strerror(errno.ECONNRESET))
-            return self.__incomingdata.read(bufsize)
-    
-        # if incoming data buffer is empty, wait until data is available or
-        # channel is closed
-        def gotdata():
-            return not self.__incomingdata.empty() or self._isclosed()
-        if not gotdata():
-            self.__waituntil(gotdata, "recv timed out")
-
-        # other side closed connection while waiting?
-        if self._isclosed() and len(self.__incomingdata) == 0:    
-            raise _socket.error(errno.ECONNRESET, os.strerror(errno.ECONNRESET))
-            
-        return self.__incomingdata.read(bufsize)
+        self.__waitfordata()
+        data = self.__incomingdata.read(bufsize)
+        self.__updateready()
+        return data
         
         
     # recvfrom() is really for datagram sockets not stream sockets but it 
@@ -475,16 +420,62 @@ class _BluetoothSocket(object):
     def recvfrom(self, bufsize, flags=0):
         # stream sockets return None, instead of address
         return (self.recv(bufsize, flags), None)
+
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        if self.__commstate in (SHUT_RD, SHUT_RDWR):
+            return 0
+        self.__checkconnected()
+
+        if not isinstance(nbytes, int):
+            raise TypeError("nbytes must be int, was %s" % type(nbytes))
+        if nbytes < 0:
+            raise ValueError("negative buffersize in recv_into")
+        if nbytes == 0:
+            nbytes = len(buffer)
+        elif nbytes > len(buffer):
+            raise ValueError("buffer too small for requested bytes")
+        if nbytes == 0:
+            return 0
+
+        self.__waitfordata()
+        count = self.__incomingdata.readinto(buffer, nbytes)
+        self.__updateready()
+        return count
+
+    def recvfrom_into(self, buffer, nbytes=0, flags=0):
+        # stream sockets return None, instead of address
+        return (self.recv_into(buffer, nbytes, flags), None)
         
     def sendall(self, data, flags=0):
+        data = self.__getwritebuffer(data)
         sentbytescount = self.send(data, flags)
         while sentbytescount < len(data):
-            sentbytescount += self.send(data[sentbytescount:], flags)
+            sentbytescount += self.send(buffer(data, sentbytescount), flags)
         return None
-        
+
+    def sendfile(self, fileobj, offset=None, count=None):
+        """
+        sendfile(fileobj[, offset[, count]]) -> total bytes sent
+
+        Sends the data from the given file object, starting at the given
+        offset (or the current file position, if no offset is given), until
+        <count> bytes have been sent or the end of the file is reached. The
+        data is read and sent in pieces of the channel's MTU size, using one
+        buffer, instead of reading all of the data into memory. Afterwards
+        the file position is set to just after the last byte sent.
+
+        This method is only available on Mac OS X.
+        """
+        if count is not None and count < 0:
+            raise ValueError("count must be a positive integer")
+        self.__checkconnected()
+        if offset is not None:
+            fileobj.seek(offset)
+        return _socketio.sendfile(self.sendall, fileobj,
+                self.__conn.getwritemtu(), count)
+
     def send(self, data, flags=0):
-        if not isinstance(data, types.StringTypes):
-            raise TypeError("data must be string, was %s" % type(data))
+        data = self.__getwritebuffer(data)
         if self.__commstate in (SHUT_WR, SHUT_RDWR):
             raise _socket.error(errno.EPIPE, os.strerror(errno.EPIPE))
         self.__checkconnected()
@@ -504,8 +495,9 @@ class _BluetoothSocket(object):
                 # non-blocking with timeout
                 starttime = time.time()
         
-        # loop until all data is sent
-        writebuf = data
+        # loop until all data is sent, writing buffer objects that refer to
+        # each MTU-sized piece of the data instead of copying it
+        offset = 0
         bytesleft = len(data)
         mtu = self.__conn.getwritemtu()
         while bytesleft > 0:
@@ -521,7 +513,7 @@ class _BluetoothSocket(object):
                 sendbytecount = bytesleft            
             #result = self.__conn.channel.writeSync_length_(
             #        writebuf[:sendbytecount], sendbytecount)
-            result = self.__conn.write(writebuf[:sendbytecount])
+            result = self.__conn.write(buffer(data, offset, sendbytecount))
 
             # normal tcp sockets don't seem to actually error on the first 
             # send() after a connection has broken; if you try a second time,
@@ -530,7 +522,7 @@ class _BluetoothSocket(object):
                 raise _socket.error(result, "Error sending data")
             
             bytesleft -= sendbytecount
-            writebuf = writebuf[sendbytecount:] # remove the data just sent
+            offset += sendbytecount
             
         return len(data) - bytesleft     
         
@@ -558,17 +550,31 @@ class _BluetoothSocket(object):
         return self.send(data, flags)        
         
     def fileno(self):
-        raise NotImplementedError
+        if self.__readysignal is None:
+            self.__readysignal = _socketio.ReadySignal()
+            self.__updateready()
+        return self.__readysignal.fileno()
 
     def getsockopt(self, level, optname, buflen=0):
         # see what options on Linux+s60
         # possibly have socket security option.
+        if (level, optname) == (_socket.SOL_SOCKET, _socket.SO_RCVBUF):
+            if buflen:
+                return struct.pack("i", self.__incomingdata.highwater)[:buflen]
+            return self.__incomingdata.highwater
         raise _socket.error(
             errno.ENOPROTOOPT, os.strerror(errno.ENOPROTOOPT))   
         
     def setsockopt(self, level, optname, value):
         # see what options on Linux+s60    
         # possibly have socket security option.        
+        if (level, optname) == (_socket.SOL_SOCKET, _socket.SO_RCVBUF):
+            if isinstance(value, str):
+                value = struct.unpack("i", value[:4])[0]
+            if value <= 0:
+                raise _socket.error(errno.EINVAL, os.strerror(errno.EINVAL))
+            self.__incomingdata.highwater = value
+            return
         raise _socket.error(
             errno.ENOPROTOOPT, os.strerror(errno.ENOPROTOOPT))   
         
@@ -595,6 +601,7 @@ class _BluetoothSocket(object):
         if how not in (SHUT_RD, SHUT_WR, SHUT_RDWR):
             raise _socket.error(22, "Invalid argument")
         self.__commstate = how
+        self.__updateready()
         
     # This method is called from outside this file.
     def _getport(self):
@@ -614,6 +621,7 @@ class _BluetoothSocket(object):
     # 'channel' is IOBluetoothRFCOMMChannel or IOBluetoothL2CAPChannel object
     def _handle_channeldata(self, channel, data):
         self.__incomingdata.write(data)
+        self.__updateready()
         _macutil.interruptwait()
 
     # Called by the event listener when a client connects to a server socket        
@@ -624,6 +632,7 @@ class _BluetoothSocket(object):
             # need to implement max connections
             #if len(self.__queuedchannels) < self.__maxqueuedconns:
             self.__queuedchannels.append(channel)
+            self.__updateready()
             _macutil.interruptwait()
         finally:
             self.__queuedchannels_lock.release()
@@ -633,8 +642,30 @@ class _BluetoothSocket(object):
         # beware that this value won't actually be set until the event loop
         # has been driven so that this method is actually called
         self.__closed = True
+        self.__updateready()
         _macutil.interruptwait()
             
+    # Called by the receive queue when it fills up. The channel's delegate is
+    # removed, so no more data is delivered to this socket, whichever call
+    # pumps the run loop; IOBluetooth holds on to data received while a
+    # channel has no delegate, and delivers it once a delegate is set again.
+    def __pausechannel(self):
+        if self.__conn is not None and self.__conn.channel is not None:
+            self.__conn.channel.setDelegate_(None)
+
+    # Called by the receive queue when it has drained after being paused.
+    def __resumechannel(self):
+        if self.__eventlistener is not None and \
+                self.__conn.channel is not None:
+            self.__conn.channel.setDelegate_(self.__eventlistener.delegate())
+
+    # makes the fileno() descriptor readable if recv() or accept() won't block
+    def __updateready(self):
+        if self.__readysignal is not None:
+            self.__readysignal.update(not self.__incomingdata.empty() or
+                len(self.__queuedchannels) > 0 or self.__closed or
+                self.__commstate in (SHUT_RD, SHUT_RDWR))
+
     def __waituntil(self, stopwaiting, timeoutmsg):
         """
         Waits until stopwaiting() returns True, or until the wait times out
@@ -676,6 +707,7 @@ class _BluetoothSocket(object):
     def __stopevents(self):
         if self.__eventlistener is not None:
             self.__eventlistener.close()
+            self.__eventlistener = None     # don't resume a paused channel
             
     def __islistening(self):
         return self.__eventlistener is not None            
@@ -687,6 +719,45 @@ class _BluetoothSocket(object):
     def __isconnected(self):
         return self.__conn.channel is not None                
         
+    # returns the data to be sent as a string or buffer object, which can be
+    # passed to the channel write methods and sliced with buffer()
+    def __getwritebuffer(self, data):
+        if type(data) is str or type(data) is buffer:
+            return data
+        if type(data) is _memoryview:
+            # memoryview doesn't support the old-style buffer interface
+            return data.tobytes()
+        try:
+            return buffer(data)
+        except TypeError:
+            raise TypeError("data must be string or buffer, was %s" % \
+                type(data))
+
+    # waits until there is received data to read, or raises socket.error if
+    # the channel is closed and all its data has been read
+    def __waitfordata(self):
+        # need this to ensure the _isclosed() check is up-to-date (the channel
+        # is paused if the incoming data queue is full, so no more data will
+        # be taken in)
+        _macutil.looponce()
+        
+        if self._isclosed():
+            if len(self.__incomingdata) == 0:
+                raise _socket.error(errno.ECONNRESET,         
+                                    os.strerror(errno.ECONNRESET))
+            return
+    
+        # if incoming data buffer is empty, wait until data is available or
+        # channel is closed
+        def gotdata():
+            return not self.__incomingdata.empty() or self._isclosed()
+        if not gotdata():
+            self.__waituntil(gotdata, "recv timed out")
+
+        # other side closed connection while waiting?
+        if self._isclosed() and len(self.__incomingdata) == 0:    
+            raise _socket.error(errno.ECONNRESET, os.strerror(errno.ECONNRESET))
+
     def __checkconnected(self):
         if not self.__isconnected():
             # not connected, raise "socket not connected"
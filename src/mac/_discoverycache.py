@@ -0,0 +1,264 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Cache for device discovery and service search results, shared by all the
+# platform implementations.
+#
+# Each entry belongs to a "kind" of result (e.g. device names, or services for
+# a device) and expires after the time-to-live for that kind. The least
+# recently used entries are evicted when the cache is full. If a file path is
+# given through configure() or the LIGHTBLUE_CACHE environment variable, the
+# cache is also saved to that file, so that results can be reused across
+# processes.
+#
+# The file has one line for each entry, written with repr() and read with
+# ast.literal_eval(), so loading a cache file cannot run any code. Changes are
+# saved together shortly after they are made, and when the process exits.
+
+import os
+import sys
+import time
+import threading
+import atexit
+
+
+# default time-to-live (in seconds) for each kind of entry. None means entries
+# never expire, and 0 means entries of that kind are not cached at all.
+DEFAULT_TTLS = {
+    "name": 24 * 60 * 60,       # device names, by address
+    "services": 0,              # service search results, by (address, type)
+    "devices": 0,               # device inquiry results
+    "selector": None            # devices last shown by selectdevice()
+}
+
+# number of seconds to wait after a change before saving the cache file, so
+# that a batch of changes is saved at once, or None to save changes only on
+# flush() and at exit. On S60 no timer thread is started alongside the active
+# scheduler, so changes are only saved then.
+SAVE_DELAY = 1.0
+if sys.platform.startswith("symbian"):
+    SAVE_DELAY = None
+
+
+class DiscoveryCache(object):
+    """
+    A cache of discovery results, with a time-to-live for each kind of entry
+    and least-recently-used eviction.
+    """
+
+    def __init__(self, maxentries=512, path=None, ttls=None):
+        self.maxentries = maxentries
+        self.path = path
+        self.ttls = DEFAULT_TTLS.copy()
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.__entries = {}     # (kind, key) -> [expiry, lastused, value]
+        self.__usecount = 0
+        self.__lock = threading.RLock()
+        self.__unsaved = False
+        self.__savetimer = None     # pending save, if there are changes
+        if path is not None:
+            self.load()
+
+    def get(self, kind, key, default=None):
+        """
+        Returns the cached value for the given kind and key, or the default if
+        there is no entry or the entry has expired.
+        """
+        self.__lock.acquire()
+        try:
+            entry = self.__entries.get((kind, key))
+            if entry is None:
+                return default
+            if entry[0] is not None and entry[0] < time.time():
+                del self.__entries[(kind, key)]
+                return default
+            self.__usecount += 1
+            entry[1] = self.__usecount
+            return entry[2]
+        finally:
+            self.__lock.release()
+
+    def set(self, kind, key, value):
+        """
+        Caches the value for the given kind and key, unless caching is
+        disabled for that kind.
+        """
+        ttl = self.ttls.get(kind)
+        if ttl == 0:
+            return
+        self.__lock.acquire()
+        try:
+            expiry = None
+            if ttl is not None:
+                expiry = time.time() + ttl
+            self.__usecount += 1
+            self.__entries[(kind, key)] = [expiry, self.__usecount, value]
+            if len(self.__entries) > self.maxentries:
+                self.__evict()
+            self.__changed()
+        finally:
+            self.__lock.release()
+
+    def remove(self, kind, key):
+        self.__lock.acquire()
+        try:
+            self.__entries.pop((kind, key), None)
+            self.__changed()
+        finally:
+            self.__lock.release()
+
+    def clear(self, kind=None):
+        """
+        Removes all entries of the given kind, or all entries if kind is None.
+        """
+        self.__lock.acquire()
+        try:
+            if kind is None:
+                self.__entries.clear()
+            else:
+                for entrykey in self.__entries.keys():
+                    if entrykey[0] == kind:
+                        del self.__entries[entrykey]
+            self.__changed()
+        finally:
+            self.__lock.release()
+
+    def load(self):
+        """
+        Loads the unexpired entries from the cache file, if it exists.
+        Lines that are not valid entries are ignored.
+        """
+        try:
+            from ast import literal_eval
+        except ImportError:
+            return  # no safe way to read the file on older Pythons
+        try:
+            f = open(self.path, "rU")
+        except IOError:
+            return
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+
+        self.__lock.acquire()
+        try:
+            now = time.time()
+            for line in lines:
+                try:
+                    kind, key, expiry, value = literal_eval(line)
+                except Exception:
+                    continue
+                if expiry is None or expiry > now:
+                    self.__usecount += 1
+                    self.__entries[(kind, key)] = \
+                            [expiry, self.__usecount, value]
+            if len(self.__entries) > self.maxentries:
+                self.__evict()
+        finally:
+            self.__lock.release()
+
+    def save(self):
+        """
+        Writes the entries to the cache file.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__savetimer is not None:
+                self.__savetimer.cancel()
+                self.__savetimer = None
+            self.__unsaved = False
+            path = self.path
+            lines = [repr((kind, key, entry[0], entry[2])) + "\n"
+                    for (kind, key), entry in self.__entries.items()]
+        finally:
+            self.__lock.release()
+        if path is None:
+            return
+
+        # write to a temporary file first so readers never see partial data
+        temppath = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            f = open(temppath, "w")
+            try:
+                f.writelines(lines)
+            finally:
+                f.close()
+            os.rename(temppath, path)
+        except (IOError, OSError):
+            pass    # the cache is only an optimisation
+
+    def flush(self):
+        """
+        Saves the cache file now if there are unsaved changes.
+        """
+        self.__lock.acquire()
+        try:
+            unsaved = self.__unsaved
+        finally:
+            self.__lock.release()
+        if unsaved:
+            self.save()
+
+    def __changed(self):
+        # called with the lock held
+        if self.path is None:
+            return
+        self.__unsaved = True
+        if SAVE_DELAY is not None and self.__savetimer is None:
+            self.__savetimer = threading.Timer(SAVE_DELAY, self.save)
+            self.__savetimer.setDaemon(True)
+            self.__savetimer.start()
+
+    def __evict(self):
+        now = time.time()
+        for entrykey, entry in self.__entries.items():
+            if entry[0] is not None and entry[0] < now:
+                del self.__entries[entrykey]
+        if len(self.__entries) > self.maxentries:
+            byage = [(entry[1], entrykey) for entrykey, entry in
+                        self.__entries.items()]
+            byage.sort()
+            for lastused, entrykey in byage[:len(byage) - self.maxentries]:
+                del self.__entries[entrykey]
+
+
+# the cache used by the platform implementations
+cache = DiscoveryCache(path=os.environ.get("LIGHTBLUE_CACHE"))
+atexit.register(cache.flush)
+
+
+def configure(path=None, ttls=None, maxentries=None):
+    # exported as lightblue.configurecache(), see __init__.py for docs
+    if ttls is not None:
+        cache.ttls.update(ttls)
+    if maxentries is not None:
+        cache.maxentries = maxentries
+    if path is not None:
+        cache.path = path
+        cache.load()
+
+
+def recorddevices(devices):
+    """
+    Caches the names of the given (address, name, class) device tuples, as
+    returned from finddevices().
+    """
+    for address, name, deviceclass in devices:
+        if name is not None:
+            cache.set("name", address, name)
@@ -0,0 +1,90 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Waits for conditions to become true while processing run loop events.
+#
+# This doesn't import any Mac-specific modules. The run loop is given as an
+# object with these methods:
+#
+#   runonce(timeout) - processes any pending events, or blocks for up to
+#                      <timeout> seconds until an event arrives and processes
+#                      it. Returns False if there are no event sources, in
+#                      which case it returns immediately.
+#   wakeup()         - makes a blocked runonce() call return early
+#
+# _macutil provides one for NSRunLoop. Since IOBluetooth delivers channel data
+# and other delegate callbacks as run loop events, runonce() returns as soon as
+# a callback has been made, and the waiting condition can then be checked.
+
+import time
+
+
+# maximum time to block in one runonce() call, so that KeyboardInterrupt is
+# still handled while waiting for a long time
+MAX_BLOCK_TIME = 3
+
+# time to sleep when the run loop has no event sources, instead of spinning
+IDLE_SLEEP_TIME = 0.01
+
+
+class Waiter(object):
+
+    def __init__(self, runloop):
+        self.runloop = runloop
+
+    def waituntil(self, conditionfunc, timeout=None):
+        """
+        Processes run loop events until conditionfunc() returns true, or
+        <timeout> seconds have passed (if timeout is not None). Returns True if
+        the condition became true, or False on timeout.
+
+        The condition is checked before waiting, and after each time events
+        are processed.
+        """
+        if conditionfunc():
+            return True
+        if timeout is None:
+            endtime = None
+        else:
+            endtime = time.time() + timeout
+        while True:
+            if endtime is None:
+                blocktime = MAX_BLOCK_TIME
+            else:
+                blocktime = min(endtime - time.time(), MAX_BLOCK_TIME)
+                if blocktime <= 0:
+                    return False
+            if not self.runloop.runonce(blocktime):
+                time.sleep(min(blocktime, IDLE_SLEEP_TIME))
+            if conditionfunc():
+                return True
+
+    def runpending(self):
+        """
+        Processes any pending run loop events without blocking.
+        """
+        self.runloop.runonce(0)
+
+    def notify(self):
+        """
+        Wakes up a waituntil() call so that it checks its condition.
+
+        Callbacks that run during waituntil() don't need to call this, since
+        the condition is checked after each event. It is needed for changes
+        made on other threads.
+        """
+        self.runloop.wakeup()
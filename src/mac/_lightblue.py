@@ -29,10 +29,12 @@ import _LightAquaBlue
 import _lightbluecommon
 import _macutil
 import _bluetoothsockets
+import _discoverycache
+import _servicesearch
 
 
 # public attributes
-__all__ = ("finddevices", "findservices", "finddevicename", 
+__all__ = ("finddevices", "iterdevices", "findservices", "finddevicename", 
            "selectdevice", "selectservice",
            "gethostaddr", "gethostclass",
            "socket", 
@@ -43,12 +45,59 @@ __advertised = {}
 
 
 def finddevices(getnames=True, length=10):
+    devices = _discoverycache.cache.get("devices", getnames)
+    if devices is not None:
+        return devices[:]
     inquiry = _SyncDeviceInquiry()
     inquiry.run(getnames, length)
     devices = inquiry.getfounddevices()
+    _discoverycache.cache.set("devices", getnames, devices[:])
+    _discoverycache.recorddevices(devices)
     return devices
 
 
+def iterdevices(getnames=True, length=10):
+    found = []
+    result = []     # error code, set when inquiry completes
+    def founddevice(device):
+        found.append(_getdevicetuple(device))
+        _macutil.interruptwait()
+    def inquirycomplete(err, aborted):
+        result.append(err)
+        _macutil.interruptwait()
+
+    inquiry = _AsyncDeviceInquiry.alloc().init()
+    inquiry.updatenames = getnames
+    inquiry.length = length
+    inquiry.cb_founddevice = founddevice
+    inquiry.cb_updatedname = founddevice
+    inquiry.cb_completed = inquirycomplete
+
+    err = inquiry.start()
+    if err != _macutil.kIOReturnSuccess:
+        raise _lightbluecommon.BluetoothError(
+            err, "Error starting device inquiry")
+    try:
+        while True:
+            if not (found or result):
+                _macutil.waituntil(lambda: found or result)
+            done = bool(result)
+            while found:
+                yield found.pop(0)
+            if done:
+                break
+    finally:
+        if not result:
+            inquiry.stop()
+        inquiry.cb_founddevice = None
+        inquiry.cb_updatedname = None
+        inquiry.cb_completed = None
+
+    if result[0] not in (_macutil.kIOReturnSuccess, 188):   # 188: no devices
+        raise _lightbluecommon.BluetoothError(result[0],
+            "Error during device inquiry")
+
+
 def findservices(addr=None, name=None, servicetype=None):
     if servicetype not in (_lightbluecommon.RFCOMM, _lightbluecommon.OBEX, None):
         raise ValueError("servicetype must be RFCOMM, OBEX or None, was %s" % \
@@ -56,7 +105,8 @@ def findservices(addr=None, name=None, servicetype=None):
 
     if addr is None:
         try:
-            founddevices = finddevices()
+            # names aren't needed, and would add a name request for each device
+            founddevices = finddevices(getnames=False)
         except _lightbluecommon.BluetoothError, e:
             msg = "findservices() failed, " +\
                     "error while finding devices: " + str(e)
@@ -68,43 +118,28 @@ def findservices(addr=None, name=None, servicetype=None):
         addresses = [addr]
 
     services = []
+    search = []
     for devaddr in addresses:
-        iobtdevice = _IOBluetooth.IOBluetoothDevice.withAddress_(
-            _macutil.createbtdevaddr(devaddr))
-            
-        try:
-            lastseen = iobtdevice.getLastServicesUpdate()
-            if lastseen is None or lastseen.timeIntervalSinceNow() < -2:
-                # perform SDP query to update known services.
-                # wait at least a few seconds between service discovery cos 
-                # sometimes it doesn't work if doing updates too often.
-                # In future should have option to not do updates.
-                serviceupdater = _SDPQueryRunner.alloc().init()
-                try:
-                    serviceupdater.query(iobtdevice)  # blocks until updated
-                except _lightbluecommon.BluetoothError, e:
-                    msg = "findservices() couldn't get services for %s: %s" % \
-                        (iobtdevice.getNameOrAddress(), str(e))
-                    warnings.warn(msg)
-                    # or should I use cached services instead of warning?
-                    # but sometimes the cached ones are totally wrong.
-                    
-            # if searching for RFCOMM, exclude OBEX services
-            if servicetype == _lightbluecommon.RFCOMM:
-                uuidbad = _macutil.PROTO_UUIDS.get(_lightbluecommon.OBEX)
-            else:
-                uuidbad = None
-                    
-            filtered = _searchservices(iobtdevice, name=name, 
-                uuid=_macutil.PROTO_UUIDS.get(servicetype), 
-                uuidbad=uuidbad)
-            
-            #print "unfiltered:", iobtdevice.getServices()
-            services.extend([_getservicetuple(s) for s in filtered])
-        finally:            
-            # close baseband connection (not sure if this is necessary, but 
-            # sometimes the transport connection seems to stay open?)
-            iobtdevice.closeConnection()
+        cached = _discoverycache.cache.get("services", (devaddr, servicetype))
+        if cached is None:
+            search.append(devaddr)
+        else:
+            services.extend([s for s in cached if name is None or s[2] == name])
+
+    # query the devices in parallel
+    for devaddr, found, error in _servicesearch.searchservices(search,
+            _SDPQueryBackend(servicetype)):
+        if error is not None:
+            msg = "findservices() couldn't get services for %s: %s" % \
+                (devaddr, str(error))
+            warnings.warn(msg)
+            # or should I use cached services instead of warning?
+            # but sometimes the cached ones are totally wrong.
+        else:
+            _discoverycache.cache.set("services", (devaddr, servicetype),
+                found)
+        if found is not None:
+            services.extend([s for s in found if name is None or s[2] == name])
         
     return services
 
@@ -116,6 +151,11 @@ def finddevicename(address, usecache=True):
     if address == gethostaddr():
         return _gethostname()
 
+    if usecache:
+        name = _discoverycache.cache.get("name", address)
+        if name is not None:
+            return name
+
     device = _IOBluetooth.IOBluetoothDevice.withAddress_(
                 _macutil.createbtdevaddr(address))
     if usecache:
@@ -126,7 +166,9 @@ def finddevicename(address, usecache=True):
     # do name request with timeout of 10 seconds    
     result = device.remoteNameRequest_withPageTimeout_(None, 10000)
     if result == _macutil.kIOReturnSuccess:
-        return device.getName()
+        name = device.getName()
+        _discoverycache.cache.set("name", address, name)
+        return name
     raise _lightbluecommon.BluetoothError(
         "Could not find device name for %s" % address)      
 
@@ -299,14 +341,17 @@ class _SDPQueryRunner(Foundation.NSObject):
     on an IOBluetoothDevice.
     """
 
-    def query(self, device, timeout=10.0):
-        # do SDP query
+    def start(self, device):
+        # do SDP query, _queryresult is set when it completes
+        self._queryresult = None
         err = device.performSDPQuery_(self)
         if err != _macutil.kIOReturnSuccess:
             raise _lightbluecommon.BluetoothError(err, self._errmsg(device))
+
+    def query(self, device, timeout=10.0):
+        self.start(device)
         
         # performSDPQuery_ is async, so block-wait
-        self._queryresult = None
         if not _macutil.waituntil(lambda: self._queryresult is not None,
                                           timeout):
             raise _lightbluecommon.BluetoothError(
@@ -328,6 +373,80 @@ class _SDPQueryRunner(Foundation.NSObject):
         return "Error getting services for %s" % device.getNameOrAddress()
             
             
+class _SDPQueryBackend(object):
+    """
+    Backend for _servicesearch.searchservices() that runs asynchronous SDP
+    queries on several devices at once, and processes the main event loop
+    while waiting for them to complete.
+    """
+
+    def __init__(self, servicetype):
+        self.__servicetype = servicetype
+        self.__queries = {}     # address -> (device, _SDPQueryRunner or None)
+
+    def start(self, address):
+        device = _IOBluetooth.IOBluetoothDevice.withAddress_(
+            _macutil.createbtdevaddr(address))
+        runner = None
+        lastseen = device.getLastServicesUpdate()
+        if lastseen is None or lastseen.timeIntervalSinceNow() < -2:
+            # perform SDP query to update known services.
+            # wait at least a few seconds between service discovery cos 
+            # sometimes it doesn't work if doing updates too often.
+            # In future should have option to not do updates.
+            runner = _SDPQueryRunner.alloc().init()
+            runner.start(device)
+        self.__queries[address] = (device, runner)
+
+    def poll(self, timeout):
+        if not self.__completed():
+            _macutil.waituntil(self.__completed, timeout)
+        results = []
+        for address, (device, runner) in self.__queries.items():
+            if runner is None or runner._queryresult is not None:
+                del self.__queries[address]
+                results.append(self.__getresult(address, device, runner))
+        return results
+
+    def cancel(self, address):
+        query = self.__queries.pop(address, None)
+        if query is not None:
+            query[0].closeConnection()
+
+    def busy(self):
+        # closing the connection ends a cancelled query
+        return 0
+
+    def __completed(self):
+        for device, runner in self.__queries.values():
+            if runner is None or runner._queryresult is not None:
+                return True
+        return False
+
+    def __getresult(self, address, device, runner):
+        error = None
+        if runner is not None and \
+                runner._queryresult != _macutil.kIOReturnSuccess:
+            error = _lightbluecommon.BluetoothError(
+                runner._queryresult, runner._errmsg(device))
+
+        # if searching for RFCOMM, exclude OBEX services
+        if self.__servicetype == _lightbluecommon.RFCOMM:
+            uuidbad = _macutil.PROTO_UUIDS.get(_lightbluecommon.OBEX)
+        else:
+            uuidbad = None
+        try:
+            filtered = _searchservices(device,
+                uuid=_macutil.PROTO_UUIDS.get(self.__servicetype),
+                uuidbad=uuidbad)
+            services = [_getservicetuple(s) for s in filtered]
+        finally:
+            # close baseband connection (not sure if this is necessary, but 
+            # sometimes the transport connection seems to stay open?)
+            device.closeConnection()
+        return (address, services, error)
+
+
 class _SyncDeviceInquiry(object):
 
     def __init__(self):
@@ -413,6 +532,7 @@ class _AsyncDeviceInquiry(Foundation.NSObject):
         self.cb_started = None
         self.cb_completed = None
         self.cb_founddevice = None
+        self.cb_updatedname = None
         
         return self
     
@@ -475,7 +595,8 @@ class _AsyncDeviceInquiry(Foundation.NSObject):
     def deviceInquiryDeviceNameUpdated_device_devicesRemaining_(self, sender,
                                                               device,
                                                               devicesRemaining):
-        pass
+        if self.cb_updatedname:
+            self.cb_updatedname(device)
 
     # - (void)deviceInquiryUpdatingDeviceNamesStarted:devicesRemaining:
     def deviceInquiryUpdatingDeviceNamesStarted_devicesRemaining_(self, sender,
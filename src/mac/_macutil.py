@@ -17,21 +17,20 @@
 
 # Mac-specific utility functions and constants.
 
-from Foundation import NSObject, NSDate, NSPoint, NSDefaultRunLoopMode, NSTimer
-from AppKit import NSApplication, NSEvent, NSApplicationDefined, NSAnyEventMask
+from Foundation import NSObject, NSDate, NSDefaultRunLoopMode, NSRunLoop
 import objc
 
-import time
-
 import _IOBluetooth
 import _lightbluecommon
+import _obexcommon
+import _eventwait
 
-# for mac os 10.5
+# for waking up the run loop from other threads (CoreFoundation wrappers are
+# not available in older PyObjC versions)
 try:
-    from Foundation import NSUIntegerMax
-    NSAnyEventMask = NSUIntegerMax
-except:
-    pass
+    from CoreFoundation import CFRunLoopStop
+except ImportError:
+    CFRunLoopStop = None
 
 # values of constants used in _IOBluetooth.framework 
 kIOReturnSuccess = 0       # defined in <IOKit/IOReturn.h>
@@ -43,8 +42,7 @@ kBluetoothHCIErrorPageTimeout = 0x04   # <IOBluetooth/Bluetooth.h>
 kIOBluetoothServiceBrowserControllerOptionsNone = 0L
 
 
-LIGHTBLUE_NOTIFY_ID = 5444 # any old number
-WAIT_MAX_TIMEOUT = 3
+WAIT_MAX_TIMEOUT = _eventwait.MAX_BLOCK_TIME
 
 
 # IOBluetoothSDPUUID objects for RFCOMM and OBEX protocol UUIDs
@@ -105,14 +103,10 @@ def btaddrtochars(addr):
     return tuple(chars)
 
 def looponce():
-    app = NSApplication.sharedApplication() 
-
-    # to push the run loops I seem to have to do this twice
-    # use NSEventTrackingRunLoopMode or NSDefaultRunLoopMode?
-    for i in range(2):
-        event = app.nextEventMatchingMask_untilDate_inMode_dequeue_(
-            NSAnyEventMask, NSDate.dateWithTimeIntervalSinceNow_(0.02),
-            NSDefaultRunLoopMode, False)
+    """
+    Processes any pending events in the current run loop, without waiting.
+    """
+    _waiter.runpending()
     
     
 def waituntil(conditionfunc, timeout=None):
@@ -121,13 +115,13 @@ def waituntil(conditionfunc, timeout=None):
     (If timeout=None, this waits indefinitely until conditionfunc() returns
     true.) Returns false if the process timed out, otherwise returns true.
     
-    Note!! You must call interruptwait() when you know that conditionfunc()
-    should be checked (e.g. if you are waiting for data and you know some data
-    has arrived) so that this can check conditionfunc(); otherwise it will just
-    continue to wait. (This allows the function to wait for an event that is
-    sent by interruptwait() instead of polling conditionfunc().)
+    The condition is checked before waiting and then each time the run loop
+    has processed an event, e.g. a delegate callback when data has arrived, so
+    this returns as soon as the event that makes the condition true has been
+    handled. If the condition is changed from another thread, call 
+    interruptwait() so that it is checked.
     
-    This allows the caller to wait while the main event loop processes its 
+    This allows the caller to wait while the current run loop processes its 
     events. This must be done for certain situations, e.g. to receive socket
     data or to accept client connections on a server socket, since IOBluetooth
     requires the presence of an event loop to run these operations. 
@@ -136,56 +130,53 @@ def waituntil(conditionfunc, timeout=None):
     already processing the main event loop, e.g. if called from within a Cocoa
     application.
     """
-    app = NSApplication.sharedApplication()
-    starttime = time.time()
-    if timeout is None:
-        timeout = NSDate.distantFuture().timeIntervalSinceNow()
-    if not isinstance(timeout, (int, float)):
+    if timeout is not None and not isinstance(timeout, (int, long, float)):
         raise TypeError("timeout must be int or float, was %s" % \
                 type(timeout))        
-    endtime = starttime + timeout
-    while True:
-        currtime = time.time()
-        if currtime >= endtime:
-            return False
-        # use WAIT_MAX_TIMEOUT, don't wait forever in case of KeyboardInterrupt
-        e = app.nextEventMatchingMask_untilDate_inMode_dequeue_(NSAnyEventMask, NSDate.dateWithTimeIntervalSinceNow_(min(endtime - currtime, WAIT_MAX_TIMEOUT)), NSDefaultRunLoopMode, True)
-        if e is not None: 
-            if (e.type() == NSApplicationDefined and e.subtype() == LIGHTBLUE_NOTIFY_ID):
-                if conditionfunc():
-                    return True    
-            else:
-                app.postEvent_atStart_(e, True)
+    return _waiter.waituntil(conditionfunc, timeout)
 
 def interruptwait():
     """
     If waituntil() has been called, this will interrupt the waiting process so
     it can check whether it should stop waiting.
     """
-    evt = NSEvent.otherEventWithType_location_modifierFlags_timestamp_windowNumber_context_subtype_data1_data2_(NSApplicationDefined, NSPoint(), NSApplicationDefined, 0, 1, None, LIGHTBLUE_NOTIFY_ID, 0, 0)
-    NSApplication.sharedApplication().postEvent_atStart_(evt, True)    
+    _waiter.notify()
     
+def waitfor(timeout):
+    """
+    Processes run loop events for <timeout> seconds.
+    """
+    _waiter.waituntil(lambda: False, timeout)
 
-class BBCocoaSleeper(NSObject):
-    def init(self):
-        self = super(BBCocoaSleeper, self).init()
-        self.timedout = False
-        return self
-        
-    def sleep(self, timeout):
-        NSTimer.scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
-                timeout, self, "timedOut:", None, False)
-        self.timedout = False 
-        waituntil(lambda: self.timedout)     
 
-    def timedOut_(self, timer):
-        self.timedout = True                
-        interruptwait()
-    timedOut_ = objc.selector(timedOut_, signature="v@:@")        
-    
-def waitfor(timeout):
-    sleeper = BBCocoaSleeper.alloc().init()
-    sleeper.sleep(timeout)
+class _RunLoop(object):
+    """
+    Runs the current thread's NSRunLoop for _eventwait.Waiter.
+    """
+
+    def __init__(self):
+        self.__blocked = []     # CFRunLoops that are blocked in runonce()
+
+    def runonce(self, timeout):
+        runloop = NSRunLoop.currentRunLoop()
+        if timeout > 0 and CFRunLoopStop is not None:
+            cfrunloop = runloop.getCFRunLoop()
+            self.__blocked.append(cfrunloop)
+        else:
+            cfrunloop = None
+        try:
+            # returns after the first event source is handled, or on timeout
+            return runloop.runMode_beforeDate_(NSDefaultRunLoopMode, 
+                    NSDate.dateWithTimeIntervalSinceNow_(timeout))
+        finally:
+            if cfrunloop is not None:
+                self.__blocked.remove(cfrunloop)
+
+    def wakeup(self):
+        for cfrunloop in self.__blocked[:]:
+            CFRunLoopStop(cfrunloop)
+
+_waiter = _eventwait.Waiter(_RunLoop())
 
 
 class BBFileLikeObjectReader(NSObject):
@@ -199,6 +190,9 @@ class BBFileLikeObjectReader(NSObject):
     
     def initWithFileLikeObject_(self, fileobj):
         self = super(BBFileLikeObjectReader, self).init()
+        if not hasattr(fileobj, "read"):
+            # an iterator of strings or buffers
+            fileobj = _obexcommon._ChunkReader(fileobj)
         self.__fileobj = fileobj
         return self
     initWithFileLikeObject_ = objc.selector(initWithFileLikeObject_, 
@@ -31,8 +31,12 @@ from _LightAquaBlue import BBBluetoothOBEXClient, BBBluetoothOBEXServer, \
 import _lightbluecommon
 import _obexcommon
 import _macutil
+import _obexpool
+import _obexcodec
 
 from _obexcommon import OBEXError
+from _obexpool import OBEXSessionPool, sendfiles
+from _obexcodec import OBEXHeaders
 
 # from <IOBluetooth/OBEX.h>
 _kOBEXSuccess = 0
@@ -50,7 +54,8 @@ _HEADER_1BYTE = 0x80
 _HEADER_4BYTE = 0xc0
 
 # public attributes
-__all__ = ("OBEXClient", "sendfile", "recvfile")
+__all__ = ("OBEXClient", "sendfile", "sendfiles", "recvfile",
+        "OBEXSessionPool", "OBEXHeaders")
 
 
 _obexerrorcodes = { 0: "no error", -21850: "general error", -21851: "no resources", -21852: "operation not supported", -21853: "internal error", -21854: "bad argument", -21855: "timeout", -21856: "bad request", -21857: "cancelled", -21875: "session is busy", -21876: "OBEX session not connected", -21877: "bad request in OBEX session", -21878: "bad response from other party", -21879: "Bluetooth transport not available", -21880: "Bluetooth transport connection died", -21881: "OBEX session timed out", -21882: "OBEX session already connected" }
@@ -66,6 +71,8 @@ def _cutresponsefinalbit(responsecode):
     
     
 def _headersdicttoset(headers):
+    if isinstance(headers, OBEXHeaders):
+        return _checkedheaderstoset(headers)
     headerset = BBMutableOBEXHeaderSet.alloc().init()
     for header, value in headers.items():
         if isinstance(header, types.StringTypes):
@@ -102,28 +109,49 @@ def _headersdicttoset(headers):
             raise ValueError("cannot set OBEX header value for '%s'" % header)
     return headerset
 
-    
-# returns in { header-id: value } form.
-def _headersettodict(headerset):
-    headers = {}
-    for number in headerset.allHeaders():
-        hid = number.unsignedCharValue()
-        mask = hid & _HEADER_MASK            
+
+# OBEXHeaders values have already been checked, so they can be set directly
+def _checkedheaderstoset(headers):
+    headerset = BBMutableOBEXHeaderSet.alloc().init()
+    for hid, value in headers.items():
+        mask = hid & _HEADER_MASK
         if mask == _HEADER_UNICODE:
-            value = headerset.valueForUnicodeHeader_(hid)
+            headerset.setValue_forUnicodeHeader_(value, hid)
         elif mask == _HEADER_BYTE_SEQ:
-            value = headerset.valueForByteSequenceHeader_(hid)[:]
-            if hid == 0x42:     # type
-                if len(value) > 0 and value[-1] == '\0':
-                    value = value[:-1]  # remove null byte
-            elif hid == 0x44:     # time iso-8601 string
-                value = _obexcommon._datetimefromstring(value)
+            headerset.setValue_forByteSequenceHeader_(buffer(value), hid)
         elif mask == _HEADER_1BYTE:
-            value = headerset.valueFor1ByteHeader_(hid)
-        elif mask == _HEADER_4BYTE:
-            value = headerset.valueFor4ByteHeader_(hid)
-        headers[hid] = value
-    return headers
+            headerset.setValue_for1ByteHeader_(value, hid)
+        else:
+            headerset.setValue_for4ByteHeader_(value, hid)
+    return headerset
+
+    
+# returns the value of the given header in the headerset
+def _decodeheader(hid, headerset):
+    mask = hid & _HEADER_MASK
+    if mask == _HEADER_UNICODE:
+        value = headerset.valueForUnicodeHeader_(hid)
+    elif mask == _HEADER_BYTE_SEQ:
+        value = headerset.valueForByteSequenceHeader_(hid)[:]
+        if hid == 0x42:     # type
+            if len(value) > 0 and value[-1] == '\0':
+                value = value[:-1]  # remove null byte
+        elif hid == 0x44:     # time iso-8601 string
+            value = _obexcommon._datetimefromstring(value)
+    elif mask == _HEADER_1BYTE:
+        value = headerset.valueFor1ByteHeader_(hid)
+    elif mask == _HEADER_4BYTE:
+        value = headerset.valueFor4ByteHeader_(hid)
+    return value
+
+
+class _PieceList(list):
+    """
+    Collects copies of the data written to it, as a file object for a
+    BBFileLikeObjectWriter.
+    """
+    def write(self, data):
+        self.append(buffer(data)[:])
 
 
 class OBEXClient(object):
@@ -200,9 +228,10 @@ class OBEXClient(object):
         return self.__getresponse()
 
 
-    def put(self, headers, fileobj):
-        if not hasattr(fileobj, "read"):
-            raise TypeError("file-like object must have read() method")       
+    def put(self, headers, fileobj, length=None):
+        fileobj, length = _obexcommon._bodysource(fileobj, length)
+        if length is not None:
+            headers = _obexcodec.addlength(headers, length)
         self.__checkconnected()            
         self.__reset()
         
@@ -261,6 +290,55 @@ class OBEXClient(object):
         return self.__getresponse()
         
         
+    def iterget(self, headers, chunksize=None):
+        # check the arguments now, rather than when iteration starts
+        self.__checkconnected()
+        headerset = _headersdicttoset(headers)
+        return self.__iterget(headerset, chunksize)
+
+
+    def __iterget(self, headerset, chunksize):
+        self.__reset()
+        pieces = _PieceList()
+        delegate = _macutil.BBFileLikeObjectWriter.alloc().initWithFileLikeObject_(pieces)
+        outstream = BBStreamingOutputStream.alloc().initWithDelegate_(delegate)
+        outstream.open()
+        r = self.__client.sendGetRequestWithHeaders_writeToStream_(
+                headerset, outstream)
+        if r != _kOBEXSuccess:
+            raise OBEXError(r, "error starting Get request (%s)" % errdesc(r))
+
+        try:
+            while True:
+                # the data is written to the stream as run loop events are
+                # processed
+                _macutil.waituntil(lambda: len(pieces) > 0 or self._done())
+                for data in _obexcommon._iterchunks(pieces, chunksize):
+                    yield data
+                del pieces[:]
+                if self._done():
+                    break
+        finally:
+            if not self._done():
+                # the rest of the response can't be skipped
+                self.__closetransport()
+        if self.__error != _kOBEXSuccess:
+            raise OBEXError(self.__error, "error during Get request (%s)" %
+                    errdesc(self.__error))
+        resp = self.__getresponse()
+        if resp.code != _obexcommon.OK:
+            raise OBEXError("server refused the Get request (%s)" %
+                    resp.reason)
+        
+        
+    def get_into(self, headers, buf):
+        pieces = self.iterget(headers)
+        try:
+            return _obexcommon._readinto(pieces, buf)
+        finally:
+            pieces.close()  # closes the transport if the data didn't fit
+        
+        
     def setpath(self, headers, cdtoparent=False, createdirs=False):
         self.__checkconnected()
         self.__reset()
@@ -289,6 +367,15 @@ class OBEXClient(object):
         self.__busy = False
         _macutil.interruptwait()
         
+    def _isalive(self):
+        # used by OBEXSessionPool to check an idle session before reusing it
+        if self.__client is None:
+            return False
+        try:
+            return bool(self.__client.RFCOMMChannel().isOpen())
+        except:
+            return False
+
     def _setobexsession(self, session):
         self.__obexsession = session
         
@@ -317,8 +404,14 @@ class OBEXClient(object):
 
     def __getresponse(self):
         code = self.__response.responseCode()
-        rawheaders = _headersettodict(self.__response.allHeaders())
-        return _obexcommon.OBEXResponse(_cutresponsefinalbit(code), rawheaders)
+        # each header value is only read from the header set when it is
+        # accessed
+        headerset = self.__response.allHeaders()
+        rawheaders = {}
+        for number in headerset.allHeaders():
+            rawheaders[number.unsignedCharValue()] = headerset
+        return _obexcommon.OBEXResponse(_cutresponsefinalbit(code), rawheaders,
+                decoder=_decodeheader)
 
     def __del__(self):
         if self.__client is not None:
@@ -414,31 +507,16 @@ def sendfile(address, channel, source):
             not hasattr(source, "read"):
         raise TypeError("source must be string or file-like object with read() method")
               
-    if isinstance(source, types.StringTypes):
-        headers = {"name": source}
-        fileobj = file(source, "rb")
-        closefileobj = True                    
-    else:
-        if hasattr(source, "name"):
-            headers = {"name": source.name}
-        fileobj = source
-        closefileobj = False                
-        
     client = OBEXClient(address, channel)
-    client.connect()        
-    
+    client.connect()
+
     try:
-        resp = client.put(headers, fileobj)
+        _obexpool.putfile(client, source)
     finally:
-        if closefileobj:
-            fileobj.close()
         try:
             client.disconnect()
         except:
-            pass    # always ignore disconnection errors                
-
-    if resp.code != _obexcommon.OK:
-        raise OBEXError("server denied the Put request")
+            pass    # always ignore disconnection errors
 
 
 # ------------------------------------------------------------------
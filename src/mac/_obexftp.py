@@ -0,0 +1,508 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Provides a client for the OBEX File Transfer Profile, which lets you browse
+the folders on a remote device and send and retrieve files. (This is not
+available on Python for Series 60.)
+
+For example, to copy the photos from a phone into a local directory:
+    >>> import lightblue
+    >>> client = lightblue.obex.ftp.FTPClient("00:0D:93:19:C8:68", 10)
+    >>> client.connect()
+    >>> def progress(path, transferred, total):
+    ...     print path, transferred, total
+    ...
+    >>> client.mirror_get("Images/Camera", "photos", progress)
+    >>> client.disconnect()
+
+You can find a copy of the profile specification at
+<http://www.bluetooth.com/Bluetooth/Technology/Building/Specifications/>.
+"""
+
+import os
+import sys
+import types
+import xml.parsers.expat
+
+import _obexcommon
+from _obexcommon import OBEXError
+from _obex import OBEXClient
+
+__all__ = ("FTPClient", "FolderEntry", "FolderListingParser",
+        "parse_folder_listing", "FTP_TARGET_UUID")
+
+
+# the Target UUID (F9EC7BC4-953C-11D2-984E-525400DC9E09) for the File Transfer
+# Profile, in byte form
+FTP_TARGET_UUID = '\xf9\xec{\xc4\x95<\x11\xd2\x98NRT\x00\xdc\x9e\t'
+
+# the Type header value for folder listing objects
+FOLDER_LISTING_TYPE = "x-obex/folder-listing"
+
+
+class FTPClient(object):
+    """
+    A File Transfer Profile client.
+
+    All the requests are sent over one OBEX session. The client keeps track of
+    the current remote folder, so that mirror_get() and mirror_put() only send
+    SetPath requests when they need to move to a different folder.
+
+    Each method raises OBEXError if the server refuses a request.
+    """
+
+    def __init__(self, address, channel, client=None):
+        """
+        Creates the client.
+
+        Arguments:
+            - address: the address of the remote device
+            - channel: the RFCOMM channel of the remote FTP service
+            - client=None: the OBEXClient to send requests with. Give this to
+              use a client with particular options, e.g. on Linux,
+              lightblue.obex.OBEXClient(address, channel, srm=True) to send
+              file data without waiting for a response to each packet if the
+              server supports Single Response Mode.
+        """
+        if client is None:
+            client = OBEXClient(address, channel)
+        self.client = client
+        self.__path = []    # the current remote folder
+
+    def connect(self):
+        """
+        Connects to the FTP service.
+        """
+        self.__check(self.client.connect({"target": FTP_TARGET_UUID}),
+                "Connect")
+        self.__path = []
+
+    def disconnect(self):
+        """
+        Disconnects from the FTP service.
+        """
+        self.client.disconnect()
+
+    def getcwd(self):
+        """
+        Returns the current remote folder, as a "/"-separated path relative
+        to the root folder.
+        """
+        return "/".join(self.__path)
+
+    def chdir(self, path):
+        """
+        Changes the current remote folder. The path is split on "/" separators
+        and each folder is entered in turn; ".." changes to the parent folder.
+        If the path starts with "/", it is relative to the root folder.
+        """
+        if path.startswith("/"):
+            self.__chroot()
+        for name in _splitpath(path):
+            if name == "..":
+                self.__chdirup()
+            else:
+                self.__chdirdown(name)
+
+    def mkdir(self, name):
+        """
+        Creates a folder in the current remote folder.
+        """
+        self.__chdirdown(name, createdirs=True)
+        self.__chdirup()
+
+    def listdir(self):
+        """
+        Returns the contents of the current remote folder, as a list of
+        FolderEntry objects.
+
+        The listing is parsed as it is received, so it is never held in
+        memory as a whole.
+        """
+        parser = FolderListingParser()
+        self.__check(self.client.get({"type": FOLDER_LISTING_TYPE}, parser),
+                "folder listing Get")
+        return parser.close()
+
+    def getfile(self, name, dest):
+        """
+        Retrieves a file from the current remote folder, and writes it to
+        <dest>, which is a filename or a file-like object opened for writing.
+        """
+        if isinstance(dest, types.StringTypes):
+            fileobj = file(dest, "wb")
+            try:
+                self.getfile(name, fileobj)
+            finally:
+                fileobj.close()
+            return
+        self.__check(self.client.get({"name": name}, dest), "Get")
+
+    def putfile(self, source, name=None):
+        """
+        Sends a file to the current remote folder. <source> is a filename or
+        a file-like object opened for reading; if name is None, the source's
+        base filename is used.
+        """
+        if isinstance(source, types.StringTypes):
+            if name is None:
+                name = os.path.basename(source)
+            fileobj = file(source, "rb")
+            try:
+                self.putfile(fileobj, name)
+            finally:
+                fileobj.close()
+            return
+        if name is None:
+            name = os.path.basename(getattr(source, "name", ""))
+        if not name:
+            raise ValueError("name must be given for an unnamed file object")
+        self.__check(self.client.put({"name": name}, source), "Put")
+
+    def delete(self, name):
+        """
+        Deletes a file, or an empty folder, in the current remote folder.
+        """
+        self.__check(self.client.delete({"name": name}), "Delete")
+
+    def mirror_get(self, remotepath, localdir, progress=None, update=True):
+        """
+        Retrieves the remote folder at <remotepath> and all its subfolders
+        into <localdir>, creating local directories as needed. Returns the
+        paths (relative to localdir) of the files that were retrieved.
+
+        Arguments:
+            - remotepath: the remote folder, as for chdir()
+            - localdir: the local directory to copy the files into
+            - progress=None: if given, this is called as
+              progress(path, transferred, total) as each file is retrieved,
+              where total is the size given in the folder listing, or None.
+            - update=True: if True, files that already exist locally with the
+              same size as the remote file are not retrieved again
+
+        Raises OBEXError if a folder listing has an entry without a name, or
+        with a name that isn't a plain file or folder name (e.g. ".." or a
+        name containing a path separator), since the local paths are made
+        from these names.
+
+        The current remote folder is restored afterwards.
+        """
+        startpath = list(self.__path)
+        try:
+            self.chdir(remotepath)
+            copied = []
+            self.__mirrorget(localdir, "", progress, update, copied)
+        except:
+            self.__restorepath(startpath)
+        self.__gotopath(startpath)
+        return copied
+
+    def mirror_put(self, localdir, remotepath, progress=None):
+        """
+        Sends the local directory <localdir> and all its subdirectories to the
+        remote folder at <remotepath>, creating remote folders as needed.
+        Returns the paths (relative to localdir) of the files that were sent.
+
+        Arguments:
+            - localdir: the local directory to send
+            - remotepath: the remote folder, as for chdir()
+            - progress=None: if given, this is called as
+              progress(path, transferred, total) as each file is sent
+
+        The current remote folder is restored afterwards.
+        """
+        startpath = list(self.__path)
+        try:
+            if remotepath.startswith("/"):
+                self.__chroot()
+            for name in _splitpath(remotepath):
+                if name == "..":
+                    self.__chdirup()
+                else:
+                    self.__chdirdown(name, createdirs=True)
+            copied = []
+            self.__mirrorput(localdir, "", progress, copied)
+        except:
+            self.__restorepath(startpath)
+        self.__gotopath(startpath)
+        return copied
+
+    def __mirrorget(self, localdir, relpath, progress, update, copied):
+        if not os.path.isdir(localdir):
+            os.makedirs(localdir)
+        # list the folder once, and then fetch the files before descending so
+        # that each folder is only entered once
+        folders = []
+        for entry in self.listdir():
+            name, size = entry.name, entry.size
+            _checklocalname(name)
+            if entry.isfolder:
+                folders.append(name)
+                continue
+            localpath = os.path.join(localdir, name)
+            if update and size is not None and os.path.isfile(localpath) and \
+                    os.path.getsize(localpath) == size:
+                continue
+            path = _joinpath(relpath, name)
+            fileobj = file(localpath, "wb")
+            try:
+                if progress is not None:
+                    fileobj = _ProgressFile(fileobj, path, size, progress)
+                self.getfile(name, fileobj)
+            finally:
+                fileobj.close()
+            copied.append(path)
+        for name in folders:
+            self.__chdirdown(name)
+            self.__mirrorget(os.path.join(localdir, name),
+                    _joinpath(relpath, name), progress, update, copied)
+            self.__chdirup()
+
+    def __mirrorput(self, localdir, relpath, progress, copied):
+        folders = []
+        names = os.listdir(localdir)
+        names.sort()
+        for name in names:
+            localpath = os.path.join(localdir, name)
+            if os.path.isdir(localpath):
+                folders.append(name)
+                continue
+            path = _joinpath(relpath, name)
+            fileobj = file(localpath, "rb")
+            try:
+                if progress is not None:
+                    fileobj = _ProgressFile(fileobj, path,
+                            os.path.getsize(localpath), progress)
+                self.putfile(fileobj, name)
+            finally:
+                fileobj.close()
+            copied.append(path)
+        for name in folders:
+            self.__chdirdown(name, createdirs=True)
+            self.__mirrorput(os.path.join(localdir, name),
+                    _joinpath(relpath, name), progress, copied)
+            self.__chdirup()
+
+    def __chroot(self):
+        self.__check(self.client.setpath({"name": ""}), "SetPath")
+        self.__path = []
+
+    def __chdirup(self):
+        self.__check(self.client.setpath({}, cdtoparent=True), "SetPath")
+        if self.__path:
+            self.__path.pop()
+
+    def __chdirdown(self, name, createdirs=False):
+        self.__check(self.client.setpath({"name": name},
+                createdirs=createdirs), "SetPath")
+        self.__path.append(name)
+
+    def __gotopath(self, path):
+        # go up to the deepest common folder, then down to the given path
+        common = 0
+        while common < min(len(path), len(self.__path)) and \
+                path[common] == self.__path[common]:
+            common += 1
+        if len(self.__path) - common > common:
+            self.__chroot()
+            common = 0
+        while len(self.__path) > common:
+            self.__chdirup()
+        for name in path[common:]:
+            self.__chdirdown(name)
+
+    def __restorepath(self, path):
+        # Goes back to the given folder after an error, and re-raises the
+        # error. If going back fails too, the original error is raised rather
+        # than the new one, and the current folder is wherever the client
+        # got to.
+        exc_type, exc_value, exc_tb = sys.exc_info()
+        try:
+            self.__gotopath(path)
+        except Exception:
+            pass
+        raise exc_type, exc_value, exc_tb
+
+    def __check(self, response, requestname):
+        if response.code != _obexcommon.OK:
+            raise OBEXError("server refused the %s request (%s)" %
+                    (requestname, response.reason))
+
+
+class FolderEntry(object):
+    """
+    Describes a file or folder in a folder listing.
+
+    Attributes:
+        - name: the file or folder name
+        - isfolder: True if this is a folder
+        - size: the size in bytes, or None if the server did not give it
+        - modified: the last modification time as a datetime.datetime, or
+          None if the server did not give it
+        - type: the MIME type of a file, or None if the server did not give it
+    """
+    __slots__ = ("name", "isfolder", "size", "modified", "type")
+
+    def __init__(self, name, isfolder, size=None, modified=None, type=None):
+        self.name = name
+        self.isfolder = isfolder
+        self.size = size
+        self.modified = modified
+        self.type = type
+
+    def __repr__(self):
+        return "<FolderEntry name=%s isfolder=%s size=%s>" % \
+            (repr(self.name), self.isfolder, self.size)
+
+
+class FolderListingParser(object):
+    """
+    Parses folder-listing XML data as it is written to this object, so it can
+    be given as the file object for a folder listing Get request. (The
+    complete folder-listing XML DTD is documented in the IrOBEX
+    specification.)
+
+    For example:
+        >>> parser = lightblue.obex.ftp.FolderListingParser()
+        >>> client.get({"type": "x-obex/folder-listing"}, parser)
+        <OBEXResponse reason='OK' code=0x20 (0xa0) headers={}>
+        >>> entries = parser.close()
+
+    The parsed entries are added to the 'entries' list, which can be emptied
+    as the data is parsed. Raises OBEXError if the data cannot be parsed.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.__parser = xml.parsers.expat.ParserCreate()
+        self.__parser.buffer_text = True
+        self.__parser.StartElementHandler = self.__startelement
+
+    def write(self, data):
+        try:
+            self.__parser.Parse(data, False)
+        except xml.parsers.expat.ExpatError, e:
+            raise OBEXError("cannot parse folder listing: %s" % str(e))
+
+    def close(self):
+        """
+        Finishes parsing, and returns the entries list.
+        """
+        try:
+            self.__parser.Parse("", True)
+        except xml.parsers.expat.ExpatError, e:
+            raise OBEXError("cannot parse folder listing: %s" % str(e))
+        return self.entries
+
+    def __startelement(self, tag, attrs):
+        if tag != "file" and tag != "folder":
+            return
+        size = attrs.get("size")
+        if size is not None:
+            try:
+                size = int(size)
+            except ValueError:
+                size = None
+        modified = attrs.get("modified")
+        if modified is not None:
+            try:
+                modified = _obexcommon._datetimefromstring(str(modified))
+            except ValueError:
+                modified = None
+        self.entries.append(FolderEntry(attrs.get("name"), tag == "folder",
+                size, modified, attrs.get("type")))
+
+
+# size of the pieces in which parse_folder_listing() reads file objects
+_READ_SIZE = 16384
+
+def parse_folder_listing(data):
+    """
+    Parses folder-listing XML data, and yields a FolderEntry for each file and
+    folder as it is parsed. The data can be given as a string, a file-like
+    object opened for reading, or an iterable of strings (e.g. pieces of data
+    as they are received).
+
+    Raises OBEXError if the data cannot be parsed.
+    """
+    if isinstance(data, types.StringTypes):
+        chunks = (data, )
+    elif hasattr(data, "read"):
+        chunks = iter(lambda: data.read(_READ_SIZE), "")
+    else:
+        chunks = data
+    parser = FolderListingParser()
+    for chunk in chunks:
+        parser.write(chunk)
+        for entry in parser.entries:
+            yield entry
+        del parser.entries[:]
+    for entry in parser.close():
+        yield entry
+
+
+class _ProgressFile(object):
+    """
+    Wraps a file object, and calls progress(path, transferred, total) as data
+    is read from or written to it.
+    """
+
+    def __init__(self, fileobj, path, total, progress):
+        self.__fileobj = fileobj
+        self.__path = path
+        self.__total = total
+        self.__progress = progress
+        self.__transferred = 0
+        progress(path, 0, total)
+
+    def read(self, size=-1):
+        data = self.__fileobj.read(size)
+        self.__update(len(data))
+        return data
+
+    def write(self, data):
+        self.__fileobj.write(data)
+        self.__update(len(data))
+
+    def close(self):
+        self.__fileobj.close()
+
+    def __update(self, count):
+        if count:
+            self.__transferred += count
+            self.__progress(self.__path, self.__transferred, self.__total)
+
+
+def _checklocalname(name):
+    # checks that a name from a folder listing can only refer to a file or
+    # directory inside the local directory it is copied into
+    if not name:
+        raise OBEXError("folder listing has an entry without a name")
+    if name in (os.curdir, os.pardir) or os.path.isabs(name) or \
+            os.sep in name or (os.altsep and os.altsep in name):
+        raise OBEXError("folder listing has an unsafe name: %r" % name)
+
+
+def _splitpath(path):
+    return [name for name in path.split("/") if name and name != "."]
+
+
+def _joinpath(relpath, name):
+    if relpath:
+        return relpath + "/" + name
+    return name
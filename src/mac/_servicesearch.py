@@ -0,0 +1,171 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Runs service searches on several devices at once.
+#
+# The SDP queries themselves are performed by a backend, so the scheduling
+# here doesn't depend on how a platform does SDP queries. A backend has these
+# methods:
+#
+#   start(address)  - starts a query on the device with the given address
+#   poll(timeout)   - waits up to <timeout> seconds for queries to complete,
+#                     and returns an (address, services, error) tuple for each
+#                     completed query, where error is None on success
+#   cancel(address) - abandons a query that has timed out
+#   busy()          - returns the number of abandoned queries that are still
+#                     running, which count towards the maximum number of
+#                     queries at once until they finish (and are reported
+#                     by poll() as they finish, if at all)
+#
+# ThreadedBackend makes a backend from any function that performs a blocking
+# query, which can also be used to test the scheduling against a fake SDP
+# responder.
+
+import time
+import threading
+import Queue
+
+import _lightbluecommon
+
+
+# default maximum number of queries to run at once
+MAX_QUERIES = 4
+
+# default time (in seconds) to wait for the query on each device
+QUERY_TIMEOUT = 10
+
+
+def searchservices(addresses, backend, maxqueries=MAX_QUERIES,
+        timeout=QUERY_TIMEOUT):
+    """
+    Queries the devices with the given addresses through the given backend,
+    running at most <maxqueries> queries at once, and yields an
+    (address, services, error) tuple for each device as its query completes.
+
+    If a query does not complete within <timeout> seconds, it is abandoned and
+    its tuple has a BluetoothError. Abandoned queries that are still running
+    count towards <maxqueries>; if they take up every slot for <timeout>
+    seconds, the devices that are still waiting fail with a BluetoothError.
+    """
+    pending = []
+    for address in addresses:
+        if address not in pending:
+            pending.append(address)
+    pending.reverse()
+    running = {}    # address -> time at which the query times out
+    slotwait = None # time at which to stop waiting for a free slot
+
+    try:
+        while pending or running:
+            while pending and len(running) + backend.busy() < maxqueries:
+                address = pending.pop()
+                try:
+                    backend.start(address)
+                except _lightbluecommon.BluetoothError, e:
+                    yield (address, None, e)
+                    continue
+                running[address] = time.time() + timeout
+            if not running:
+                if not pending:
+                    continue
+                # every slot is taken by abandoned queries
+                if slotwait is None:
+                    slotwait = time.time() + timeout
+                backend.poll(max(slotwait - time.time(), 0))
+                if backend.busy() >= maxqueries and time.time() >= slotwait:
+                    while pending:
+                        address = pending.pop()
+                        yield (address, None, _lightbluecommon.BluetoothError(
+                            "Timed out waiting to get services for %s" %
+                            address))
+                continue
+            slotwait = None
+
+            waittime = max(min(running.values()) - time.time(), 0)
+            for address, services, error in backend.poll(waittime):
+                if running.pop(address, None) is not None:
+                    yield (address, services, error)
+
+            now = time.time()
+            for address, endtime in running.items():
+                if endtime <= now:
+                    del running[address]
+                    backend.cancel(address)
+                    yield (address, None, _lightbluecommon.BluetoothError(
+                        "Timed out getting services for %s" % address))
+    finally:
+        # the caller may have stopped iterating early
+        for address in running:
+            backend.cancel(address)
+
+
+class ThreadedBackend(object):
+    """
+    A backend that runs the given query function in a separate thread for each
+    device. The function is called with a device address, and should return
+    the device's services or raise BluetoothError.
+
+    A query that is cancelled can't be interrupted, so its thread is left to
+    finish in the background and its result is discarded.
+    """
+
+    def __init__(self, query):
+        self.__query = query
+        self.__results = Queue.Queue()
+        self.__threads = {}     # address -> thread running the query
+        self.__abandoned = set()    # threads of cancelled queries
+
+    def start(self, address):
+        thread = threading.Thread(target=self.__run, args=(address, ))
+        thread.setDaemon(True)
+        self.__threads[address] = thread
+        thread.start()
+
+    def poll(self, timeout):
+        results = []
+        try:
+            results.append(self.__results.get(timeout > 0, timeout))
+            while True:
+                results.append(self.__results.get_nowait())
+        except Queue.Empty:
+            pass
+        completed = []
+        for thread, address, services, error in results:
+            # ignore results from cancelled queries
+            if self.__threads.get(address) is thread:
+                del self.__threads[address]
+                completed.append((address, services, error))
+            else:
+                self.__abandoned.discard(thread)
+        return completed
+
+    def cancel(self, address):
+        thread = self.__threads.pop(address, None)
+        if thread is not None:
+            self.__abandoned.add(thread)
+
+    def busy(self):
+        return len(self.__abandoned)
+
+    def __run(self, address):
+        thread = threading.currentThread()
+        try:
+            services = self.__query(address)
+        except Exception, e:
+            self.__results.put((thread, address, None, e))
+        else:
+            self.__results.put((thread, address, services, None))
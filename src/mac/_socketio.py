@@ -0,0 +1,208 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Buffering for Mac OS X Bluetooth sockets.
+#
+# This doesn't import any Mac-specific modules, so that it can be tested and
+# benchmarked on other platforms with fake channels.
+
+import collections
+import socket
+import threading
+
+
+# default maximum amount of received data to buffer before applying
+# backpressure, can be changed for a socket with SO_RCVBUF
+DEFAULT_RCVBUF = 256 * 1024
+
+
+# Queue of data received on a socket. The received chunks are kept in a deque,
+# with an offset into the first chunk, so that each read only copies the data
+# that it returns, and the length is kept as a count.
+#
+# The queue is full when it holds at least 'highwater' bytes. Data is never
+# refused, since it can't be given back to the channel, so instead the 'pause'
+# callback is called when a write fills the queue, and is expected to stop the
+# channel delivering more data (wherever the run loop is pumped from). The
+# 'resume' callback is called once reads have drained the queue to half the
+# high-water mark. So the queue holds at most 'highwater' bytes plus the
+# data of the write that filled it.
+class ReceiveQueue(object):
+    def __init__(self, highwater=DEFAULT_RCVBUF, pause=None, resume=None):
+        self.highwater = highwater
+        self.lock = threading.Lock()
+        self.paused = False
+        self.__pause = pause
+        self.__resume = resume
+        self.__chunks = collections.deque()
+        self.__offset = 0       # number of bytes already read from 1st chunk
+        self.__size = 0
+
+    def empty(self):
+        return self.__size == 0
+
+    def full(self):
+        return self.__size >= self.highwater
+
+    def write(self, data):
+        # no type check, and assumes data is not empty!
+        if hasattr(data, "tobytes"):
+            data = str(data.tobytes())
+        else:
+            data = str(data)
+        self.lock.acquire()
+        try:
+            self.__chunks.append(data)
+            self.__size += len(data)
+            pause = not self.paused and self.full()
+            if pause:
+                self.paused = True
+        finally:
+            self.lock.release()
+        # callbacks are made outside the lock, in case they pump the run loop
+        if pause and self.__pause is not None:
+            self.__pause()
+
+    def __len__(self):
+        return self.__size
+
+    def read(self, count):
+        self.lock.acquire()
+        try:
+            # most reads are of part of the first chunk
+            data = None
+            if self.__chunks:
+                chunk = self.__chunks[0]
+                start = self.__offset
+                if count < len(chunk) - start:
+                    self.__offset += count
+                    self.__size -= count
+                    data = chunk[start:start+count]
+            if data is None:
+                data = "".join([part for part in self.__pop(count)])
+            resume = self.__drained()
+        finally:
+            self.lock.release()
+        if resume and self.__resume is not None:
+            self.__resume()
+        return data
+
+    def readinto(self, buf, count):
+        # like read(), but stores the data in the writable buffer 'buf' and
+        # returns the number of bytes read
+        self.lock.acquire()
+        try:
+            pos = 0
+            for part in self.__pop(count):
+                buf[pos:pos+len(part)] = part
+                pos += len(part)
+            resume = self.__drained()
+        finally:
+            self.lock.release()
+        if resume and self.__resume is not None:
+            self.__resume()
+        return pos
+
+    def __drained(self):
+        # returns whether a paused queue is now below the low-water mark, and
+        # so should be resumed (must be called with the lock held)
+        if self.paused and self.__size <= self.highwater // 2:
+            self.paused = False
+            return True
+        return False
+
+    def __pop(self, count):
+        # yields up to 'count' bytes from the front of the queue, as slices
+        # of the queued chunks (or whole chunks where possible)
+        chunks = self.__chunks
+        while count > 0 and chunks:
+            chunk = chunks[0]
+            available = len(chunk) - self.__offset
+            if count < available:
+                part = chunk[self.__offset:self.__offset+count]
+                self.__offset += count
+            else:
+                if self.__offset:
+                    part = chunk[self.__offset:]
+                else:
+                    part = chunk
+                chunks.popleft()
+                self.__offset = 0
+            count -= len(part)
+            self.__size -= len(part)
+            yield part
+
+
+# Gives a pollable file descriptor for a Mac Bluetooth socket, since
+# IOBluetooth channels don't have one. This is one end of a socket pair, which
+# is made readable (by writing a byte to the other end) whenever the Bluetooth
+# socket has data or connections to be read, and drained when it doesn't. It
+# is always writable, since send() blocks until data is sent.
+class ReadySignal(object):
+    def __init__(self):
+        self.__rsock, self.__wsock = socket.socketpair()
+        self.__rsock.setblocking(False)
+        self.__ready = False
+
+    def fileno(self):
+        return self.__rsock.fileno()
+
+    def update(self, ready):
+        if ready == self.__ready:
+            return
+        if ready:
+            self.__wsock.send("x")
+        else:
+            try:
+                while self.__rsock.recv(64):
+                    pass
+            except socket.error:
+                pass    # drained
+        self.__ready = ready
+
+    def close(self):
+        self.__rsock.close()
+        self.__wsock.close()
+
+
+def sendfile(sendall, fileobj, mtu, count=None):
+    # Sends up to 'count' bytes (or until the end of the file, if 'count' is
+    # None) from the current position of 'fileobj' by calling 'sendall' with
+    # each MTU-sized piece. The pieces are read into one reused buffer where
+    # the file object supports readinto(). Returns the number of bytes sent.
+    readinto = getattr(fileobj, "readinto", None)
+    if readinto is not None:
+        buf = bytearray(mtu)
+    total = 0
+    while count is None or total < count:
+        size = mtu
+        if count is not None:
+            size = min(size, count - total)
+        if readinto is not None:
+            if size < mtu:
+                buf = bytearray(size)
+            readcount = readinto(buf)
+            if not readcount:
+                break
+            data = buffer(buf, 0, readcount)
+        else:
+            data = fileobj.read(size)
+            if not data:
+                break
+        sendall(data)
+        total += len(data)
+    return total
@@ -0,0 +1,295 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Provides non-blocking stream connections and servers for LightBlue sockets,
+so that many RFCOMM or L2CAP connections can be serviced by one thread.
+
+The connections are driven by the asyncore module. Use the loop() function in
+this module instead of asyncore.loop(), since on Mac OS X the run loop must
+also be run to receive Bluetooth data.
+
+For example, an echo server:
+    >>> import lightblue
+    >>> from lightblue import aio
+    >>> def echo(stream, data):
+    ...     stream.write(data)
+    ...
+    >>> def connected(stream, address):
+    ...     print "Connected by", address
+    ...     stream.ondata = echo
+    ...
+    >>> server = aio.start_server(connected)
+    >>> lightblue.advertise("Echo", server.socket, lightblue.RFCOMM)
+    >>> aio.loop()
+
+And a client:
+    >>> def received(stream, data):
+    ...     print "Received", data
+    ...     stream.close()
+    ...
+    >>> stream = aio.open_connection("00:0D:93:19:C8:68", 5, ondata=received)
+    >>> stream.write("hello")
+    >>> aio.loop()
+    Received hello
+
+The Stream and Server classes can also be created directly with other socket
+objects (e.g. to test an application with Unix domain sockets).
+"""
+
+import asyncore
+import collections
+import sys
+
+import _lightblue
+import _lightbluecommon
+
+# on Mac OS X, Bluetooth events are only delivered while the run loop runs
+try:
+    from _macutil import looponce as _runloopevents
+except ImportError:
+    _runloopevents = None
+
+
+__all__ = ("open_connection", "start_server", "loop", "Stream", "Server")
+
+# number of bytes to read from a socket at once
+READ_SIZE = 4096
+
+# maximum time (in seconds) to wait in select() before running the Mac OS X
+# run loop
+_RUNLOOP_INTERVAL = 0.02
+
+
+def open_connection(address, channel, ondata=None, onclose=None,
+        onconnect=None, proto=_lightbluecommon.RFCOMM, map=None):
+    """
+    Starts connecting to the given device address and RFCOMM channel or L2CAP
+    PSM, and returns a Stream for the connection.
+
+    Arguments:
+        - address: the address of the remote device
+        - channel: the RFCOMM channel or L2CAP PSM to connect to
+        - ondata=None: the Stream's ondata callback
+        - onclose=None: the Stream's onclose callback
+        - onconnect=None: the Stream's onconnect callback
+        - proto=RFCOMM: RFCOMM or L2CAP
+        - map=None: the asyncore channel map to use, if not the default map
+
+    The callbacks are given here because connecting may complete (or fail)
+    before this function returns.
+    """
+    stream = Stream(map=map)
+    stream.ondata = ondata
+    stream.onclose = onclose
+    stream.onconnect = onconnect
+    stream.set_socket(_lightblue.socket(proto))
+    stream.socket.setblocking(0)
+    try:
+        stream.connect((address, channel))
+    except Exception, e:
+        stream._finish(e)
+    return stream
+
+
+def start_server(handler, channel=0, proto=_lightbluecommon.RFCOMM,
+        backlog=5, map=None):
+    """
+    Starts a server on the given RFCOMM channel, and returns a Server that
+    calls handler(stream, address) with a new Stream for each client that
+    connects.
+
+    Arguments:
+        - handler: the function to call for each new connection
+        - channel=0: the RFCOMM channel to listen on; 0 uses any available
+          channel (on Mac OS X, this must be 0)
+        - proto=RFCOMM: the socket protocol
+        - backlog=5: the number of unaccepted connections to allow
+        - map=None: the asyncore channel map to use, if not the default map
+
+    Use server.socket.getsockname() to find the channel if 0 was given, and
+    lightblue.advertise(name, server.socket, servicetype) to advertise the
+    service.
+    """
+    sock = _lightblue.socket(proto)
+    sock.bind(("", channel))
+    sock.listen(backlog)
+    return Server(sock, handler, map)
+
+
+def loop(timeout=30.0, map=None, count=None):
+    """
+    Runs the asyncore loop until all the Streams and Servers (and other
+    asyncore channels) in the given map are closed, or until <count> passes
+    have been made if count is not None.
+
+    This is the same as asyncore.loop(), except that on Mac OS X it also runs
+    the run loop between calls to select(), so that Bluetooth events are
+    received.
+    """
+    if _runloopevents is None:
+        asyncore.loop(timeout, False, map, count)
+        return
+    if map is None:
+        map = asyncore.socket_map
+    passes = 0
+    while map and (count is None or passes < count):
+        _runloopevents()
+        asyncore.loop(min(timeout, _RUNLOOP_INTERVAL), False, map, 1)
+        passes += 1
+
+
+class Stream(asyncore.dispatcher):
+    """
+    A connection that is serviced by an asyncore loop.
+
+    Data is received through these callbacks, which can be set as attributes:
+        - ondata(stream, data): called with each piece of data received
+        - onclose(stream, error): called once when the connection is closed,
+          where error is None if the connection was closed normally, or the
+          exception that caused it to close
+        - onconnect(stream): called when an outgoing connection is made
+
+    Data passed to write() is queued and sent as the socket becomes writable.
+    """
+
+    def __init__(self, sock=None, map=None):
+        asyncore.dispatcher.__init__(self, sock, map)
+        self.ondata = None
+        self.onclose = None
+        self.onconnect = None
+        self.__outgoing = collections.deque()
+        self.__offset = 0       # number of bytes sent from 1st outgoing item
+        self.__buffered = 0
+        self.__paused = False
+        self.__closewhendone = False
+        self.__finished = False
+
+    def write(self, data):
+        """
+        Queues the given data (a string or buffer) to be sent.
+        """
+        if self.__finished:
+            raise _lightbluecommon.BluetoothError("stream is closed")
+        if len(data) > 0:
+            self.__outgoing.append(data)
+            self.__buffered += len(data)
+
+    def getbufferedsize(self):
+        """
+        Returns the number of bytes that have been written but not yet sent,
+        so that writers can wait before queueing more data.
+        """
+        return self.__buffered
+
+    def pausereading(self):
+        """
+        Stops receiving data until resumereading() is called.
+        """
+        self.__paused = True
+
+    def resumereading(self):
+        self.__paused = False
+
+    def closewhendone(self):
+        """
+        Closes the connection once all the written data has been sent.
+        """
+        if self.__outgoing:
+            self.__closewhendone = True
+        else:
+            self._finish(None)
+
+    def close(self):
+        """
+        Closes the connection immediately, discarding unsent data.
+        """
+        self._finish(None)
+
+    def readable(self):
+        return not self.__paused
+
+    def writable(self):
+        return not self.connected or len(self.__outgoing) > 0
+
+    def handle_connect(self):
+        if self.onconnect is not None:
+            self.onconnect(self)
+
+    def handle_read(self):
+        data = self.recv(READ_SIZE)
+        if data and self.ondata is not None:
+            self.ondata(self, data)
+
+    def handle_write(self):
+        outgoing = self.__outgoing
+        while outgoing:
+            data = outgoing[0]
+            if self.__offset:
+                sent = self.send(buffer(data, self.__offset))
+            else:
+                sent = self.send(data)
+            if not sent:
+                break   # would block
+            self.__buffered -= sent
+            self.__offset += sent
+            if self.__offset < len(data):
+                break
+            outgoing.popleft()
+            self.__offset = 0
+        if self.__closewhendone and not outgoing:
+            self._finish(None)
+
+    def handle_close(self):
+        self._finish(None)
+
+    def handle_error(self):
+        self._finish(sys.exc_info()[1])
+
+    def _finish(self, error):
+        if self.__finished:
+            return
+        self.__finished = True
+        self.__outgoing.clear()
+        self.__buffered = 0
+        asyncore.dispatcher.close(self)
+        if self.onclose is not None:
+            self.onclose(self, error)
+
+
+class Server(asyncore.dispatcher):
+    """
+    Accepts connections on a listening socket, which is serviced by an
+    asyncore loop, and calls handler(stream, address) with a new Stream for
+    each connection.
+    """
+
+    def __init__(self, sock, handler, map=None):
+        asyncore.dispatcher.__init__(self, sock, map)
+        self.accepting = True   # the socket is already listening
+        self.handler = handler
+        self.__map = map
+
+    def writable(self):
+        return False
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None:
+            return  # would block
+        conn, address = pair
+        self.handler(Stream(conn, self.__map), address)
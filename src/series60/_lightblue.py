@@ -17,9 +17,10 @@
 
 import socket as _socket
 import _lightbluecommon
+import _discoverycache
 
 # public attributes
-__all__ = ("finddevices", "findservices", "finddevicename", 
+__all__ = ("finddevices", "iterdevices", "findservices", "finddevicename", 
            "gethostaddr", "gethostclass",
            "socket", 
            "advertise", "stopadvertise", 
@@ -34,6 +35,10 @@ def finddevices(getnames=True, length=10):
 
     import e32
 
+    devices = _discoverycache.cache.get("devices", getnames)
+    if devices is not None:
+        return devices[:]
+
     inquiry = _DeviceInquiry()
     inquiry.start(getnames, length)
     
@@ -47,7 +52,34 @@ def finddevices(getnames=True, length=10):
         inquiry.stop()
         if timer is not None: timer.cancel()
     
-    return inquiry.getfounddevices()
+    devices = inquiry.getfounddevices()
+    _discoverycache.cache.set("devices", getnames, devices[:])
+    _discoverycache.recorddevices(devices)
+    return devices
+
+def iterdevices(getnames=True, length=10):
+    import e32
+
+    inquiry = _DeviceInquiry()
+    inquiry.start(getnames, length)
+
+    count = 0
+    timer = None
+    try:
+        while True:
+            done = inquiry.isdone()
+            devices = inquiry.getfounddevices()
+            for device in devices[count:]:
+                yield device
+            count = len(devices)
+            if done:
+                break
+            # keep waiting
+            timer = e32.Ao_timer()
+            timer.after(0.1)
+    finally:
+        inquiry.stop()
+        if timer is not None: timer.cancel()
 
 def findservices(addr=None, name=None, servicetype=None):
     if servicetype is None:
@@ -68,18 +100,23 @@ def findservices(addr=None, name=None, servicetype=None):
         
     services = []
     for addr in btaddrs:
-        for func in funcs:
-            try:
-                devaddr, servicesdict = func(addr)
-            except _socket.error, e:
-                #raise _lightbluecommon.BluetoothError(str(e))
-                print "[lightblue] cannot look up services for %s" % addr
-                continue
-            if name is not None:
-                for servicename in servicesdict.keys():
-                    if servicename != name:
-                        del servicesdict[servicename]
-            services.extend(_getservicetuples(devaddr, servicesdict))
+        found = _discoverycache.cache.get("services", (addr, servicetype))
+        if found is None:
+            found = []
+            complete = True
+            for func in funcs:
+                try:
+                    devaddr, servicesdict = func(addr)
+                except _socket.error, e:
+                    #raise _lightbluecommon.BluetoothError(str(e))
+                    print "[lightblue] cannot look up services for %s" % addr
+                    complete = False
+                    continue
+                found.extend(_getservicetuples(devaddr, servicesdict))
+            if complete:
+                _discoverycache.cache.set("services", (addr, servicetype),
+                    found)
+        services.extend([s for s in found if name is None or s[2] == name])
     return services
 
 def finddevicename(address, usecache=True):
@@ -88,6 +125,11 @@ def finddevicename(address, usecache=True):
         
     if address == gethostaddr():
         return _gethostname()
+
+    if usecache:
+        name = _discoverycache.cache.get("name", address)
+        if name is not None:
+            return name
     
     try:
         # lookupName() expects address without colon separators
@@ -97,6 +139,7 @@ def finddevicename(address, usecache=True):
     except SymbianError, e:
         raise _lightbluecommon.BluetoothError(
             "Cannot find device name for %s: %s" % (address, str(e)))
+    _discoverycache.cache.set("name", address, name)
     return name
 
 def gethostaddr():
@@ -197,6 +240,23 @@ class _SocketWrapper(object):
         return (self._sock.recv(bufsize, flags), None)
     recvfrom.__doc__ = _lightbluecommon._socketdocs["recvfrom"]        
 
+    # PyS60 sockets don't have recv_into(), so copy the received data
+    def recv_into(self, buffer, nbytes=0, flags=0):
+        if nbytes < 0:
+            raise ValueError("negative buffersize in recv_into")
+        if nbytes == 0:
+            nbytes = len(buffer)
+        elif nbytes > len(buffer):
+            raise ValueError("buffer too small for requested bytes")
+        data = self._sock.recv(nbytes, flags)
+        buffer[:len(data)] = data
+        return len(data)
+    recv_into.__doc__ = _lightbluecommon._socketdocs["recv_into"]
+
+    def recvfrom_into(self, buffer, nbytes=0, flags=0):
+        return (self.recv_into(buffer, nbytes, flags), None)
+    recvfrom_into.__doc__ = _lightbluecommon._socketdocs["recvfrom_into"]
+
     # PyS60 raises socket.error("Bad protocol") when this is called for stream
     # sockets, but implement it here like send() for consistency with Linux+Mac
     def sendto(self, data, *extra):
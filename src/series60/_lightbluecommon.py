@@ -165,9 +165,20 @@ _socketdocs = {
     """
     fileno() -> integer
     
-    Return the integer file descriptor of the socket.
+    Return the integer file descriptor of the socket, which can be used with
+    select() and poll().
+    
+    On Mac OS X, Bluetooth channels don't have file descriptors, so this
+    returns the descriptor of an internal socket that is readable whenever
+    recv() or accept() can be called without blocking (including when the
+    connection has been closed), and is always writable, since send() blocks
+    until the data is sent. Data and connections are only received while the
+    current run loop is running, so call select() with a short timeout and
+    run the run loop between calls (e.g. with NSRunLoop's 
+    runMode:beforeDate:), unless it is already being run (e.g. in a Cocoa 
+    application).
     
-    Raises NotImplementedError on Mac OS X and Python For Series 60.
+    Raises NotImplementedError on Python For Series 60.
     """,
 "getpeername":
     """
@@ -200,8 +211,8 @@ _socketdocs = {
     
     Currently support for socket options are platform independent -- i.e. 
     depends on the underlying Series 60 or BlueZ socket options support. 
-    The Mac OS X implementation currently does not support any options at
-    all and automatically raises socket.error.
+    The Mac OS X implementation currently only supports the SO_RCVBUF option
+    at the SOL_SOCKET level, and raises socket.error for all other options.
     """,
 "gettimeout":
     """
@@ -250,6 +261,25 @@ _socketdocs = {
     
     Like recv(buffersize, flags) but also return the sender's address info.
     """,
+"recv_into":
+    """
+    recv_into(buffer[, nbytes[, flags]]) -> nbytes_read
+    
+    A version of recv() that stores its data into a writable buffer, such as
+    a bytearray or mmap, rather than creating a new string. Receive up to
+    nbytes bytes from the socket; if nbytes is not specified (or 0), receive
+    up to the size of the given buffer. Returns the number of bytes received.
+    
+    On Mac OS X and Python for Series 60, the data is received as for recv()
+    and then copied into the buffer.
+    """,
+"recvfrom_into":
+    """
+    recvfrom_into(buffer[, nbytes[, flags]]) -> (nbytes, address info)
+    
+    Like recv_into(buffer[, nbytes[, flags]]) but also return the sender's 
+    address info.
+    """,
 "send": 
     """
     send(data[, flags]) -> count
@@ -258,6 +288,10 @@ _socketdocs = {
     argument, see the Unix manual.  Return the number of bytes
     sent.
     
+    The data can also be any object that supports the buffer interface, such
+    as a bytearray or a memoryview slice of a larger buffer (except on 
+    Python for Series 60, which only accepts strings).
+    
     The socket must be connected to a remote socket.
     
     Currently the flags argument has no effect on Mac OS X.
@@ -270,6 +304,9 @@ _socketdocs = {
     argument, see the Unix manual.  This calls send() repeatedly
     until all data is sent.  If an error occurs, it's impossible
     to tell how much data has been sent.
+    
+    As for send(), the data can be any object that supports the buffer
+    interface.
     """,
 "sendto":
     """
@@ -302,8 +339,11 @@ _socketdocs = {
     
     Currently support for socket options are platform independent -- i.e. 
     depends on the underlying Series 60 or BlueZ socket options support. 
-    The Mac OS X implementation currently does not support any options at
-    all and automatically raise socket.error.
+    The Mac OS X implementation currently only supports the SO_RCVBUF option
+    at the SOL_SOCKET level, which sets the amount of received data (256 KB
+    by default) that is buffered before the socket stops taking in more data
+    from the channel, until some of it has been read. It raises socket.error
+    for all other options.
     """,
 "settimeout":
     """
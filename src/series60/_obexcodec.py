@@ -0,0 +1,424 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Encodes and decodes OBEX packets and headers to and from byte strings.
+#
+# This doesn't depend on any platform-specific libraries, so it can be used to
+# talk OBEX over any socket-like object that provides send() and recv(). The
+# decoding functions work on offsets into the given data, and return byte
+# sequence header values as buffer objects that point into the original
+# packet data, so that no copies are made until a value is actually used.
+
+import struct
+import types
+import datetime
+
+import _obexcommon
+from _obexcommon import OBEXError
+
+
+# request opcodes (without the final bit)
+CONNECT = 0x00
+DISCONNECT = 0x01
+PUT = 0x02
+GET = 0x03
+SETPATH = 0x05
+SESSION = 0x07
+ABORT = 0x7f
+
+FINAL = 0x80
+
+# header IDs that aren't in _obexcommon._HEADER_STRINGS_TO_IDS because they
+# aren't set by callers
+BODY = 0x48
+END_OF_BODY = 0x49
+CONNECTION_ID = 0xcb
+TARGET = 0x46
+
+OBEX_VERSION = 0x10
+MIN_PACKET_LENGTH = 255
+MAX_PACKET_LENGTH = 0xffff
+
+# header encodings, from the top 2 bits of the header ID
+_HEADER_MASK = 0xc0
+_HEADER_UNICODE = 0x00
+_HEADER_BYTE_SEQ = 0x40
+_HEADER_1BYTE = 0x80
+_HEADER_4BYTE = 0xc0
+
+# packet prefix is opcode/response code + 2-byte packet length, and prefix of
+# unicode and byte sequence headers is header ID + 2-byte header length
+_PREFIX = struct.Struct(">BH")
+_PREFIX_SIZE = _PREFIX.size
+_UINT32 = struct.Struct(">BI")
+_UINT8 = struct.Struct(">BB")
+_BYTE = struct.Struct(">B")
+
+# non-header data for Connect requests and responses: version, flags and
+# maximum packet length
+_CONNECT_DATA = struct.Struct(">BBH")
+
+# number of bytes of non-header data in request and response packets
+_REQUEST_NONHEADER_SIZES = { CONNECT: _CONNECT_DATA.size, SETPATH: 2 }
+_RESPONSE_NONHEADER_SIZES = { CONNECT: _CONNECT_DATA.size }
+
+
+### headers ###
+
+def headerid(header):
+    """
+    Returns the header ID for the given header, which may either be a string
+    (not case-sensitive) or a raw header ID value.
+
+    Raises ValueError if the header is not known.
+    """
+    if isinstance(header, types.StringTypes):
+        hid = _obexcommon._HEADER_STRINGS_TO_IDS.get(header.lower())
+    else:
+        hid = header
+    if not isinstance(hid, int) or hid < 0 or hid > 0xff:
+        raise ValueError("unknown header '%s'" % header)
+    return hid
+
+
+def packheader(hid, value):
+    """
+    Returns the encoded bytes for the header with the given ID and value.
+
+    Raises TypeError if the value is not of the correct type for the header.
+    """
+    mask = hid & _HEADER_MASK
+    if mask == _HEADER_UNICODE:
+        if not isinstance(value, types.StringTypes):
+            raise TypeError("value for header 0x%02x must be string, was %s" %
+                    (hid, type(value)))
+        if len(value) == 0:
+            # an empty header, e.g. for changing to the root directory with
+            # a SetPath request
+            return _PREFIX.pack(hid, _PREFIX_SIZE)
+        data = unicode(value).encode("utf-16-be") + "\x00\x00"
+        return _PREFIX.pack(hid, _PREFIX_SIZE + len(data)) + data
+    elif mask == _HEADER_BYTE_SEQ:
+        if isinstance(value, datetime.datetime):
+            value = value.strftime(_obexcommon._LOCAL_TIME_FORMAT)
+        try:
+            data = buffer(value)
+        except TypeError:
+            raise TypeError("value for header 0x%02x must be string, array or other buffer type, was %s" % (hid, type(value)))
+        return _PREFIX.pack(hid, _PREFIX_SIZE + len(data)) + data[:]
+    elif mask == _HEADER_1BYTE:
+        if not isinstance(value, int):
+            raise TypeError("value for header 0x%02x must be int, was %s" %
+                    (hid, type(value)))
+        return _UINT8.pack(hid, value & 0xff)
+    else:
+        if not isinstance(value, (int, long)):
+            raise TypeError("value for header 0x%02x must be int, was %s" %
+                    (hid, type(value)))
+        return _UINT32.pack(hid, value & 0xffffffffL)
+
+
+def packheaders(headers):
+    """
+    Returns the encoded bytes for the given headers, which can be a dictionary
+    or a sequence of (header, value) pairs. The headers may be strings or raw
+    header IDs, as for OBEXClient requests.
+
+    Connection-ID and Target headers are always encoded first, since the
+    specification requires them to be the first headers in a packet.
+    """
+    if hasattr(headers, "items"):
+        headers = headers.items()
+    first = []
+    rest = []
+    for header, value in headers:
+        hid = headerid(header)
+        if hid in (CONNECTION_ID, TARGET):
+            first.append((hid != CONNECTION_ID, packheader(hid, value)))
+        else:
+            rest.append(packheader(hid, value))
+    first.sort()
+    return "".join([data for isfirst, data in first] + rest)
+
+
+def addlength(headers, length):
+    """
+    Returns the given request headers (a dictionary or OBEXHeaders) with a
+    Length header for the given length added, unless they already have one.
+    """
+    lengthid = headerid("length")
+    for header, value in headers.items():
+        if headerid(header) == lengthid:
+            return headers
+    if isinstance(headers, OBEXHeaders):
+        return OBEXHeaders(headers.items() + [(lengthid, length)])
+    headers = dict(headers)
+    headers[lengthid] = length
+    return headers
+
+
+class OBEXHeaders(object):
+    """
+    A set of request headers that is checked and encoded once, so that it can
+    be reused for many requests without being converted each time. This can
+    be given to OBEXClient methods in place of a headers dictionary.
+
+    For example, to send the same request headers repeatedly:
+        >>> listing = lightblue.obex.OBEXHeaders(
+        ...         {"type": "x-obex/folder-listing"})
+        >>> client.get(listing, fileobj)
+        <OBEXResponse reason='OK' code=0x20 (0xa0) headers={}>
+
+    Raises ValueError for unknown headers, and TypeError for header values of
+    the wrong type. The Connection-ID header cannot be given, since the client
+    adds it to each request itself.
+    """
+
+    def __init__(self, headers):
+        """
+        Creates the header set from a dictionary or a sequence of
+        (header, value) pairs, where headers are strings or raw header IDs.
+        """
+        if hasattr(headers, "items"):
+            headers = headers.items()
+        values = {}
+        for header, value in headers:
+            hid = headerid(header)
+            if hid == CONNECTION_ID:
+                raise ValueError("connection-id header cannot be set")
+            if isinstance(value, datetime.datetime):
+                value = value.strftime(_obexcommon._LOCAL_TIME_FORMAT)
+            values[hid] = value
+        self.__values = values
+        # the encoded headers, which also checks the values
+        self.data = packheaders(values)
+
+    def items(self):
+        """
+        Returns the (header ID, value) pairs, with datetime values converted
+        to strings.
+        """
+        return self.__values.items()
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __repr__(self):
+        return "<OBEXHeaders %s>" % self.__values
+
+
+def iterheaders(data, offset=0, end=None):
+    """
+    Yields a (header-id, value) pair for each header encoded in the given data
+    (a string, buffer or bytearray), starting from the given offset.
+
+    Unicode headers are returned as unicode strings, byte sequence headers are
+    returned as buffer objects into the given data, and 1-byte and 4-byte
+    headers are returned as ints or longs.
+
+    Raises OBEXError if the data is malformed.
+    """
+    if end is None:
+        end = len(data)
+    unpack_from = _PREFIX.unpack_from
+    while offset < end:
+        hid = _BYTE.unpack_from(data, offset)[0]
+        mask = hid & _HEADER_MASK
+        if mask == _HEADER_1BYTE:
+            if offset + 2 > end:
+                raise OBEXError("malformed header data for 0x%02x" % hid)
+            yield (hid, _UINT8.unpack_from(data, offset)[1])
+            offset += 2
+        elif mask == _HEADER_4BYTE:
+            if offset + 5 > end:
+                raise OBEXError("malformed header data for 0x%02x" % hid)
+            yield (hid, _UINT32.unpack_from(data, offset)[1])
+            offset += 5
+        else:
+            if offset + _PREFIX_SIZE > end:
+                raise OBEXError("malformed header data for 0x%02x" % hid)
+            length = unpack_from(data, offset)[1]
+            if length < _PREFIX_SIZE or offset + length > end:
+                raise OBEXError("bad length for header 0x%02x" % hid)
+            start = offset + _PREFIX_SIZE
+            if mask == _HEADER_UNICODE:
+                yield (hid, _decodeunicode(data, start, offset + length))
+            else:
+                yield (hid, buffer(data, start, length - _PREFIX_SIZE))
+            offset += length
+
+
+def unpackheaders(data, offset=0, end=None):
+    """
+    Returns the headers encoded in the given data as a dictionary of
+    { header-id: value } mappings. See iterheaders() for the value types.
+    """
+    headers = {}
+    for hid, value in iterheaders(data, offset, end):
+        headers[hid] = value
+    return headers
+
+
+def _decodeunicode(data, start, end):
+    # ignore the 2-byte null terminator
+    if end - start >= 2 and data[end-2:end] == "\x00\x00":
+        end -= 2
+    if end <= start:
+        return u""
+    try:
+        return unicode(buffer(data, start, end - start), "utf-16-be")
+    except UnicodeError, e:
+        raise OBEXError("cannot decode unicode header: %s" % str(e))
+
+
+### packets ###
+
+def packpacket(code, headerdata="", nonheaderdata=""):
+    """
+    Returns a packet with the given opcode or response code (which should
+    include the final bit, if required), encoded headers and non-header data.
+    """
+    length = _PREFIX_SIZE + len(nonheaderdata) + len(headerdata)
+    if length > MAX_PACKET_LENGTH:
+        raise ValueError("packet length %d is too large" % length)
+    return "".join((_PREFIX.pack(code, length), nonheaderdata, headerdata))
+
+
+def packconnectdata(maxpacketlength=MAX_PACKET_LENGTH, flags=0):
+    """
+    Returns the non-header data for a Connect request or response.
+    """
+    return _CONNECT_DATA.pack(OBEX_VERSION, flags, maxpacketlength)
+
+
+def unpackconnectdata(data):
+    """
+    Returns the (version, flags, max-packet-length) values from the given
+    Connect non-header data.
+    """
+    if len(data) < _CONNECT_DATA.size:
+        raise OBEXError("Connect packet is too short")
+    return _CONNECT_DATA.unpack_from(data)
+
+
+def packetlength(data, offset=0):
+    """
+    Returns the length of the packet that starts at the given offset, as
+    given in the packet prefix.
+    """
+    return _PREFIX.unpack_from(data, offset)[1]
+
+
+def unpackrequest(data):
+    """
+    Decodes the given request packet and returns a
+    (opcode, isfinal, nonheaderdata, headers) tuple. The opcode does not have
+    the final bit set.
+    """
+    code, length = _checkpacket(data)
+    opcode = code & ~FINAL
+    nonheaderend = _PREFIX_SIZE + _REQUEST_NONHEADER_SIZES.get(opcode, 0)
+    if nonheaderend > length:
+        raise OBEXError("request packet is too short")
+    return (opcode, bool(code & FINAL),
+            buffer(data, _PREFIX_SIZE, nonheaderend - _PREFIX_SIZE),
+            unpackheaders(data, nonheaderend, length))
+
+
+def unpackresponse(data, opcode):
+    """
+    Decodes the given response packet, which was received in response to a
+    request with the given opcode. Returns a
+    (responsecode, isfinal, nonheaderdata, headers) tuple. The response code
+    does not have the final bit set.
+    """
+    code, length = _checkpacket(data)
+    nonheaderend = _PREFIX_SIZE + \
+            _RESPONSE_NONHEADER_SIZES.get(opcode & ~FINAL, 0)
+    if nonheaderend > length:
+        raise OBEXError("response packet is too short")
+    return (code & ~FINAL, bool(code & FINAL),
+            buffer(data, _PREFIX_SIZE, nonheaderend - _PREFIX_SIZE),
+            unpackheaders(data, nonheaderend, length))
+
+
+def _checkpacket(data):
+    if len(data) < _PREFIX_SIZE:
+        raise OBEXError("packet is too short")
+    code, length = _PREFIX.unpack_from(data)
+    if length < _PREFIX_SIZE or length > len(data):
+        raise OBEXError("bad packet length %d" % length)
+    return code, length
+
+
+### reading packets from sockets ###
+
+def recvpacket(sock):
+    """
+    Reads one complete packet from the given socket-like object and returns
+    it as a string.
+
+    Raises OBEXError if the connection is closed before the whole packet has
+    been received.
+    """
+    prefix = _recvall(sock, _PREFIX_SIZE)
+    length = _PREFIX.unpack_from(prefix)[1]
+    if length < _PREFIX_SIZE:
+        raise OBEXError("bad packet length %d" % length)
+    if length == _PREFIX_SIZE:
+        return prefix
+    return prefix + _recvall(sock, length - _PREFIX_SIZE)
+
+
+def recvpacket_into(sock, buf):
+    """
+    Reads one complete packet from the given socket-like object into the
+    given writable buffer (e.g. a bytearray of MAX_PACKET_LENGTH bytes), and
+    returns the packet length. The socket must have a recv_into() method.
+
+    This allows one buffer to be reused for all the packets in a session.
+    """
+    view = memoryview(buf)
+    _recvall_into(sock, view, 0, _PREFIX_SIZE)
+    length = _PREFIX.unpack_from(buf)[1]
+    if length < _PREFIX_SIZE or length > len(buf):
+        raise OBEXError("bad packet length %d" % length)
+    _recvall_into(sock, view, _PREFIX_SIZE, length)
+    return length
+
+
+def _recvall(sock, count):
+    data = sock.recv(count)
+    if len(data) == count:
+        return data
+    chunks = [data]
+    received = len(data)
+    while received < count:
+        if not data:
+            raise OBEXError("connection closed while reading packet")
+        data = sock.recv(count - received)
+        chunks.append(data)
+        received += len(data)
+    return "".join(chunks)
+
+
+def _recvall_into(sock, view, start, end):
+    while start < end:
+        count = sock.recv_into(view[start:end], end - start)
+        if count == 0:
+            raise OBEXError("connection closed while reading packet")
+        start += count
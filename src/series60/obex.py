@@ -57,6 +57,24 @@ _docstrings = {
         ...     raise lightblue.obex.OBEXError("server denied the Put request")
         >>>
     """,
+"sendfiles":
+    """
+    Sends several files to a remote device, using a single connection for all
+    of them. (This is not available on Python for Series 60.)
+
+    Raises lightblue.obex.OBEXError if an error occurred during a request, or
+    if a request was refused by the remote device. Files before that one will
+    have been sent.
+
+    Arguments:
+        - address: the address of the remote device
+        - channel: the RFCOMM channel of the remote OBEX service
+        - sources: a sequence of filenames or file-like objects, as for
+          sendfile()
+
+    To keep the connection open between calls, use OBEXSessionPool.sendfiles()
+    instead.
+    """,
 "recvfile":
     """
     Receives a file through an OBEX service.
@@ -85,6 +103,7 @@ from _obexcommon import *
 
 import _obex
 import _obexcommon
+
 __all__ = _obex.__all__ + _obexcommon.__all__
 
 # set docstrings
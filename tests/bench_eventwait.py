@@ -0,0 +1,70 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the time from a callback being posted on another thread to the
+# wait for it returning, with _eventwait.Waiter and with the 0.4 looponce()
+# loop, which pumped the event queue twice with a 20 ms deadline between
+# condition checks. Uses a fake run loop in place of NSRunLoop.
+#
+# Usage: python tests/bench_eventwait.py
+
+import threading
+import time
+
+import support
+import _eventwait
+from fakerunloop import FakeRunLoop
+
+
+def oldwaituntil(runloop, conditionfunc):
+    while not conditionfunc():
+        for i in range(2):
+            runloop.runonce(0)
+            time.sleep(0.02)
+
+
+def newwaituntil(runloop, conditionfunc):
+    _eventwait.Waiter(runloop).waituntil(conditionfunc)
+
+
+def run(waituntil, count):
+    # posts <count> callbacks at random-ish times and waits for each
+    runloop = FakeRunLoop()
+    latencies = []
+    for i in range(count):
+        state = {}
+        def callback():
+            state["done"] = time.time()
+        timer = threading.Timer(0.001 * (i % 7), runloop.post, [callback])
+        timer.start()
+        waituntil(runloop, lambda: "done" in state)
+        latencies.append(time.time() - state["done"])
+        timer.join()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[-1]
+
+
+def main():
+    for name, waituntil in (("0.4 looponce()", oldwaituntil),
+            ("Waiter", newwaituntil)):
+        median, worst = run(waituntil, 50)
+        print "%-15s median %8.3f ms, max %8.3f ms after callback" % (name,
+                median * 1000, worst * 1000)
+
+
+if __name__ == "__main__":
+    main()
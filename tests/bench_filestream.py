@@ -0,0 +1,115 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures how fast the _lightblueobex C extension streams Put and Get body
+# data to and from built-in file objects (which are read and written without
+# calling into Python) compared with other file-like objects, over a loopback
+# session with the server in tests/obexserver.py. Reports MB/s, the number of
+# Python read()/write() calls and the peak memory use. (Linux only.)
+#
+# Usage: python tests/bench_filestream.py [size-in-MB]
+
+import mmap
+import resource
+import socket
+import sys
+import tempfile
+import time
+
+import support
+import obexserver
+import _lightblueobex
+
+
+class CountingReader(object):
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.calls = 0
+    def read(self, size=-1):
+        self.calls += 1
+        return self.fileobj.read(size)
+
+class CountingWriter(object):
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.calls = 0
+    def write(self, data):
+        self.calls += 1
+        self.fileobj.write(data)
+
+
+def run(opcode, fileobj, objects={}):
+    # returns the server and the number of seconds taken for the request
+    a, b = socket.socketpair()
+    server = obexserver.LoopbackServer(b, keepdata=False)
+    server.objects.update(objects)
+    server.start()
+    try:
+        client = _lightblueobex.OBEXClient(a.fileno())
+        client.request(_lightblueobex.CONNECT, {}, None)
+        start = time.time()
+        code, headers = client.request(opcode, {0x01: u"f"}, None, fileobj)
+        elapsed = time.time() - start
+        client.request(_lightblueobex.DISCONNECT, {}, None)
+    finally:
+        a.close()
+    server.join()
+    if code != obexserver.OK:
+        raise Exception("request failed with code 0x%02x" % code)
+    return (server, elapsed)
+
+
+def report(name, size, elapsed, calls):
+    print "%-30s %8.1f MB/s %9d Python calls  maxrss %d MB" % (name,
+            size / elapsed / 1e6, calls,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def main():
+    megabytes = 1024
+    if len(sys.argv) > 1:
+        megabytes = int(sys.argv[1])
+    size = megabytes << 20
+
+    source = tempfile.TemporaryFile()
+    block = "".join([chr(i % 256) for i in xrange(1 << 20)])
+    for i in xrange(megabytes):
+        source.write(block)
+    source.flush()
+
+    for wrap in (False, True):
+        source.seek(0)
+        fileobj = wrap and CountingReader(source) or source
+        server, elapsed = run(_lightblueobex.PUT, fileobj)
+        assert server.objects[u"f"] == size
+        report("put from %s" % (wrap and "file-like" or "file"), size,
+                elapsed, getattr(fileobj, "calls", 0))
+
+    mapping = mmap.mmap(source.fileno(), size, access=mmap.ACCESS_READ)
+    for wrap in (False, True):
+        dest = tempfile.TemporaryFile()
+        fileobj = wrap and CountingWriter(dest) or dest
+        server, elapsed = run(_lightblueobex.GET, fileobj, {u"f": mapping})
+        dest.flush()
+        assert dest.tell() == size
+        report("get into %s" % (wrap and "file-like" or "file"), size,
+                elapsed, getattr(fileobj, "calls", 0))
+        dest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Parses a synthetic folder listing, received in 4 KB pieces, with the
+# minidom-based parser from LightBlue 0.4 (which buffered the whole listing
+# first) and with the incremental FolderListingParser that FTPClient.listdir()
+# uses. Each case runs in a child process so that its peak memory use can be
+# reported.
+#
+# Usage: python tests/bench_folderlisting.py [number of entries]
+
+import StringIO
+import os
+import resource
+import sys
+import time
+import xml.dom.minidom
+
+import support
+import _obexftp
+
+
+def makelisting(count):
+    entries = []
+    for i in xrange(count):
+        if i % 10 == 0:
+            entries.append('<folder name="folder%d" '
+                    'modified="20090301T120000Z"/>' % i)
+        else:
+            entries.append('<file name="IMG_%05d.jpg" size="%d" '
+                    'modified="20090301T120000Z" type="image/jpeg"/>'
+                    % (i, 100000 + i))
+    return '<?xml version="1.0"?>\n<!DOCTYPE folder-listing SYSTEM ' \
+            '"obex-folder-listing.dtd">\n<folder-listing version="1.0">' \
+            '<parent-folder/>%s</folder-listing>' % "\n".join(entries)
+
+
+def minidomlistdir(pieces):
+    # the 0.4 listdir() and parse_folder_listing()
+    data = StringIO.StringIO()
+    for piece in pieces:
+        data.write(piece)
+    dom = xml.dom.minidom.parseString(data.getvalue())
+    entries = []
+    for element in dom.documentElement.childNodes:
+        if element.nodeType != element.ELEMENT_NODE or \
+                element.tagName not in ("file", "folder"):
+            continue
+        try:
+            size = int(element.getAttribute("size"))
+        except ValueError:
+            size = None
+        entries.append((element.getAttribute("name"),
+                element.tagName == "folder", size))
+    return entries
+
+
+def streamlistdir(pieces):
+    parser = _obexftp.FolderListingParser()
+    for piece in pieces:
+        parser.write(piece)
+    return parser.close()
+
+
+def run(name, func, count):
+    pid = os.fork()
+    if pid == 0:
+        listing = makelisting(count)
+        pieces = [listing[i:i+4096] for i in xrange(0, len(listing), 4096)]
+        del listing
+        start = time.time()
+        entries = func(pieces)
+        elapsed = time.time() - start
+        assert len(entries) == count
+        print "%-22s %6.2f s  maxrss %d MB" % (name, elapsed,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def main():
+    count = int(sys.argv[1:] and sys.argv[1] or 50000)
+    print "%d entries" % count
+    run("minidom", minidomlistdir, count)
+    run("FolderListingParser", streamlistdir, count)
+
+
+if __name__ == "__main__":
+    main()
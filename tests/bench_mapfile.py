@@ -0,0 +1,90 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the cost of taking Put data from a regular file, as the OBEX
+# engines do: reading packet-sized pieces with read(), and reading them from
+# the memory-mapped chunks given by _obexcommon._bodysource() through
+# _ChunkReader, as the Python engine does, and encoding each piece as a Body
+# header. The file is read once first so that it is in the page cache. Each
+# case runs in a child process so that its peak memory use can be reported;
+# this includes the mapped pages that have been touched.
+#
+# Usage: python tests/bench_mapfile.py [size in MB]
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import support
+import _obexcodec
+import _obexcommon
+
+# space for body data in a maximum-size OBEX packet
+PIECE_SIZE = 0xffff - 6
+
+
+def readpackets(fileobj):
+    while True:
+        data = fileobj.read(PIECE_SIZE)
+        if not data:
+            break
+        _obexcodec.packheader(_obexcodec.BODY, data)
+
+
+def mappackets(fileobj):
+    chunks, length = _obexcommon._bodysource(fileobj)
+    reader = _obexcommon._ChunkReader(chunks)
+    while True:
+        data = reader.read(PIECE_SIZE)
+        if not data:
+            break
+        _obexcodec.packheader(_obexcodec.BODY, data)
+
+
+def run(name, func, path, size):
+    pid = os.fork()
+    if pid == 0:
+        fileobj = open(path, "rb")
+        start = time.time()
+        func(fileobj)
+        elapsed = time.time() - start
+        assert fileobj.tell() == size
+        print "%-32s %8.1f MB/s  maxrss %d MB" % (name, size / elapsed / 1e6,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def main():
+    size = int(sys.argv[1:] and sys.argv[1] or 256) << 20
+    fd, path = tempfile.mkstemp()
+    try:
+        for i in xrange(size >> 20):
+            os.write(fd, os.urandom(1 << 20))
+        os.close(fd)
+        readpackets(open(path, "rb"))
+        run("read() into packets", readpackets, path, size)
+        run("mmap + _ChunkReader into packets", mappackets, path, size)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
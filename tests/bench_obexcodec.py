@@ -0,0 +1,47 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures OBEX packet encoding and decoding throughput, in packets per second
+# and MB/s of body data, for a few packet sizes.
+#
+# Usage: python tests/bench_obexcodec.py
+
+import support
+import _obexcodec
+
+
+def main():
+    headers = {"name": u"photo.jpg", "type": "image/jpeg", "length": 1 << 20}
+    for size in (0, 1024, 32 * 1024, 64 * 1024 - 100):
+        body = "x" * size
+        def encode():
+            _obexcodec.packpacket(_obexcodec.PUT,
+                    _obexcodec.packheaders(headers) +
+                    _obexcodec.packheader(_obexcodec.BODY, body))
+        packet = _obexcodec.packpacket(_obexcodec.PUT,
+                _obexcodec.packheaders(headers) +
+                _obexcodec.packheader(_obexcodec.BODY, body))
+        def decode():
+            _obexcodec.unpackrequest(packet)
+        for name, func in (("encode", encode), ("decode", decode)):
+            count, elapsed = support.timeit(func)
+            print "%s %5d-byte body: %9.0f packets/s %9.1f MB/s" % (name,
+                    size, count / elapsed, count * size / elapsed / 1e6)
+
+
+if __name__ == "__main__":
+    main()
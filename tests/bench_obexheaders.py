@@ -0,0 +1,63 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures the per-request cost of preparing request headers: converting a
+# headers dictionary (as the Linux client does for the C extension, when
+# _obex can be imported), encoding it to bytes, and reusing an OBEXHeaders
+# with the connection id added.
+#
+# Usage: python tests/bench_obexheaders.py
+
+import datetime
+
+import support
+import _obexcodec
+
+try:
+    import _obex
+except ImportError:
+    _obex = None
+
+
+def main():
+    headers = {"name": u"photo.jpg", "type": "image/jpeg", "length": 1 << 20,
+            "time": datetime.datetime(2009, 3, 4, 5, 6, 7)}
+    prepared = _obexcodec.OBEXHeaders(headers)
+    connectionid = 1
+    cases = []
+    if _obex is not None:
+        cases.append(("dict -> C extension dict",
+                lambda: _obex._convertheaders(headers, connectionid)))
+    else:
+        print "(_obex cannot be imported, skipping the C extension dict case)"
+    cases.append(("dict -> encoded bytes",
+            lambda: _obexcodec.packheaders(headers.items() +
+                    [(_obexcodec.CONNECTION_ID, connectionid)])))
+    if _obex is not None:
+        cases.append(("OBEXHeaders",
+                lambda: _obex._convertheaders(prepared, connectionid)))
+    else:
+        cases.append(("OBEXHeaders",
+                lambda: _obexcodec.packheader(_obexcodec.CONNECTION_ID,
+                        connectionid) + prepared.data))
+    for name, func in cases:
+        count, elapsed = support.timeit(func)
+        print "%-26s %6.2f us/request" % (name, elapsed / count * 1e6)
+
+
+if __name__ == "__main__":
+    main()
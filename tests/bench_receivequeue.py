@@ -0,0 +1,90 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Feeds synthetic channel data (MTU-sized pieces, as IOBluetooth delivers
+# them) into the Mac socket receive queue and reads it back in small recv()
+# sizes, compared with the list-and-join queue in LightBlue 0.4.
+#
+# Usage: python tests/bench_receivequeue.py
+
+import threading
+import time
+
+import support
+import _socketio
+
+
+class OldStringQueue(object):
+    # the queue from LightBlue 0.4, including its locking
+    def __init__(self):
+        self.l_buffer = []
+        self.s_buffer = ""
+        self.lock = threading.RLock()
+    def write(self, data):
+        self.lock.acquire()
+        try:
+            self.l_buffer.append(data)
+        finally:
+            self.lock.release()
+    def _build_str(self):
+        new_string = "".join([str(x.tobytes()) for x in self.l_buffer])
+        self.s_buffer = "".join((self.s_buffer, new_string))
+        self.l_buffer = []
+    def __len__(self):
+        return sum([len(i) for i in self.l_buffer]) + len(self.s_buffer)
+    def read(self, count):
+        self.lock.acquire()
+        try:
+            if count > len(self.s_buffer):
+                self._build_str()
+            result = self.s_buffer[:count]
+            self.s_buffer = self.s_buffer[len(result):]
+        finally:
+            self.lock.release()
+        return result
+
+
+def run(queue, pending, mtu, recvsize, total):
+    # keeps <pending> bytes queued, as on a busy channel, and reads <total>
+    # bytes in <recvsize> pieces, checking len() before each read as recv()
+    # does
+    piece = memoryview("x" * mtu)
+    for i in xrange(pending // mtu):
+        queue.write(piece)
+    start = time.time()
+    received = 0
+    while received < total:
+        if len(queue) < pending:
+            queue.write(piece)
+        received += len(queue.read(recvsize))
+    return time.time() - start
+
+
+def main():
+    mtu = 1013  # a typical RFCOMM MTU
+    total = 4 << 20
+    for pending in (8 * 1024, 64 * 1024, 256 * 1024):
+        for recvsize in (64, 1024):
+            old = run(OldStringQueue(), pending, mtu, recvsize, total)
+            new = run(_socketio.ReceiveQueue(), pending, mtu, recvsize, total)
+            print "%3d KB queued, %4d-byte recv: 0.4 queue %7.1f MB/s, " \
+                    "ReceiveQueue %7.1f MB/s" % (pending // 1024, recvsize,
+                    total / old / 1e6, total / new / 1e6)
+
+
+if __name__ == "__main__":
+    main()
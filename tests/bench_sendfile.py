@@ -0,0 +1,97 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Sends a file through a fake Mac channel object, which accepts MTU-sized
+# writes as IOBluetooth channels do, with the Mac socket sendfile() loop and
+# with sendall(fileobj.read()) as was needed in LightBlue 0.4. Each case runs
+# in a child process so that its peak memory use can be reported.
+#
+# Usage: python tests/bench_sendfile.py [size in MB]
+
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import support
+import _socketio
+
+
+class FakeChannel(object):
+    # counts the bytes written, like the write() of a connected channel
+    def __init__(self, mtu):
+        self.mtu = mtu
+        self.written = 0
+
+    def getwritemtu(self):
+        return self.mtu
+
+    def write(self, data):
+        assert len(data) <= self.mtu
+        self.written += len(data)
+        return 0
+
+
+def sendall(channel, data):
+    # the piece loop of the Mac socket send()
+    mtu = channel.getwritemtu()
+    offset = 0
+    while offset < len(data):
+        channel.write(buffer(data, offset, mtu))
+        offset += mtu
+
+
+def readall(channel, fileobj):
+    sendall(channel, fileobj.read())
+
+
+def sendfile(channel, fileobj):
+    _socketio.sendfile(lambda data: sendall(channel, data), fileobj,
+            channel.getwritemtu())
+
+
+def run(name, func, path, size):
+    pid = os.fork()
+    if pid == 0:
+        channel = FakeChannel(1013)     # a typical RFCOMM MTU
+        fileobj = open(path, "rb")
+        start = time.time()
+        func(channel, fileobj)
+        elapsed = time.time() - start
+        assert channel.written == size
+        print "%-20s %8.1f MB/s  maxrss %d MB" % (name, size / elapsed / 1e6,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def main():
+    size = int(sys.argv[1:] and sys.argv[1] or 64) << 20
+    fd, path = tempfile.mkstemp()
+    try:
+        os.write(fd, os.urandom(size))
+        os.close(fd)
+        run("sendall(read())", readall, path, size)
+        run("sendfile()", sendfile, path, size)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares the time taken to search for services on several devices one at a
+# time and in parallel, with a fake SDP responder that takes a random time of
+# up to 2 seconds for each device (typical for SDP over a real link).
+#
+# Usage: python tests/bench_servicesearch.py [number-of-devices]
+
+import random
+import sys
+import time
+
+import support
+import _servicesearch
+from test_servicesearch import FakeResponder
+
+
+def main():
+    count = 8
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    random.seed(1)
+    delays = dict([("%02d" % i, random.uniform(0.5, 2)) for i in range(count)])
+    responder = FakeResponder(delays)
+
+    start = time.time()
+    for address in sorted(delays):
+        responder.query(address)
+    print "%d devices, one at a time: %6.2f s" % (count, time.time() - start)
+
+    for maxqueries in (2, 4, 8):
+        start = time.time()
+        for result in _servicesearch.searchservices(delays.keys(),
+                _servicesearch.ThreadedBackend(responder.query),
+                maxqueries=maxqueries):
+            pass
+        print "%d devices, %d at once:    %6.2f s" % (count, maxqueries,
+                time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
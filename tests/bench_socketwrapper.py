@@ -0,0 +1,104 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Measures small-message send()/recv() calls per second through the Linux
+# socket wrapper, compared with the exec-generated wrapper in LightBlue 0.4,
+# using PyBluez sockets around an AF_UNIX socket pair in place of RFCOMM
+# sockets. Also measures the wrappers' own overhead per call, with a socket
+# that does nothing. (Linux only; needs PyBluez.)
+#
+# Usage: python tests/bench_socketwrapper.py
+
+import socket
+
+import support
+import bluetooth
+import _lightblue
+_bluetooth = _lightblue._bluetooth
+
+
+class OldSocketWrapper(object):
+    # the send() and recv() methods as generated in LightBlue 0.4
+    def __init__(self, sock):
+        self.__dict__["_sock"] = sock
+
+    _methoddef = """def %s(self, *args, **kwargs):
+        try:
+            return self._sock._sock.%s(*args, **kwargs)
+        except _bluetooth.timeout, te:
+            raise socket.timeout(str(te))
+        except _bluetooth.error, e:
+            raise socket.error(str(e))\n"""
+    for _m in ("send", "recv"):
+        exec _methoddef % (_m, _m)
+    del _m, _methoddef
+
+
+def pingpong(wrapper, size):
+    a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    wa = wrapper(bluetooth.BluetoothSocket(_sock=a))
+    wb = wrapper(bluetooth.BluetoothSocket(_sock=b))
+    msg = "x" * size
+    def call():
+        wa.send(msg)
+        wb.recv(size)
+    try:
+        return support.timeit(call, 1)
+    finally:
+        a.close()
+        b.close()
+
+
+class NullSocket(object):
+    def send(self, data, flags=0):
+        return len(data)
+    def recv(self, bufsize, flags=0):
+        return ""
+
+
+def overhead(wrapper):
+    null = NullSocket()
+    w = wrapper(bluetooth.BluetoothSocket(_sock=null))
+    def call():
+        w.send("x")
+        w.recv(1)
+    def direct():
+        null.send("x")
+        null.recv(1)
+    # the best of several runs, to reduce noise
+    calltime = min([elapsed / count for count, elapsed in
+            [support.timeit(call) for i in range(3)]])
+    directtime = min([elapsed / count for count, elapsed in
+            [support.timeit(direct) for i in range(3)]])
+    return (calltime - directtime) / 2
+
+
+def main():
+    for name, wrapper in (("0.4 wrapper", OldSocketWrapper),
+            ("_SocketWrapper", _lightblue._SocketWrapper)):
+        print "%-15s overhead per call: %5.0f ns" % (name,
+                overhead(wrapper) * 1e9)
+    for size in (1, 32, 512):
+        for name, wrapper in (("0.4 wrapper", OldSocketWrapper),
+                ("_SocketWrapper", _lightblue._SocketWrapper)):
+            count, elapsed = pingpong(wrapper, size)
+            print "%-15s %4d-byte messages: %8.0f send+recv pairs/s" % (
+                    name, size, count / elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Compares Put and Get throughput with and without Single Response Mode, using
+# the loopback server with a delay before each response to simulate the round
+# trip time of a radio link. (Linux only.)
+#
+# Usage: python tests/bench_srm.py [size-in-KB]
+
+import socket
+import sys
+import time
+
+import support
+import obexserver
+import _obex
+
+
+def transfer(data, srm, latency, mtu):
+    a, b = socket.socketpair()
+    server = obexserver.LoopbackServer(b, latency=latency, srm=srm, mtu=mtu)
+    server.start()
+    try:
+        client = _obex._SRMClient(a)
+        client.request(0x00, {}, None)
+        start = time.time()
+        client.request(0x02, {0x01: u"f"}, None,
+                _obex._obexcommon._ChunkReader(iter([data])))
+        puttime = time.time() - start
+        start = time.time()
+        client.request(0x03, {0x01: u"f"}, None, _obex._PieceList())
+        gettime = time.time() - start
+        client.request(0x01, {}, None)
+    finally:
+        a.close()
+    server.join()
+    return (puttime, gettime)
+
+
+def main():
+    size = 1024
+    if len(sys.argv) > 1:
+        size = int(sys.argv[1])
+    data = "x" * (size * 1024)
+    mtu = 4096  # a typical negotiated packet size for RFCOMM
+    for latency in (0, 0.005, 0.02):
+        for srm in (False, True):
+            puttime, gettime = transfer(data, srm, latency, mtu)
+            print "latency %4.1f ms, srm=%-5s: put %8.2f MB/s  get %8.2f MB/s" % (
+                    latency * 1000, srm, len(data) / puttime / 1e6,
+                    len(data) / gettime / 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# A run loop for _eventwait.Waiter that runs callbacks posted from other
+# threads, standing in for NSRunLoop and IOBluetooth delegate callbacks.
+
+import collections
+import threading
+import time
+
+
+class FakeRunLoop(object):
+
+    def __init__(self, hassources=True):
+        self.hassources = hassources
+        self.runcount = 0
+        self.__cond = threading.Condition()
+        self.__events = collections.deque()
+        self.__woken = False
+
+    def post(self, callback):
+        # queues a callback to run in the waiting thread
+        self.__cond.acquire()
+        try:
+            self.__events.append(callback)
+            self.__cond.notify()
+        finally:
+            self.__cond.release()
+
+    def runonce(self, timeout):
+        self.runcount += 1
+        if not self.hassources:
+            return False
+        self.__cond.acquire()
+        try:
+            endtime = time.time() + timeout
+            while not self.__events and not self.__woken:
+                remaining = endtime - time.time()
+                if remaining <= 0:
+                    break
+                self.__cond.wait(remaining)
+            self.__woken = False
+            events = list(self.__events)
+            self.__events.clear()
+        finally:
+            self.__cond.release()
+        for callback in events:
+            callback()
+        return True
+
+    def wakeup(self):
+        self.__cond.acquire()
+        try:
+            self.__woken = True
+            self.__cond.notify()
+        finally:
+            self.__cond.release()
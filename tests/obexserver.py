@@ -0,0 +1,152 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# A minimal OBEX server that runs in a thread on one end of a socket pair, for
+# testing clients without a Bluetooth device.
+#
+# It stores the objects it receives in Put requests, returns them for Get
+# requests, and supports Single Response Mode. A latency can be given to delay
+# each response, as on a slow radio link.
+
+import threading
+import time
+
+import support
+import _obexcodec
+from _obexcommon import OBEXError
+
+SRM = 0x97
+SRM_ENABLE = 0x01
+
+CONTINUE = 0x10
+OK = 0x20
+NOT_FOUND = 0x44
+
+
+class LoopbackServer(threading.Thread):
+
+    def __init__(self, sock, latency=0, srm=True,
+            mtu=_obexcodec.MAX_PACKET_LENGTH, keepdata=True):
+        """
+        Serves OBEX requests on the given connected socket until the client
+        disconnects or closes the socket.
+
+        Arguments:
+            - latency=0: the number of seconds to wait before each response
+            - srm=True: whether Single Response Mode is accepted
+            - mtu: the maximum packet length to send
+            - keepdata=True: if False, only the number of bytes received in
+              each Put request is stored, for sending large amounts of data
+        """
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.sock = sock
+        self.latency = latency
+        self.srm = srm
+        self.mtu = mtu
+        self.keepdata = keepdata
+        self.objects = {}       # name -> data (any buffer object)
+        self.requests = []      # (opcode, headers) for each request
+        self.responsecount = 0  # number of response packets sent
+        self.error = None
+
+    def run(self):
+        try:
+            try:
+                while self.__handlerequest():
+                    pass
+            except (OBEXError, EnvironmentError), e:
+                self.error = e
+        finally:
+            self.sock.close()
+
+    def __respond(self, code, headers={}, nonheaderdata="", delay=True):
+        if delay and self.latency:
+            time.sleep(self.latency)
+        self.responsecount += 1
+        self.sock.sendall(_obexcodec.packpacket(code | _obexcodec.FINAL,
+                _obexcodec.packheaders(headers), nonheaderdata))
+
+    def __recvrequest(self):
+        packet = _obexcodec.recvpacket(self.sock)
+        opcode, final, nonheaderdata, headers = \
+                _obexcodec.unpackrequest(packet)
+        return (opcode, final, headers)
+
+    def __handlerequest(self):
+        try:
+            opcode, final, headers = self.__recvrequest()
+        except OBEXError:
+            return False    # client closed the connection
+        self.requests.append((opcode, headers))
+        if opcode == _obexcodec.CONNECT:
+            self.__respond(OK, {_obexcodec.CONNECTION_ID: 1},
+                    _obexcodec.packconnectdata(self.mtu))
+        elif opcode == _obexcodec.DISCONNECT:
+            self.__respond(OK)
+            return False
+        elif opcode == _obexcodec.PUT:
+            self.__handleput(final, headers)
+        elif opcode == _obexcodec.GET:
+            self.__handleget(headers)
+        else:
+            self.__respond(OK)
+        return True
+
+    def __handleput(self, final, headers):
+        name = headers.get(0x01)
+        body = []
+        received = 0
+        srm = self.srm and headers.get(SRM) == SRM_ENABLE
+        sentsrm = False
+        while True:
+            for hid in (_obexcodec.BODY, _obexcodec.END_OF_BODY):
+                if hid in headers:
+                    received += len(headers[hid])
+                    if self.keepdata:
+                        body.append(headers[hid][:])
+            if final:
+                break
+            if not sentsrm:
+                # with SRM, only the first packet gets a Continue response
+                self.__respond(CONTINUE, srm and {SRM: SRM_ENABLE} or {})
+                sentsrm = srm
+            opcode, final, headers = self.__recvrequest()
+        if self.keepdata:
+            self.objects[name] = "".join(body)
+        else:
+            self.objects[name] = received
+        self.__respond(OK)
+
+    def __handleget(self, headers):
+        data = self.objects.get(headers.get(0x01))
+        if data is None:
+            self.__respond(NOT_FOUND)
+            return
+        srm = self.srm and headers.get(SRM) == SRM_ENABLE
+        space = self.mtu - 6 - (srm and 2 or 0)
+        offset = 0
+        while len(data) - offset > space:
+            self.__respond(CONTINUE, (srm and offset == 0) and
+                    {SRM: SRM_ENABLE, _obexcodec.BODY: buffer(data, 0, space)} or
+                    {_obexcodec.BODY: buffer(data, offset, space)},
+                    delay=(not srm or offset == 0))
+            offset += space
+            if not srm:
+                self.__recvrequest()    # the next Get packet
+        self.__respond(OK, {_obexcodec.END_OF_BODY: buffer(data, offset)},
+                delay=(not srm or offset == 0))
@@ -0,0 +1,76 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Helpers for the tests and benchmarks in this directory.
+#
+# The tests import the platform-independent modules (e.g. _obexcodec) directly
+# from the source tree, so they run without Bluetooth hardware or an installed
+# lightblue package. The Mac modules that don't need PyObjC (e.g. _eventwait)
+# can also be tested on other platforms. Run the tests from the top-level
+# directory with:
+#
+#   python -m unittest discover -s tests
+#
+# Tests for modules that need a platform's Bluetooth libraries are skipped
+# when those libraries aren't installed.
+
+import os
+import sys
+import unittest
+
+TOPDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if sys.platform.startswith("darwin"):
+    SRCDIR = os.path.join(TOPDIR, "src", "mac")
+else:
+    SRCDIR = os.path.join(TOPDIR, "src", "linux")
+
+MACSRCDIR = os.path.join(TOPDIR, "src", "mac")
+
+if SRCDIR not in sys.path:
+    sys.path.insert(0, SRCDIR)
+# after SRCDIR, so that only modules that are only on Mac come from here
+if MACSRCDIR not in sys.path:
+    sys.path.append(MACSRCDIR)
+
+
+def importorskip(name):
+    """
+    Returns the named module from the source tree, or raises
+    unittest.SkipTest if it (or a library it needs) cannot be imported.
+    """
+    try:
+        return __import__(name)
+    except ImportError, e:
+        raise unittest.SkipTest("cannot import %s: %s" % (name, e))
+
+
+def timeit(func, minduration=0.5, batch=100):
+    """
+    Calls func() repeatedly, in batches of <batch> calls, for at least
+    <minduration> seconds, and returns the (number of calls, seconds taken).
+    """
+    import time
+    count = 0
+    start = time.time()
+    while True:
+        for i in xrange(batch):
+            func()
+        count += batch
+        elapsed = time.time() - start
+        if elapsed >= minduration:
+            return (count, elapsed)
@@ -0,0 +1,168 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the aio Stream and Server classes with Unix domain sockets in place of
+# Bluetooth sockets.
+
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import support
+import _lightbluecommon
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aio = support.importorskip("aio")
+        self.map = {}
+        sock1, sock2 = socket.socketpair()
+        self.a = self.aio.Stream(sock1, self.map)
+        self.b = self.aio.Stream(sock2, self.map)
+        self.received = []
+        self.closed = []
+        self.b.ondata = lambda stream, data: self.received.append(data)
+        self.b.onclose = lambda stream, error: self.closed.append(error)
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def loopuntil(self, conditionfunc, passes=1000):
+        for i in range(passes):
+            if conditionfunc():
+                return
+            self.aio.loop(0.1, self.map, 1)
+        self.fail("condition not met")
+
+    def test_write(self):
+        data = os.urandom(1 << 20)
+        self.a.write(data[:1000])
+        self.a.write(buffer(data, 1000))
+        self.assertEqual(self.a.getbufferedsize(), len(data))
+        self.loopuntil(lambda: sum(map(len, self.received)) == len(data))
+        self.assertEqual("".join(self.received), data)
+        self.assertEqual(self.a.getbufferedsize(), 0)
+
+    def test_echo(self):
+        self.b.ondata = lambda stream, data: stream.write(data)
+        replies = []
+        self.a.ondata = lambda stream, data: replies.append(data)
+        self.a.write("hello")
+        self.loopuntil(lambda: "".join(replies) == "hello")
+
+    def test_closewhendone(self):
+        self.a.write("x" * 100000)
+        self.a.closewhendone()
+        self.loopuntil(lambda: self.closed)
+        self.assertEqual(self.closed, [None])
+        self.assertEqual(len("".join(self.received)), 100000)
+        self.assertRaises(_lightbluecommon.BluetoothError, self.a.write, "x")
+
+    def test_close(self):
+        aclosed = []
+        self.a.onclose = lambda stream, error: aclosed.append(error)
+        self.a.close()
+        self.a.close()
+        self.assertEqual(aclosed, [None])
+        self.loopuntil(lambda: self.closed)
+        self.assertEqual(self.closed, [None])
+
+    def test_pausereading(self):
+        self.b.pausereading()
+        self.a.write("hello")
+        for i in range(5):
+            self.aio.loop(0.01, self.map, 1)
+        self.assertEqual(self.received, [])
+        self.b.resumereading()
+        self.loopuntil(lambda: self.received)
+        self.assertEqual(self.received, ["hello"])
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aio = support.importorskip("aio")
+        self.map = {}
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, "sock")
+
+    def tearDown(self):
+        for channel in self.map.values():
+            channel.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_accept(self):
+        streams = []
+        def connected(stream, address):
+            stream.ondata = lambda stream, data: stream.write(data.upper())
+            streams.append(stream)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.listen(5)
+        server = self.aio.Server(sock, connected, self.map)
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(self.path)
+        replies = []
+        stream = self.aio.Stream(client, self.map)
+        stream.ondata = lambda stream, data: replies.append(data)
+        stream.write("hello")
+        for i in range(1000):
+            if "".join(replies) == "HELLO":
+                break
+            self.aio.loop(0.1, self.map, 1)
+        self.assertEqual("".join(replies), "HELLO")
+        self.assertEqual(len(streams), 1)
+        self.assert_(streams[0] in self.map.values())
+        server.close()
+
+    def test_many_clients(self):
+        # one loop services all the connections
+        def connected(stream, address):
+            stream.ondata = lambda stream, data: stream.write(data)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.listen(50)
+        self.aio.Server(sock, connected, self.map)
+        replies = {}
+        expected = {}
+        for i in range(50):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(self.path)
+            stream = self.aio.Stream(client, self.map)
+            replies[stream] = []
+            expected[stream] = "client %d" % i
+            stream.ondata = lambda stream, data: replies[stream].append(data)
+            stream.write(expected[stream])
+        def done():
+            for stream in expected:
+                if "".join(replies[stream]) != expected[stream]:
+                    return False
+            return True
+        for i in range(1000):
+            if done():
+                break
+            self.aio.loop(0.1, self.map, 1)
+        self.assert_(done())
+
+
+if __name__ == "__main__":
+    unittest.main()
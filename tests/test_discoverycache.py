@@ -0,0 +1,112 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import support
+import _discoverycache
+
+
+class DiscoveryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_ttl(self):
+        cache = _discoverycache.DiscoveryCache(ttls={"a": 0.05, "b": 0})
+        cache.set("a", 1, "x")
+        cache.set("b", 1, "y")
+        self.assertEqual(cache.get("a", 1), "x")
+        self.assertEqual(cache.get("b", 1), None)
+        time.sleep(0.1)
+        self.assertEqual(cache.get("a", 1, "gone"), "gone")
+
+    def test_lru(self):
+        cache = _discoverycache.DiscoveryCache(maxentries=2)
+        cache.set("name", 1, "a")
+        cache.set("name", 2, "b")
+        cache.get("name", 1)
+        cache.set("name", 3, "c")
+        self.assertEqual(cache.get("name", 2), None)
+        self.assertEqual(cache.get("name", 1), "a")
+
+    def test_save_load(self):
+        ttls = {"services": 600}
+        cache = _discoverycache.DiscoveryCache(path=self.path, ttls=ttls)
+        services = [("00:11:22:33:44:55", 5, u"OBEX Object Push")]
+        cache.set("services", ("00:11:22:33:44:55", None), services)
+        cache.set("name", "00:11:22:33:44:55", u"Phone \u2603")
+        cache.flush()
+        loaded = _discoverycache.DiscoveryCache(path=self.path, ttls=ttls)
+        self.assertEqual(loaded.get("services", ("00:11:22:33:44:55", None)),
+                services)
+        self.assertEqual(loaded.get("name", "00:11:22:33:44:55"),
+                u"Phone \u2603")
+
+    def test_saves_batch_later(self):
+        cache = _discoverycache.DiscoveryCache(path=self.path)
+        for i in range(100):
+            cache.set("name", "%d" % i, "x")
+        self.assert_(not os.path.exists(self.path))
+        time.sleep(_discoverycache.SAVE_DELAY + 0.5)
+        self.assertEqual(len(open(self.path).readlines()), 100)
+
+    def test_saves_only_on_flush_without_delay(self):
+        # as on S60, where no timer thread is started
+        savedelay = _discoverycache.SAVE_DELAY
+        _discoverycache.SAVE_DELAY = None
+        try:
+            cache = _discoverycache.DiscoveryCache(path=self.path)
+            cache.set("name", "a", "b")
+            time.sleep(savedelay + 0.5)
+            self.assert_(not os.path.exists(self.path))
+            cache.flush()
+            self.assertEqual(len(open(self.path).readlines()), 1)
+        finally:
+            _discoverycache.SAVE_DELAY = savedelay
+
+    def test_flush_without_changes(self):
+        cache = _discoverycache.DiscoveryCache(path=self.path)
+        cache.flush()
+        self.assert_(not os.path.exists(self.path))
+        cache.set("name", "a", "b")
+        cache.flush()
+        os.remove(self.path)
+        cache.flush()
+        self.assert_(not os.path.exists(self.path))
+
+    def test_load_ignores_code(self):
+        f = open(self.path, "w")
+        f.write("__import__('os').remove(%r)\n" % self.path)
+        f.write("('name', 'a', None, 'b')\n")
+        f.write("garbage\n")
+        f.close()
+        cache = _discoverycache.DiscoveryCache(path=self.path)
+        self.assert_(os.path.exists(self.path))
+        self.assertEqual(cache.get("name", "a"), "b")
+
+
+if __name__ == "__main__":
+    unittest.main()
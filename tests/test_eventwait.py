@@ -0,0 +1,84 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the Mac run loop waiting in _eventwait against a fake run loop.
+
+import threading
+import time
+import unittest
+
+import support
+import _eventwait
+from fakerunloop import FakeRunLoop
+
+
+class WaiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runloop = FakeRunLoop()
+        self.waiter = _eventwait.Waiter(self.runloop)
+        self.done = False
+
+    def setdone(self):
+        self.done = True
+
+    def test_condition_already_true(self):
+        self.assert_(self.waiter.waituntil(lambda: True, 1))
+        self.assertEqual(self.runloop.runcount, 0)
+
+    def test_callback(self):
+        timer = threading.Timer(0.05, self.runloop.post, [self.setdone])
+        timer.start()
+        start = time.time()
+        self.assert_(self.waiter.waituntil(lambda: self.done, 5))
+        self.assert_(time.time() - start < 1)
+        timer.join()
+
+    def test_timeout(self):
+        start = time.time()
+        self.assert_(not self.waiter.waituntil(lambda: self.done, 0.1))
+        self.assert_(0.09 < time.time() - start < 1)
+
+    def test_no_sources(self):
+        self.runloop.hassources = False
+        start = time.time()
+        self.assert_(not self.waiter.waituntil(lambda: self.done, 0.1))
+        self.assert_(0.09 < time.time() - start < 1)
+        # sleeps between checks instead of spinning
+        self.assert_(self.runloop.runcount <= 0.1 / _eventwait.IDLE_SLEEP_TIME
+                + 2)
+
+    def test_notify(self):
+        # a change made on another thread without a run loop event
+        def change():
+            self.done = True
+            self.waiter.notify()
+        timer = threading.Timer(0.05, change)
+        timer.start()
+        start = time.time()
+        self.assert_(self.waiter.waituntil(lambda: self.done, 5))
+        self.assert_(time.time() - start < 1)
+        timer.join()
+
+    def test_runpending(self):
+        self.runloop.post(self.setdone)
+        self.waiter.runpending()
+        self.assert_(self.done)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Checks that socket fileno() descriptors can be used with select() in the
+# same way on each backend, using socket pairs in place of Bluetooth
+# connections.
+
+import select
+import socket
+import unittest
+
+import support
+import _socketio
+
+
+class FileNoConformance(object):
+    # Subclasses set self.sock to a LightBlue-style socket, and implement
+    # deliver(data) and hangup() to send data and a close from the remote
+    # device.
+
+    def readable(self):
+        return select.select([self.sock], [], [], 0)[0] == [self.sock]
+
+    def writable(self):
+        return select.select([], [self.sock], [], 0)[1] == [self.sock]
+
+    def test_fileno(self):
+        self.assert_(isinstance(self.sock.fileno(), int))
+        self.assertEqual(self.sock.fileno(), self.sock.fileno())
+
+    def test_idle(self):
+        self.assert_(not self.readable())
+        self.assert_(self.writable())
+
+    def test_data(self):
+        self.deliver("hello")
+        self.assert_(self.readable())
+        self.assertEqual(self.sock.recv(2), "he")
+        self.assert_(self.readable())
+        self.assertEqual(self.sock.recv(10), "llo")
+        self.assert_(not self.readable())
+        self.assert_(self.writable())
+
+    def test_hangup(self):
+        self.hangup()
+        self.assert_(self.readable())
+        self.assertEqual(self.sock.recv(10), "")
+
+
+class _FakeBluetoothSocket(object):
+    # PyBluez BluetoothSocket stand-in, for _lightblue._SocketWrapper
+    def __init__(self, sock):
+        self._sock = sock
+
+    def close(self):
+        self._sock.close()
+
+
+class LinuxFileNoTest(FileNoConformance, unittest.TestCase):
+
+    def setUp(self):
+        _lightblue = support.importorskip("_lightblue")
+        if not hasattr(_lightblue, "_SocketWrapper"):
+            raise unittest.SkipTest("not the Linux backend")
+        rawsock, self.peer = socket.socketpair()
+        self.sock = _lightblue._SocketWrapper(_FakeBluetoothSocket(rawsock))
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def deliver(self, data):
+        self.peer.sendall(data)
+
+    def hangup(self):
+        self.peer.close()
+
+
+class _MacSocketStandIn(object):
+    # Has the receive queue and ready signal of a Mac _BluetoothSocket, with
+    # the same readiness rule, driven by fake channel callbacks.
+    def __init__(self):
+        self.queue = _socketio.ReceiveQueue()
+        self.signal = None
+        self.closed = False
+
+    def fileno(self):
+        if self.signal is None:
+            self.signal = _socketio.ReadySignal()
+            self.updateready()
+        return self.signal.fileno()
+
+    def updateready(self):
+        if self.signal is not None:
+            self.signal.update(not self.queue.empty() or self.closed)
+
+    def recv(self, bufsize):
+        data = self.queue.read(bufsize)
+        self.updateready()
+        return data
+
+    # channel delegate callbacks
+    def channeldata(self, data):
+        self.queue.write(data)
+        self.updateready()
+
+    def channelclosed(self):
+        self.closed = True
+        self.updateready()
+
+    def close(self):
+        if self.signal is not None:
+            self.signal.close()
+
+
+class MacFileNoTest(FileNoConformance, unittest.TestCase):
+
+    def setUp(self):
+        self.sock = _MacSocketStandIn()
+
+    def tearDown(self):
+        self.sock.close()
+
+    def deliver(self, data):
+        self.sock.channeldata(memoryview(data))
+
+    def hangup(self):
+        self.sock.channelclosed()
+
+    def test_data_before_fileno(self):
+        # data queued before the signal is created makes it readable at once
+        self.sock.channeldata("x")
+        self.assert_(self.readable())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+# Tests the Linux iterdevices() against a fake inquiry and name lookups, so
+# no Bluetooth adapter is needed (but PyBluez must be installed).
+
+import os
+import threading
+import time
+import unittest
+
+import support
+import _discoverycache
+
+
+class FakeDiscoverer(object):
+    """
+    Stands in for _MyDiscoverer, delivering the given (address, class, name)
+    devices one per event, and then completing the inquiry.
+    """
+
+    devices = []
+
+    def __init__(self, founddevicecallback, completedcallback):
+        self.founddevicecallback = founddevicecallback
+        self.completedcallback = completedcallback
+        self.events = list(self.devices)
+        self.readfd, self.writefd = os.pipe()
+        os.write(self.writefd, "x")     # always readable
+
+    def find_devices(self, lookup_names=True, duration=8):
+        pass
+
+    def fileno(self):
+        return self.readfd
+
+    def process_event(self):
+        if self.events:
+            self.founddevicecallback(*self.events.pop(0))
+        else:
+            self.completedcallback()
+            os.close(self.readfd)
+            os.close(self.writefd)
+
+    def cancel_inquiry(self):
+        pass
+
+
+A1, A2, A3, A4 = ["00:11:22:33:44:%02X" % i for i in range(1, 5)]
+
+
+class IterDevicesTest(unittest.TestCase):
+
+    def setUp(self):
+        self._lightblue = support.importorskip("_lightblue")
+        if not hasattr(self._lightblue, "_MyDiscoverer"):
+            raise unittest.SkipTest("not the Linux backend")
+        self.saved = (self._lightblue._MyDiscoverer,
+                self._lightblue.gethostaddr,
+                self._lightblue.bluetooth.lookup_name, _discoverycache.cache)
+        self._lightblue._MyDiscoverer = FakeDiscoverer
+        self._lightblue.gethostaddr = lambda: "00:00:00:00:00:00"
+        self._lightblue.bluetooth.lookup_name = self.lookup_name
+        _discoverycache.cache = _discoverycache.DiscoveryCache()
+        self.names = {}
+        self.lookups = []
+        self.hanging = threading.Event()
+        self.unhung = threading.Event()
+
+    def tearDown(self):
+        (self._lightblue._MyDiscoverer, self._lightblue.gethostaddr,
+                self._lightblue.bluetooth.lookup_name,
+                _discoverycache.cache) = self.saved
+
+    def lookup_name(self, address, timeout=10):
+        self.lookups.append(address)
+        name = self.names.get(address)
+        if isinstance(name, threading._Event):
+            self.hanging.set()
+            name.wait(5)
+            self.unhung.set()
+            return None
+        return name
+
+    def test_names(self):
+        FakeDiscoverer.devices = [(A1, 1, "a"), (A2, 2, None),
+                (A3, 3, None), (A4, 4, None), (A1, 1, "a")]
+        _discoverycache.cache.set("name", A2, "b")
+        self.names = {A3: "c"}
+        results = list(self._lightblue.iterdevices())
+        self.assertEqual(results, [(A1, "a", 1), (A2, "b", 2),
+                (A3, None, 3), (A4, None, 4), (A3, "c", 3)])
+        self.assertEqual(sorted(self.lookups), [A3, A4])
+        self.assertEqual(_discoverycache.cache.get("name", A1), "a")
+        self.assertEqual(_discoverycache.cache.get("name", A3), "c")
+
+    def test_without_names(self):
+        FakeDiscoverer.devices = [(A1, 1, None)]
+        results = list(self._lightblue.iterdevices(getnames=False))
+        self.assertEqual(results, [(A1, None, 1)])
+        self.assertEqual(self.lookups, [])
+
+    def test_close_during_lookups(self):
+        FakeDiscoverer.devices = [(A1, 1, None), (A2, 2, None)]
+        hung = threading.Event()
+        self.names = {A1: hung, A2: "b"}
+        devices = self._lightblue.iterdevices()
+        try:
+            self.assertEqual([devices.next() for i in range(3)],
+                    [(A1, None, 1), (A2, None, 2), (A2, "b", 2)])
+            # the lookup for A1 is still running
+            self.hanging.wait(5)
+            start = time.time()
+            devices.close()
+            self.assert_(time.time() - start < 1)
+        finally:
+            hung.set()
+            self.unhung.wait(5)
+
+
+if __name__ == "__main__":
+    unittest.main()
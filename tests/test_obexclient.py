@@ -0,0 +1,88 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the Linux OBEXClient's streaming Get requests against the loopback
+# server. The client's transport is replaced with one end of a socket pair,
+# and its requests are sent by the Python engine instead of OpenOBEX.
+
+import socket
+import unittest
+
+import support
+import obexserver
+
+ADDRESS = "00:0D:93:19:C8:68"
+
+
+class IterGetTest(unittest.TestCase):
+
+    def setUp(self):
+        self._obex = support.importorskip("_obex")
+        if not hasattr(self._obex, "_SRMClient"):
+            raise unittest.SkipTest("no Python OBEX engine on this platform")
+
+    def connect(self, srm):
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.server = obexserver.LoopbackServer(b, srm=srm, mtu=1000)
+        self.server.start()
+        client = self._obex.OBEXClient(ADDRESS, 10, srm=srm)
+        # as __setUp() would do, without a Bluetooth connection
+        client._OBEXClient__sock = a
+        client._OBEXClient__client = self._obex._SRMClient(a)
+        self.assertEqual(client.connect().code, obexserver.OK)
+        self.server.objects[u"a"] = self.data = \
+                "".join([chr(i % 251) for i in xrange(100000)])
+        return client
+
+    def test_streams_without_srm(self):
+        client = self.connect(srm=False)
+        sent = self.server.responsecount
+        pieces = client.iterget({"name": u"a"})
+        first = pieces.next()
+        # only the first Get response has been sent
+        self.assertEqual(self.server.responsecount - sent, 1)
+        self.assert_(0 < len(first) < 1000)
+        rest = "".join([str(piece) for piece in pieces])
+        self.assertEqual(str(first) + rest, self.data)
+        self.assert_(self.server.responsecount - sent > 100)
+
+    def test_srm(self):
+        client = self.connect(srm=True)
+        data = "".join([str(piece) for piece in
+                client.iterget({"name": u"a"}, chunksize=4096)])
+        self.assertEqual(data, self.data)
+
+    def test_get_into(self):
+        client = self.connect(srm=False)
+        buf = bytearray(len(self.data))
+        self.assertEqual(client.get_into({"name": u"a"}, buf), len(buf))
+        self.assertEqual(str(buf), self.data)
+
+    def test_not_found(self):
+        client = self.connect(srm=False)
+        pieces = client.iterget({"name": u"none"})
+        self.assertRaises(self._obex.OBEXError, list, pieces)
+
+    def test_checked_before_iteration(self):
+        client = self._obex.OBEXClient(ADDRESS, 10)
+        self.assertRaises(self._obex.OBEXError, client.iterget,
+                {"name": u"a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import socket
+import unittest
+
+import support
+import _obexcodec
+from _obexcommon import OBEXError
+
+
+class HeaderTest(unittest.TestCase):
+
+    def roundtrip(self, headers):
+        data = _obexcodec.packheaders(headers)
+        return dict((hid, isinstance(v, buffer) and v[:] or v)
+                for hid, v in _obexcodec.iterheaders(data))
+
+    def test_roundtrip(self):
+        headers = {"name": u"caf\xe9.txt", "type": "text/plain",
+                "length": 0xfffffffeL, 0x97: 1, "description": u""}
+        self.assertEqual(self.roundtrip(headers),
+                {0x01: u"caf\xe9.txt", 0x42: "text/plain",
+                 0xc3: 0xfffffffeL, 0x97: 1, 0x05: u""})
+
+    def test_time(self):
+        value = datetime.datetime(2009, 3, 4, 5, 6, 7)
+        self.assertEqual(self.roundtrip({"time": value}),
+                {0x44: "20090304T050607"})
+
+    def test_connectionid_first(self):
+        data = _obexcodec.packheaders([("name", u"x"), (0xcb, 5),
+                (0x46, "target")])
+        hids = [hid for hid, value in _obexcodec.iterheaders(data)]
+        self.assertEqual(hids, [0xcb, 0x46, 0x01])
+
+    def test_bytearray(self):
+        data = _obexcodec.packheaders({"name": u"abc", "type": "x",
+                "length": 3, 0x97: 7})
+        self.assertEqual(_obexcodec.unpackheaders(bytearray(data)),
+                _obexcodec.unpackheaders(data))
+
+    def test_bad_values(self):
+        self.assertRaises(TypeError, _obexcodec.packheader, 0x01, 5)
+        self.assertRaises(TypeError, _obexcodec.packheader, 0xc3, "5")
+        self.assertRaises(TypeError, _obexcodec.packheader, 0x42, 5)
+        self.assertRaises(ValueError, _obexcodec.headerid, "nosuchheader")
+        self.assertRaises(ValueError, _obexcodec.headerid, 0x100)
+
+    def test_malformed(self):
+        good = _obexcodec.packheaders({"name": u"abc", "length": 3})
+        for data in ("\xc3\x00\x00",            # truncated 4-byte header
+                     "\x97",                    # truncated 1-byte header
+                     "\x42\x00",                # truncated prefix
+                     "\x42\x00\x02",            # length less than prefix
+                     "\x42\x00\x09abc",         # length past the end
+                     "\x01\x00\x04\x00",        # odd-length unicode
+                     good[:-1]):
+            self.assertRaises(OBEXError, _obexcodec.unpackheaders, data)
+
+
+class OBEXHeadersTest(unittest.TestCase):
+
+    def test_encoded(self):
+        values = {"name": u"photo.jpg", "type": "image/jpeg", "length": 10,
+                "target": "abc"}
+        headers = _obexcodec.OBEXHeaders(values)
+        self.assertEqual(_obexcodec.unpackheaders(headers.data),
+                _obexcodec.unpackheaders(_obexcodec.packheaders(values)))
+        self.assertEqual(_obexcodec.iterheaders(headers.data).next()[0], 0x46)
+        self.assertEqual(len(headers), 4)
+        self.assertEqual(sorted(headers.items()),
+                [(0x01, u"photo.jpg"), (0x42, "image/jpeg"), (0x46, "abc"),
+                 (0xc3, 10)])
+
+    def test_time(self):
+        headers = _obexcodec.OBEXHeaders([("time",
+                datetime.datetime(2009, 3, 4, 5, 6, 7))])
+        self.assertEqual(headers.items(), [(0x44, "20090304T050607")])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, _obexcodec.OBEXHeaders,
+                {"connection-id": 1})
+        self.assertRaises(ValueError, _obexcodec.OBEXHeaders, {0xcb: 1})
+        self.assertRaises(ValueError, _obexcodec.OBEXHeaders,
+                {"nosuchheader": 1})
+        self.assertRaises(TypeError, _obexcodec.OBEXHeaders, {"name": 5})
+
+    def test_addlength(self):
+        headers = _obexcodec.OBEXHeaders({"name": u"a"})
+        withlength = _obexcodec.addlength(headers, 5)
+        self.assert_(isinstance(withlength, _obexcodec.OBEXHeaders))
+        self.assertEqual(_obexcodec.unpackheaders(withlength.data),
+                {0x01: u"a", 0xc3: 5})
+        self.assert_(_obexcodec.addlength(withlength, 6) is withlength)
+        self.assertEqual(_obexcodec.addlength({"name": u"a"}, 5),
+                {"name": u"a", 0xc3: 5})
+
+    def test_reuse(self):
+        # the Linux client sends the encoded headers as they are, with only
+        # the connection id added
+        _obex = support.importorskip("_obex")
+        headers = _obexcodec.OBEXHeaders({"type": "x-obex/folder-listing"})
+        self.assert_(_obex._convertheaders(headers) is headers.data)
+        self.assertEqual(_obex._convertheaders(headers, 7),
+                _obexcodec.packheader(0xcb, 7) + headers.data)
+
+
+class PacketTest(unittest.TestCase):
+
+    def test_request_roundtrip(self):
+        headers = _obexcodec.packheaders({"name": u"a.txt", "length": 10})
+        packet = _obexcodec.packpacket(
+                _obexcodec.CONNECT | _obexcodec.FINAL, headers,
+                _obexcodec.packconnectdata(0x2000))
+        opcode, final, nonheader, decoded = _obexcodec.unpackrequest(packet)
+        self.assertEqual(opcode, _obexcodec.CONNECT)
+        self.assert_(final)
+        self.assertEqual(_obexcodec.unpackconnectdata(nonheader),
+                (_obexcodec.OBEX_VERSION, 0, 0x2000))
+        self.assertEqual(decoded, {0x01: u"a.txt", 0xc3: 10})
+
+    def test_response_roundtrip(self):
+        packet = _obexcodec.packpacket(0xa0,
+                _obexcodec.packheaders({0x49: "body"}))
+        code, final, nonheader, headers = _obexcodec.unpackresponse(packet,
+                _obexcodec.GET)
+        self.assertEqual((code, final, len(nonheader)), (0x20, True, 0))
+        self.assertEqual(headers[0x49][:], "body")
+
+    def test_malformed(self):
+        self.assertRaises(OBEXError, _obexcodec.unpackrequest, "\x82\x00")
+        self.assertRaises(OBEXError, _obexcodec.unpackrequest,
+                "\x82\x00\x02")
+        self.assertRaises(OBEXError, _obexcodec.unpackrequest,
+                "\x82\x00\x10abc")
+        # Connect packets need 4 bytes of non-header data
+        self.assertRaises(OBEXError, _obexcodec.unpackrequest,
+                "\x80\x00\x05\x10\x00")
+        self.assertRaises(ValueError, _obexcodec.packpacket, 0x82,
+                "x" * _obexcodec.MAX_PACKET_LENGTH)
+
+    def test_recvpacket(self):
+        a, b = socket.socketpair()
+        try:
+            packets = [_obexcodec.packpacket(0x82,
+                        _obexcodec.packheaders({0x48: "x" * n}))
+                    for n in (0, 1, 1000, 60000)]
+            packets.append(_obexcodec.packpacket(0x81))
+            buf = bytearray(_obexcodec.MAX_PACKET_LENGTH)
+            for packet in packets:
+                a.sendall(packet)
+                self.assertEqual(_obexcodec.recvpacket(b), packet)
+                a.sendall(packet)
+                length = _obexcodec.recvpacket_into(b, buf)
+                self.assertEqual(str(buf[:length]), packet)
+                # the received buffer can be decoded without copying
+                _obexcodec.unpackrequest(buf)
+            a.sendall("\x82\x00\x10abc")
+            a.close()
+            self.assertRaises(OBEXError, _obexcodec.recvpacket, b)
+        finally:
+            a.close()
+            b.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests how the OBEX clients take Put data, in _obexcommon, including the
+# memory-mapping of files.
+
+import StringIO
+import os
+import tempfile
+import unittest
+
+import support
+import _obexcommon
+
+
+class BodySourceTest(unittest.TestCase):
+
+    def test_string(self):
+        chunks, length = _obexcommon._bodysource("abc")
+        self.assertEqual(list(chunks), ["abc"])
+        self.assertEqual(length, 3)
+
+    def test_buffer(self):
+        data = bytearray("abcd")
+        chunks, length = _obexcommon._bodysource(data, 10)
+        self.assert_(chunks.next() is data)
+        self.assertEqual(length, 10)
+
+    def test_iterable(self):
+        chunks, length = _obexcommon._bodysource(iter(["a", "b"]))
+        self.assertEqual(list(chunks), ["a", "b"])
+        self.assertEqual(length, None)
+
+    def test_filelike(self):
+        fileobj = StringIO.StringIO("abc")
+        self.assertEqual(_obexcommon._bodysource(fileobj), (fileobj, None))
+
+    def test_unicode(self):
+        self.assertRaises(TypeError, _obexcommon._bodysource, u"abc")
+        self.assertRaises(TypeError, _obexcommon._bodysource, u"")
+
+    def test_invalid(self):
+        self.assertRaises(TypeError, _obexcommon._bodysource, 5)
+
+
+class MapFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fileobj = tempfile.TemporaryFile()
+        self.fileobj.write("0123456789")
+        self.fileobj.flush()
+        self.chunksize = _obexcommon._MAP_CHUNK_SIZE
+        _obexcommon._MAP_CHUNK_SIZE = 4
+
+    def tearDown(self):
+        _obexcommon._MAP_CHUNK_SIZE = self.chunksize
+        self.fileobj.close()
+
+    def getmapping(self, chunks):
+        # the mmap object used by an _iterfilemap() generator
+        return chunks.gi_frame.f_locals["mapping"]
+
+    def test_chunks(self):
+        self.fileobj.seek(1)
+        chunks, size = _obexcommon._mapfile(self.fileobj)
+        self.assertEqual(size, 9)
+        self.assertEqual(chunks.next()[:], "1234")
+        mapping = self.getmapping(chunks)
+        self.assertEqual(self.fileobj.tell(), 1)
+        self.assertEqual(chunks.next()[:], "5678")
+        self.assertEqual(self.fileobj.tell(), 5)
+        self.assertEqual(chunks.next()[:], "9")
+        self.assertEqual(self.fileobj.tell(), 9)
+        self.assertRaises(StopIteration, chunks.next)
+        self.assertEqual(self.fileobj.tell(), 10)
+        self.assertRaises(ValueError, len, mapping)   # closed
+
+    def test_close(self):
+        # an unfinished request closes the mapping
+        self.fileobj.seek(0)
+        chunks, size = _obexcommon._mapfile(self.fileobj)
+        chunks.next()
+        mapping = self.getmapping(chunks)
+        chunks.close()
+        self.assertRaises(ValueError, len, mapping)
+        self.assertEqual(self.fileobj.tell(), 0)
+
+    def test_not_mapped(self):
+        self.fileobj.seek(10)
+        self.assertEqual(_obexcommon._mapfile(self.fileobj), None)
+        self.assertEqual(_obexcommon._mapfile(StringIO.StringIO("abc")), None)
+        r, w = os.pipe()
+        pipe = os.fdopen(r, "rb")
+        try:
+            self.assertEqual(_obexcommon._mapfile(pipe), None)
+        finally:
+            pipe.close()
+            os.close(w)
+
+    def test_bodysource_length(self):
+        self.fileobj.seek(3)
+        chunks, length = _obexcommon._bodysource(self.fileobj)
+        self.assertEqual(length, 7)
+        self.assertEqual("".join([chunk[:] for chunk in chunks]), "3456789")
+
+    def test_chunkreader(self):
+        # reads stop at chunk boundaries, so that a chunk is never used after
+        # the next one has been asked for
+        self.fileobj.seek(0)
+        reader = _obexcommon._ChunkReader(
+                _obexcommon._mapfile(self.fileobj)[0])
+        self.assertEqual(reader.read(3)[:], "012")
+        self.assertEqual(reader.read(3)[:], "3")
+        self.assertEqual(reader.read(100)[:], "4567")
+        self.assertEqual(reader.read()[:], "89")
+        self.assertEqual(reader.read(), "")
+
+    def test_chunkreader_readall(self):
+        self.fileobj.seek(0)
+        reader = _obexcommon._ChunkReader(
+                _obexcommon._mapfile(self.fileobj)[0])
+        self.assertEqual(reader.read(1)[:], "0")
+        self.assertEqual(reader.read(), "123456789")
+
+
+if __name__ == "__main__":
+    unittest.main()
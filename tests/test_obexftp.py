@@ -0,0 +1,220 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the FTP client's folder mirroring against a fake OBEX client that
+# serves an in-memory folder tree.
+
+import os
+import shutil
+import tempfile
+import unittest
+from xml.sax.saxutils import quoteattr
+
+import support
+import _obexcommon
+from _obexcommon import OBEXError, OBEXResponse
+
+ADDRESS = "00:0D:93:19:C8:68"
+
+
+class FakeFTPServerClient(object):
+    # An OBEXClient stand-in for an FTP server. Folders are dicts, and files
+    # are strings. Listings can be overridden with raw XML entries.
+
+    def __init__(self, root):
+        self.root = root
+        self.path = []
+        self.rawentries = {}    # folder path tuple -> extra XML entries
+
+    def __folder(self):
+        folder = self.root
+        for name in self.path:
+            folder = folder[name]
+        return folder
+
+    def connect(self, headers={}):
+        return OBEXResponse(_obexcommon.OK, {})
+
+    def setpath(self, headers, cdtoparent=False, createdirs=False):
+        if cdtoparent:
+            if not self.path:
+                return OBEXResponse(_obexcommon.NOT_FOUND, {})
+            self.path.pop()
+        elif headers.get("name") == "":
+            self.path = []
+        else:
+            name = headers["name"]
+            folder = self.__folder()
+            if name not in folder:
+                if not createdirs:
+                    return OBEXResponse(_obexcommon.NOT_FOUND, {})
+                folder[name] = {}
+            elif not isinstance(folder[name], dict):
+                return OBEXResponse(_obexcommon.FORBIDDEN, {})
+            self.path.append(name)
+        return OBEXResponse(_obexcommon.OK, {})
+
+    def get(self, headers, fileobj):
+        folder = self.__folder()
+        if "type" in headers:
+            entries = []
+            for name, value in sorted(folder.items()):
+                if isinstance(value, dict):
+                    entries.append('<folder name=%s/>' % quoteattr(name))
+                else:
+                    entries.append('<file name=%s size="%d"/>' %
+                            (quoteattr(name), len(value)))
+            entries.extend(self.rawentries.get(tuple(self.path), []))
+            fileobj.write('<?xml version="1.0"?>\n<folder-listing>%s'
+                    '</folder-listing>' % "".join(entries))
+            return OBEXResponse(_obexcommon.OK, {})
+        value = folder.get(headers["name"])
+        if not isinstance(value, str):
+            return OBEXResponse(_obexcommon.NOT_FOUND, {})
+        fileobj.write(value)
+        return OBEXResponse(_obexcommon.OK, {})
+
+    def put(self, headers, fileobj):
+        self.__folder()[headers["name"]] = fileobj.read()
+        return OBEXResponse(_obexcommon.OK, {})
+
+
+class MirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._obexftp = support.importorskip("_obexftp")
+        self.tempdir = tempfile.mkdtemp()
+        self.localdir = os.path.join(self.tempdir, "local")
+        self.tree = {"Images": {"a.jpg": "aaa", "Camera": {"b.jpg": "bb"}},
+                "c.txt": "c"}
+        self.server = FakeFTPServerClient(self.tree)
+        self.ftp = self._obexftp.FTPClient(ADDRESS, 10, self.server)
+        self.ftp.connect()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_mirror_get(self):
+        copied = self.ftp.mirror_get("Images", self.localdir)
+        self.assertEqual(sorted(copied), ["Camera/b.jpg", "a.jpg"])
+        self.assertEqual(file(os.path.join(self.localdir, "Camera",
+                "b.jpg")).read(), "bb")
+        self.assertEqual(self.ftp.getcwd(), "")
+        self.assertEqual(self.ftp.mirror_get("Images", self.localdir), [])
+
+    def test_mirror_put(self):
+        os.makedirs(os.path.join(self.localdir, "sub"))
+        file(os.path.join(self.localdir, "d.txt"), "wb").write("dd")
+        file(os.path.join(self.localdir, "sub", "e.txt"), "wb").write("e")
+        self.ftp.chdir("Images")
+        copied = self.ftp.mirror_put(self.localdir, "/Backup/new")
+        self.assertEqual(copied, ["d.txt", "sub/e.txt"])
+        self.assertEqual(self.tree["Backup"]["new"]["sub"]["e.txt"], "e")
+        self.assertEqual(self.ftp.getcwd(), "Images")
+        self.assertEqual(self.server.path, ["Images"])
+
+    def test_mirror_put_restores_folder_on_error(self):
+        self.ftp.chdir("Images")
+        os.makedirs(self.localdir)
+        # c.txt is a file, so the second SetPath is refused
+        self.assertRaises(OBEXError, self.ftp.mirror_put, self.localdir,
+                "/Images/Camera/../../c.txt/x")
+        self.assertEqual(self.ftp.getcwd(), "Images")
+        self.assertEqual(self.server.path, ["Images"])
+
+    def test_restore_error_doesnt_replace_original(self):
+        self.ftp.chdir("Images")
+        os.makedirs(self.localdir)
+        file(os.path.join(self.localdir, "d.txt"), "wb").write("dd")
+        # the starting folder is removed while mirroring, so going back to it
+        # fails too
+        def progress(path, transferred, total):
+            del self.tree["Images"]
+            raise ZeroDivisionError
+        self.assertRaises(ZeroDivisionError, self.ftp.mirror_put,
+                self.localdir, "/Backup", progress)
+        self.assertEqual(self.ftp.getcwd(), "")
+
+    def checkunsafe(self, entry):
+        self.server.rawentries[("Images",)] = [entry]
+        self.assertRaises(OBEXError, self.ftp.mirror_get, "Images",
+                self.localdir)
+        self.assertEqual(self.server.path, [])
+        for dirpath, dirnames, filenames in os.walk(self.tempdir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                self.assert_(path.startswith(self.localdir + os.sep), path)
+
+    def test_unsafe_parent(self):
+        self.checkunsafe('<file name=".." size="1"/>')
+
+    def test_unsafe_folder(self):
+        self.checkunsafe('<folder name=".."/>')
+        self.checkunsafe('<folder name="."/>')
+
+    def test_unsafe_separator(self):
+        self.checkunsafe('<file name="../../evil" size="1"/>')
+        self.checkunsafe('<file name="x%sy" size="1"/>' % os.sep)
+
+    def test_unsafe_absolute(self):
+        self.checkunsafe('<file name=%s size="1"/>' %
+                quoteattr(os.path.join(self.tempdir, "evil")))
+
+    def test_missing_name(self):
+        self.checkunsafe('<file size="1"/>')
+        self.checkunsafe('<folder name=""/>')
+
+
+class FolderListingTest(unittest.TestCase):
+
+    LISTING = '<?xml version="1.0"?>\n<folder-listing version="1.0">' \
+            '<parent-folder/><folder name="Images"/>' \
+            '<file name="a.txt" size="12" modified="20090301T120000Z" ' \
+            'type="text/plain"/><file name="b" size="?"/></folder-listing>'
+
+    def setUp(self):
+        self._obexftp = support.importorskip("_obexftp")
+
+    def checkentries(self, entries):
+        self.assertEqual([(e.name, e.isfolder, e.size) for e in entries],
+                [("Images", True, None), ("a.txt", False, 12),
+                ("b", False, None)])
+        self.assertEqual(entries[1].modified.timetuple()[:6],
+                (2009, 3, 1, 12, 0, 0))
+        self.assertEqual(entries[1].type, "text/plain")
+
+    def test_string(self):
+        self.checkentries(list(self._obexftp.parse_folder_listing(
+                self.LISTING)))
+
+    def test_pieces(self):
+        # split inside tags and attribute values
+        pieces = [self.LISTING[i:i+7] for i in range(0, len(self.LISTING), 7)]
+        self.checkentries(list(self._obexftp.parse_folder_listing(pieces)))
+
+    def test_parser(self):
+        parser = self._obexftp.FolderListingParser()
+        parser.write(self.LISTING)
+        self.checkentries(parser.close())
+
+    def test_malformed(self):
+        self.assertRaises(OBEXError, list,
+                self._obexftp.parse_folder_listing("<folder-listing><file"))
+
+
+if __name__ == "__main__":
+    unittest.main()
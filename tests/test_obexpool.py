@@ -0,0 +1,175 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests OBEXSessionPool with fake OBEX clients.
+
+import StringIO
+import threading
+import time
+import unittest
+
+import support
+import _obexcommon
+import _obexpool
+from _obexcommon import OBEXError, OBEXResponse
+
+ADDRESS = "00:0D:93:19:C8:68"
+
+
+class FakeClient(object):
+
+    def __init__(self, pool, options):
+        self.pool = pool
+        self.options = options
+        self.alive = True
+        self.putcode = _obexcommon.OK
+        self.puts = []
+        self.disconnected = False
+        self.lockedondisconnect = None
+
+    def connect(self, headers={}):
+        return OBEXResponse(_obexcommon.OK, {})
+
+    def put(self, headers, fileobj):
+        if not self.alive:
+            raise OBEXError("connection lost")
+        self.puts.append(headers.get("name"))
+        return OBEXResponse(self.putcode, {})
+
+    def disconnect(self):
+        # checks from another thread whether the pool's lock is held
+        cond = self.pool._OBEXSessionPool__cond
+        result = []
+        def trylock():
+            result.append(cond.acquire(False))
+            if result[0]:
+                cond.release()
+        thread = threading.Thread(target=trylock)
+        thread.start()
+        thread.join()
+        self.lockedondisconnect = not result[0]
+        self.disconnected = True
+        self.alive = False
+
+    def _isalive(self):
+        return self.alive
+
+
+class FakePool(_obexpool.OBEXSessionPool):
+
+    def __init__(self, **kwargs):
+        self.options = kwargs.pop("clientoptions", {})
+        _obexpool.OBEXSessionPool.__init__(self, clientoptions=self.options,
+                **kwargs)
+        self.created = []
+
+    def _createclient(self, address, channel):
+        client = FakeClient(self, self.options)
+        self.created.append(client)
+        return client
+
+
+class OBEXSessionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakePool()
+
+    def test_reuse(self):
+        client = self.pool.acquire(ADDRESS, 10)
+        self.pool.release(client)
+        self.assert_(self.pool.acquire(ADDRESS, 10) is client)
+        self.assertEqual(len(self.pool.created), 1)
+
+    def test_dead_session_replaced(self):
+        client = self.pool.acquire(ADDRESS, 10)
+        self.pool.release(client)
+        client.alive = False
+        newclient = self.pool.acquire(ADDRESS, 10)
+        self.assert_(newclient is not client)
+        self.assert_(client.disconnected)
+        self.assertEqual(client.lockedondisconnect, False)
+
+    def test_release_without_reuse(self):
+        client = self.pool.acquire(ADDRESS, 10)
+        self.pool.release(client, reuse=False)
+        self.assert_(client.disconnected)
+        self.assertEqual(client.lockedondisconnect, False)
+        self.assertRaises(ValueError, self.pool.release, client)
+
+    def test_close(self):
+        clients = [self.pool.acquire(ADDRESS, channel)
+                for channel in (1, 2)]
+        for client in clients:
+            self.pool.release(client)
+        self.pool.close()
+        for client in clients:
+            self.assert_(client.disconnected)
+            self.assertEqual(client.lockedondisconnect, False)
+
+    def test_expire_idle(self):
+        pool = FakePool(idletimeout=0.01)
+        client = pool.acquire(ADDRESS, 10)
+        pool.release(client)
+        self.assert_(not client.disconnected)
+        time.sleep(0.05)
+        pool.closeidle()
+        self.assert_(client.disconnected)
+        self.assertEqual(client.lockedondisconnect, False)
+
+    def test_maxperdevice(self):
+        client = self.pool.acquire(ADDRESS, 10)
+        self.assertRaises(OBEXError, self.pool.acquire, ADDRESS, 10, 0.05)
+        timer = threading.Timer(0.05, self.pool.release, [client])
+        timer.start()
+        self.assert_(self.pool.acquire(ADDRESS, 10, 5) is client)
+        timer.join()
+
+    def test_clientoptions(self):
+        pool = FakePool(clientoptions={"srm": True})
+        self.assertEqual(pool.acquire(ADDRESS, 10).options, {"srm": True})
+
+    def test_sendfiles(self):
+        self.pool.sendfiles(ADDRESS, 10, [StringIO.StringIO("a"),
+                StringIO.StringIO("b")])
+        client = self.pool.created[0]
+        self.assertEqual(len(client.puts), 2)
+        self.assert_(not client.disconnected)
+
+    def test_sendfiles_refused(self):
+        # a refused Put leaves the session usable
+        client = self.pool.acquire(ADDRESS, 10)
+        client.putcode = _obexcommon.FORBIDDEN
+        self.pool.release(client)
+        self.assertRaises(OBEXError, self.pool.sendfiles, ADDRESS, 10,
+                [StringIO.StringIO("a"), StringIO.StringIO("b")])
+        self.assertEqual(len(client.puts), 1)
+        self.assert_(not client.disconnected)
+        self.assert_(self.pool.acquire(ADDRESS, 10) is client)
+
+    def test_sendfiles_transport_error(self):
+        client = self.pool.acquire(ADDRESS, 10)
+        self.pool.release(client)
+        client.alive = False
+        client._isalive = lambda: True   # not noticed until the request
+        self.assertRaises(OBEXError, self.pool.sendfiles, ADDRESS, 10,
+                [StringIO.StringIO("a")])
+        self.assert_(client.disconnected)
+        self.assert_(self.pool.acquire(ADDRESS, 10) is not client)
+
+
+if __name__ == "__main__":
+    unittest.main()
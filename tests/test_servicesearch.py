@@ -0,0 +1,129 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the service search scheduling against a fake SDP responder.
+
+import threading
+import time
+import unittest
+
+import support
+import _lightbluecommon
+import _servicesearch
+
+
+class FakeResponder(object):
+    """
+    Answers SDP queries after a delay for each device, and records how many
+    queries run at once.
+    """
+
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = failing
+        self.running = 0
+        self.maxrunning = 0
+        self.lock = threading.Lock()
+
+    def query(self, address):
+        self.lock.acquire()
+        self.running += 1
+        self.maxrunning = max(self.maxrunning, self.running)
+        self.lock.release()
+        try:
+            time.sleep(self.delays[address])
+            if address in self.failing:
+                raise _lightbluecommon.BluetoothError("no response")
+            return [(address, 1, "service on %s" % address)]
+        finally:
+            self.lock.acquire()
+            self.running -= 1
+            self.lock.release()
+
+    def waitidle(self, timeout=5):
+        # waits for abandoned queries to finish, so that their threads don't
+        # outlive the test
+        endtime = time.time() + timeout
+        while self.running and time.time() < endtime:
+            time.sleep(0.01)
+
+
+def search(responder, addresses, **kwargs):
+    return list(_servicesearch.searchservices(addresses,
+            _servicesearch.ThreadedBackend(responder.query), **kwargs))
+
+
+class SearchServicesTest(unittest.TestCase):
+
+    def test_parallel(self):
+        addresses = ["%02d" % i for i in range(8)]
+        responder = FakeResponder(dict.fromkeys(addresses, 0.2))
+        start = time.time()
+        results = search(responder, addresses, maxqueries=4)
+        elapsed = time.time() - start
+        self.assertEqual(sorted([r[0] for r in results]), addresses)
+        self.assertEqual([r[2] for r in results], [None] * 8)
+        self.assertEqual(responder.maxrunning, 4)
+        # two rounds of four queries, rather than eight in sequence
+        self.assert_(elapsed < 0.2 * 8 * 0.75, elapsed)
+
+    def test_completion_order(self):
+        responder = FakeResponder({"slow": 0.3, "fast": 0.01})
+        results = search(responder, ["slow", "fast"])
+        self.assertEqual([r[0] for r in results], ["fast", "slow"])
+
+    def test_errors_and_timeouts(self):
+        responder = FakeResponder({"ok": 0, "bad": 0, "hung": 1},
+                failing=("bad", ))
+        results = dict([(r[0], r) for r in search(responder,
+                ["ok", "bad", "hung"], timeout=0.2)])
+        self.assertEqual(results["ok"][2], None)
+        self.assert_(isinstance(results["bad"][2],
+                _lightbluecommon.BluetoothError))
+        self.assertEqual(results["hung"][1], None)
+        self.assert_(isinstance(results["hung"][2],
+                _lightbluecommon.BluetoothError))
+        responder.waitidle()
+
+    def test_abandoned_queries_hold_slots(self):
+        # the hung query keeps running after it times out, so the others
+        # must wait for it rather than run alongside it
+        responder = FakeResponder({"hung": 0.4, "a": 0, "b": 0})
+        results = search(responder, ["hung", "a", "b"], maxqueries=1,
+                timeout=0.3)
+        self.assertEqual([r[0] for r in results], ["hung", "a", "b"])
+        self.assertEqual([r[2] for r in results[1:]], [None, None])
+        self.assertEqual(responder.maxrunning, 1)
+
+    def test_slot_wait_timeout(self):
+        responder = FakeResponder({"hung": 1, "a": 0})
+        start = time.time()
+        results = search(responder, ["hung", "a"], maxqueries=1, timeout=0.2)
+        self.assert_(time.time() - start < 0.8)
+        self.assertEqual([r[0] for r in results], ["hung", "a"])
+        self.assert_(isinstance(results[1][2],
+                _lightbluecommon.BluetoothError))
+        self.assertEqual(responder.maxrunning, 1)
+        responder.waitidle()
+
+    def test_duplicates(self):
+        responder = FakeResponder({"a": 0})
+        self.assertEqual(len(search(responder, ["a", "a"])), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
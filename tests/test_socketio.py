@@ -0,0 +1,161 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the Mac socket buffering in _socketio, which doesn't need PyObjC.
+
+import StringIO
+import tempfile
+import unittest
+
+import support
+import _socketio
+
+
+class ReceiveQueueTest(unittest.TestCase):
+
+    def test_read(self):
+        queue = _socketio.ReceiveQueue()
+        self.assert_(queue.empty())
+        queue.write("hello ")
+        queue.write(buffer("big world"))
+        queue.write(memoryview("!"))
+        self.assertEqual(len(queue), 16)
+        self.assertEqual(queue.read(2), "he")
+        self.assertEqual(queue.read(6), "llo bi")
+        self.assertEqual(len(queue), 8)
+        self.assertEqual(queue.read(100), "g world!")
+        self.assert_(queue.empty())
+        self.assertEqual(queue.read(10), "")
+
+    def test_readinto(self):
+        queue = _socketio.ReceiveQueue()
+        for data in ("abc", "defg", "h"):
+            queue.write(data)
+        buf = bytearray(5)
+        self.assertEqual(queue.readinto(buf, 5), 5)
+        self.assertEqual(str(buf), "abcde")
+        self.assertEqual(queue.readinto(buf, 5), 3)
+        self.assertEqual(str(buf[:3]), "fgh")
+        self.assert_(queue.empty())
+
+    def test_highwater(self):
+        queue = _socketio.ReceiveQueue(highwater=10)
+        queue.write("x" * 9)
+        self.assert_(not queue.full())
+        queue.write("x")
+        self.assert_(queue.full())
+        queue.read(1)
+        self.assert_(not queue.full())
+
+
+class _FakeChannel(object):
+    # Delivers packets to its delegate as the run loop is pumped, and keeps
+    # them (as IOBluetooth does) while it has no delegate.
+    def __init__(self, packets):
+        self.pending = list(packets)
+        self.delegate = None
+
+    def setDelegate_(self, delegate):
+        self.delegate = delegate
+
+    def looponce(self):
+        while self.delegate is not None and self.pending:
+            self.delegate(self.pending.pop(0))
+
+
+class BackpressureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = _FakeChannel(["%05d" % i for i in range(1000)])
+        self.pauses = 0
+        self.queue = _socketio.ReceiveQueue(highwater=100,
+                pause=self.pause, resume=self.resume)
+        self.resume()
+
+    def pause(self):
+        self.pauses += 1
+        self.channel.setDelegate_(None)
+
+    def resume(self):
+        self.channel.setDelegate_(self.channeldata)
+
+    def channeldata(self, data):
+        # the socket's channel data callback
+        self.queue.write(data)
+        self.assert_(len(self.queue) <= self.queue.highwater + 5)
+
+    def test_channel_paused_when_full(self):
+        # pumping the run loop elsewhere, without reading, doesn't take in
+        # more than the high-water mark
+        for i in range(10):
+            self.channel.looponce()
+        self.assertEqual(len(self.queue), 100)
+        self.assert_(self.queue.paused)
+        self.assertEqual(len(self.channel.pending), 980)
+        self.assertEqual(self.pauses, 1)
+
+    def test_resumed_below_lowwater(self):
+        self.channel.looponce()
+        self.queue.read(45)
+        self.channel.looponce()
+        self.assertEqual(len(self.queue), 55)
+        self.assertEqual(self.channel.delegate, None)
+        buf = bytearray(5)
+        self.queue.readinto(buf, 5)
+        self.assert_(not self.queue.paused)
+        self.channel.looponce()
+        self.assertEqual(len(self.queue), 100)
+        self.assertEqual(self.pauses, 2)
+
+    def test_data_in_order(self):
+        received = []
+        while self.channel.pending or not self.queue.empty():
+            self.channel.looponce()
+            received.append(self.queue.read(33))
+        self.assertEqual("".join(received),
+                "".join(["%05d" % i for i in range(1000)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class SendFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(str(data))
+
+    def test_pieces(self):
+        fileobj = tempfile.TemporaryFile()
+        fileobj.write("0123456789" * 3)
+        fileobj.seek(4)
+        self.assertEqual(_socketio.sendfile(self.sendall, fileobj, 8), 26)
+        self.assertEqual(self.sent, ["45678901", "23456789", "01234567",
+                "89"])
+        self.assertEqual(fileobj.tell(), 30)
+
+    def test_count(self):
+        fileobj = StringIO.StringIO("0123456789" * 3)
+        self.assertEqual(_socketio.sendfile(self.sendall, fileobj, 8, 12), 12)
+        self.assertEqual(self.sent, ["01234567", "8901"])
+        self.assertEqual(fileobj.tell(), 12)
+        self.sent = []
+        self.assertEqual(_socketio.sendfile(self.sendall, fileobj, 8, 0), 0)
+        self.assertEqual(self.sent, [])
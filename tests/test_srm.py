@@ -0,0 +1,105 @@
+# Copyright (c) 2009 Bea Lam. All rights reserved.
+#
+# This file is part of LightBlue.
+#
+# LightBlue is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# LightBlue is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with LightBlue.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests the Python OBEX engine's Single Response Mode support against the
+# loopback server. (Linux only, since the engine is in the Linux _obex module.)
+
+import socket
+import StringIO
+import tempfile
+import unittest
+
+import support
+import obexserver
+
+
+class SRMTest(unittest.TestCase):
+
+    def setUp(self):
+        self._obex = support.importorskip("_obex")
+        if not hasattr(self._obex, "_SRMClient"):
+            raise unittest.SkipTest("no Python OBEX engine on this platform")
+
+    def connect(self, srm=True, latency=0):
+        a, b = socket.socketpair()
+        self.server = obexserver.LoopbackServer(b, latency=latency, srm=srm)
+        self.server.start()
+        self.addCleanup(a.close)
+        client = self._obex._SRMClient(a)
+        self.assertEqual(client.request(0x00, {}, None)[0], obexserver.OK)
+        return client
+
+    def test_put_get(self):
+        data = "".join([chr(i % 251) for i in xrange(300000)])
+        client = self.connect()
+        code, headers = client.request(0x02, {0x01: u"a"}, None,
+                StringIO.StringIO(data))
+        self.assertEqual(code, obexserver.OK)
+        self.assertEqual(self.server.objects[u"a"], data)
+        # one Continue response for the first packet, then the final one
+        self.assertEqual(self.server.responsecount, 3)
+
+        received = StringIO.StringIO()
+        code, headers = client.request(0x03, {0x01: u"a"}, None, received)
+        self.assertEqual(code, obexserver.OK)
+        self.assertEqual(received.getvalue(), data)
+        # one Get packet for the whole response
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_server_without_srm(self):
+        data = "x" * 200000
+        client = self.connect(srm=False)
+        code, headers = client.request(0x02, {0x01: u"b"}, None,
+                StringIO.StringIO(data))
+        self.assertEqual(code, obexserver.OK)
+        self.assertEqual(self.server.objects[u"b"], data)
+        # a response for every packet
+        self.assert_(self.server.responsecount > 4)
+
+        received = StringIO.StringIO()
+        code, headers = client.request(0x03, {0x01: u"b"}, None, received)
+        self.assertEqual(received.getvalue(), data)
+
+    def test_put_mapped_file(self):
+        # a regular file is sent from memory-mapped chunks, and the mapping
+        # is closed as the data is sent
+        _obexcommon = self._obex._obexcommon
+        chunksize = _obexcommon._MAP_CHUNK_SIZE
+        _obexcommon._MAP_CHUNK_SIZE = 100000
+        self.addCleanup(setattr, _obexcommon, "_MAP_CHUNK_SIZE", chunksize)
+        data = "".join([chr(i % 251) for i in xrange(250000)])
+        fileobj = tempfile.TemporaryFile()
+        fileobj.write(data)
+        fileobj.seek(10)
+        chunks, length = _obexcommon._bodysource(fileobj)
+        self.assertEqual(length, len(data) - 10)
+        client = self.connect()
+        code, headers = client.request(0x02, {0x01: u"m"}, None,
+                _obexcommon._ChunkReader(chunks))
+        self.assertEqual(code, obexserver.OK)
+        self.assertEqual(self.server.objects[u"m"], data[10:])
+        self.assertEqual(fileobj.tell(), len(data))
+
+    def test_not_found(self):
+        client = self.connect()
+        code, headers = client.request(0x03, {0x01: u"none"}, None,
+                StringIO.StringIO())
+        self.assertEqual(code, obexserver.NOT_FOUND)
+
+
+if __name__ == "__main__":
+    unittest.main()